@@ -0,0 +1,61 @@
+"""
+Замер масштабирования ParallelEngine по числу потоков.
+
+Пример:
+    python benchmarks/parallel_scaling.py --size 4000 --generations 20 --workers 1 2 4 8
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from numpy_engine import NumpyEngine  # noqa: E402
+from parallel_engine import ParallelEngine  # noqa: E402
+
+
+def random_soup(size, density, seed):
+    """Случайное поле size x size с заданной плотностью."""
+    rng = np.random.default_rng(seed)
+    rows, cols = np.nonzero(rng.random((size, size)) < density)
+    return list(zip(cols.tolist(), rows.tolist()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=2000, help="сторона случайного поля")
+    parser.add_argument('--density', type=float, default=0.35)
+    parser.add_argument('--generations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=random.randrange(1 << 30))
+    cpu = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, 8, 16, 32, 64, cpu} & set(range(1, cpu + 1)))
+    parser.add_argument('--workers', type=int, nargs='+', default=default_workers)
+    args = parser.parse_args()
+
+    cells = random_soup(args.size, args.density, args.seed)
+    print(f"Поле {args.size}x{args.size}, {len(cells)} клеток, {args.generations} поколений, seed={args.seed}")
+
+    reference = NumpyEngine(cells)
+    start = time.perf_counter()
+    reference.step(args.generations)
+    serial = time.perf_counter() - start
+    print(f"{'serial':>8}: {args.generations / serial:8.1f} пок/с")
+
+    for workers in args.workers:
+        engine = ParallelEngine(cells, workers=workers)
+        start = time.perf_counter()
+        engine.step(args.generations)
+        elapsed = time.perf_counter() - start
+        engine.shutdown()
+        same = (engine.bounding_box == reference.bounding_box and
+                set(engine.iter_cells()) == set(reference.iter_cells()))
+        print(f"{workers:>8}: {args.generations / elapsed:8.1f} пок/с, "
+              f"ускорение x{serial / elapsed:.2f}, совпадает: {'да' if same else 'НЕТ'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Замер времени холодного старта.
+
+Каждый замер идет в свежем процессе Python, чтобы кэш модулей не
+искажал результат, и повторяется --repeat раз (выводится медиана):
+  - импорт модулей ядра и движков: время и то, не загрузили ли они Qt;
+  - пакетный поиск супов (gameofthelife.py soupsearch) на одном супе:
+    должен обходиться без Qt;
+  - окно приложения: импорт gameofthelife, QApplication и первый кадр
+    главного окна (Qt на платформе offscreen), а также то, не открылась
+    ли при этом база паттернов.
+"Процесс" - время всего процесса вместе с запуском интерпретатора.
+
+Примеры:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --repeat 10 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Модули, которые должны импортироваться без Qt.
+CORE_MODULES = ['rules', 'engine', 'sparse_engine', 'numpy_engine', 'hashlife', 'database', 'patternio',
+                'census', 'soupsearch']
+
+# Код дочерних процессов. Каждый печатает последней строкой JSON
+# {'ms': время внутри процесса, 'qt': загружен ли Qt, ...}.
+_REPORT = """
+import json, sys, time
+print(json.dumps(dict(ms=(time.perf_counter() - _start) * 1000,
+                      qt=any(name.startswith('PyQt6') for name in sys.modules), **_extra)))
+"""
+
+_IMPORT = """
+import time
+_start = time.perf_counter()
+import {module}
+_extra = {{}}
+""" + _REPORT
+
+_SOUPSEARCH = """
+import os, runpy, sys, time
+_start = time.perf_counter()
+sys.argv = ['gameofthelife.py', 'soupsearch', '--soups', '1', '--workers', '1', '--out', os.devnull,
+            '--library', os.devnull + '.missing']
+try:
+    runpy.run_path('gameofthelife.py', run_name='__main__')
+except SystemExit:
+    pass
+_extra = {}
+""" + _REPORT
+
+_WINDOW = """
+import os, time
+_start = time.perf_counter()
+os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+import gameofthelife
+_imported = time.perf_counter()
+from PyQt6.QtWidgets import QApplication
+app = QApplication([])
+window = gameofthelife.GameOfLifeWindow(lang='en')
+window.show()
+app.processEvents()
+window.grid_widget.repaint()
+import database
+_extra = dict(import_ms=(_imported - _start) * 1000, window_ms=(time.perf_counter() - _imported) * 1000,
+              database_opened=bool(database._managers))
+""" + _REPORT
+
+
+def run_child(code):
+    """Выполняет code в свежем процессе: (отчет процесса, время процесса в мс)."""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return json.loads(result.stdout.strip().splitlines()[-1]), elapsed
+
+
+def measure(name, code, repeat):
+    """Медианы повторных замеров одного сценария."""
+    runs = [run_child(code) for _ in range(repeat)]
+    report = {'name': name, 'process_ms': statistics.median(elapsed for _, elapsed in runs)}
+    for key, value in runs[0][0].items():
+        if isinstance(value, bool):
+            report[key] = value
+        else:
+            report[key] = statistics.median(run[key] for run, _ in runs)
+    return report
+
+
+def print_row(report):
+    flags = []
+    if report['qt']:
+        flags.append('Qt')
+    if report.get('database_opened'):
+        flags.append('база открыта')
+    details = ''
+    if 'window_ms' in report:
+        details = f" (импорт {report['import_ms']:.0f}, окно {report['window_ms']:.0f})"
+    print(f"{report['name']:>24} {report['ms']:>8.1f} {report['process_ms']:>9.1f}  {', '.join(flags) or '-'}{details}",
+          flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help="повторов каждого замера")
+    parser.add_argument('--modules', nargs='+', default=CORE_MODULES, help="модули для замера импорта")
+    parser.add_argument('--no-window', action='store_true', help="не замерять окно (без PyQt6)")
+    parser.add_argument('--json', help="записать результаты в этот файл")
+    args = parser.parse_args()
+
+    # (название, код, допустим ли Qt): ядро и пакетный режим не должны его загружать.
+    scenarios = [(f'import {module}', _IMPORT.format(module=module), False) for module in args.modules]
+    scenarios.append(('soupsearch (1 суп)', _SOUPSEARCH, False))
+    if not args.no_window:
+        scenarios.append(('окно, первый кадр', _WINDOW, True))
+
+    print(f"{'сценарий':>24} {'мс':>8} {'процесс':>9}  загружено")
+    reports = []
+    failed = False
+    for name, code, qt_allowed in scenarios:
+        report = measure(name, code, max(1, args.repeat))
+        reports.append(report)
+        print_row(report)
+        failed |= report['qt'] and not qt_allowed
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2, ensure_ascii=False)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
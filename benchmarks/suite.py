@@ -0,0 +1,284 @@
+"""
+Набор стандартных замеров движков и отрисовки.
+
+Для каждой пары (движок, нагрузка) измеряются:
+  - поколений в секунду;
+  - живых клеток x поколений в секунду: сумма населения по всем посчитанным
+    поколениям (по каждой пачке шагов - среднее ее начала и конца), деленная
+    на время. Площадь рамки для этого не годится: у разреженных движков и
+    Hashlife она растет вместе с улетевшими глайдерами, а работы не прибавляет;
+  - пиковая память (tracemalloc: построение движка и первые поколения);
+  - время отрисовки кадра GridWidget в мс (Qt на платформе offscreen),
+    масштаб подобран так, чтобы паттерн целиком помещался в окно.
+
+Результаты можно записать в JSON (--json) и сравнить с прошлым прогоном
+(--baseline), например до и после коммита.
+
+Примеры:
+    python benchmarks/suite.py
+    python benchmarks/suite.py --engines set numpy hashlife --workloads acorn gosper --json before.json
+    python benchmarks/suite.py --baseline before.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import ENGINES, create_engine  # noqa: E402
+from parallel_scaling import random_soup  # noqa: E402
+
+
+def parse_picture(rows):
+    """Клетки паттерна, нарисованного строками: 'O' - живая клетка, '.' - мертвая."""
+    return [(col, row) for row, line in enumerate(rows) for col, char in enumerate(line) if char == 'O']
+
+
+R_PENTOMINO = parse_picture([
+    ".OO",
+    "OO.",
+    ".O.",
+])
+
+ACORN = parse_picture([
+    ".O.....",
+    "...O...",
+    "OO..OOO",
+])
+
+GOSPER_GUN = parse_picture([
+    "........................O...........",
+    "......................O.O...........",
+    "............OO......OO............OO",
+    "...........O...O....OO............OO",
+    "OO........O.....O...OO..............",
+    "OO........O...O.OO....O.O...........",
+    "..........O.....O.......O...........",
+    "...........O...O....................",
+    "............OO......................",
+])
+
+# Имя нагрузки -> (функция (density, seed) -> клетки, число поколений).
+# R-пентамино и желудь прогоняются до стабилизации.
+WORKLOADS = {
+    'r-pentomino': (lambda density, seed: R_PENTOMINO, 1103),
+    'gosper': (lambda density, seed: GOSPER_GUN, 1000),
+    'acorn': (lambda density, seed: ACORN, 5206),
+}
+for _power in range(4, 8):
+    # Случайные поля примерно из 10^4 .. 10^7 живых клеток: сторона
+    # квадрата подбирается под плотность.
+    WORKLOADS[f'soup-1e{_power}'] = (
+        lambda density, seed, count=10 ** _power: random_soup(round(math.sqrt(count / density)), density, seed),
+        100)
+
+
+def time_steps(engine, generations, max_seconds):
+    """
+    Шагает движок пачками растущего размера, пока не пройдет generations
+    поколений или max_seconds секунд. Пачки позволяют Hashlife шагать
+    большими степенями двойки. Возвращает (поколений, секунд, живых клеток
+    x поколений). Население замеряется между пачками, вне замера времени.
+    """
+    done = 0
+    batch = 1
+    seconds = 0.0
+    cell_generations = 0
+    population = engine.population
+    while done < generations:
+        batch = min(batch, generations - done)
+        start = time.perf_counter()
+        engine.step(batch)
+        seconds += time.perf_counter() - start
+        done += batch
+        new_population = engine.population
+        cell_generations += batch * (population + new_population) / 2
+        population = new_population
+        if seconds > max_seconds:
+            break
+        batch *= 2
+    return done, seconds, cell_generations
+
+
+def peak_memory(engine_name, cells, generations):
+    """Пиковый объем выделенной памяти (МБ) при построении движка и первых поколениях."""
+    tracemalloc.start()
+    try:
+        engine = create_engine(engine_name, cells=cells)
+        engine.step(generations)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    shutdown = getattr(engine, 'shutdown', None)
+    if shutdown:
+        shutdown()
+    return peak / 2 ** 20
+
+
+class Renderer:
+    """Обертка над GridWidget для замера отрисовки без экрана."""
+
+    def __init__(self, width, height):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PyQt6.QtWidgets import QApplication
+        import gameofthelife
+
+        self._app = QApplication.instance() or QApplication([])
+        self._module = gameofthelife
+        self.width = width
+        self.height = height
+
+    def frame_ms(self, engine, frames):
+        """Среднее время полной перерисовки кадра в мс и выбранный масштаб."""
+        widget = self._module.GridWidget(engine=engine)
+        widget.resize(self.width, self.height)
+        box = engine.bounding_box
+        if box is not None:
+            min_col, min_row, max_col, max_row = box
+            zoom = min(self.width / (max_col - min_col + 1), self.height / (max_row - min_row + 1))
+            widget.zoom = max(self._module.MIN_ZOOM, min(zoom, 100))
+            widget.offset_x = self.width / 2 - (min_col + max_col + 1) / 2 * widget.zoom
+            widget.offset_y = self.height / 2 - (min_row + max_row + 1) / 2 * widget.zoom
+        widget.refresh()
+        widget.show()
+        self._app.processEvents()
+        widget.repaint()  # Первый кадр строит кэши (сетка, пирамида плотности).
+        start = time.perf_counter()
+        for _ in range(frames):
+            widget.repaint()
+        elapsed = time.perf_counter() - start
+        widget.hide()
+        widget.deleteLater()
+        self._app.processEvents()
+        return elapsed / frames * 1000, widget.zoom
+
+
+def run_one(engine_name, workload, args, renderer):
+    """Все замеры одной пары (движок, нагрузка)."""
+    make_cells, generations = WORKLOADS[workload]
+    if args.generations:
+        generations = args.generations
+    cells = make_cells(args.density, args.seed)
+
+    start = time.perf_counter()
+    engine = create_engine(engine_name, cells=cells)
+    setup = time.perf_counter() - start
+    done, seconds, cell_generations = time_steps(engine, generations, args.max_seconds)
+
+    result = {
+        'engine': engine_name,
+        'workload': workload,
+        'cells': len(cells),
+        'setup_s': setup,
+        'generations': done,
+        'seconds': seconds,
+        'gens_per_s': done / seconds if seconds else None,
+        'live_cell_gens_per_s': cell_generations / seconds if seconds else None,
+        'population': engine.population,
+        'peak_memory_mb': None,
+        'render_ms': None,
+        'render_zoom': None,
+    }
+    if renderer is not None:
+        result['render_ms'], result['render_zoom'] = renderer.frame_ms(engine, args.frames)
+    shutdown = getattr(engine, 'shutdown', None)
+    if shutdown:
+        shutdown()
+    if not args.no_memory:
+        result['peak_memory_mb'] = peak_memory(engine_name, cells, min(done, args.memory_generations))
+    return result
+
+
+def git_commit():
+    """Хэш текущего коммита или None, если git недоступен."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_number(value, digits=1):
+    if value is None:
+        return '-'
+    if value >= 1e6:
+        return f"{value / 1e6:.{digits}f}M"
+    if value >= 1e3:
+        return f"{value / 1e3:.{digits}f}k"
+    return f"{value:.{digits}f}"
+
+
+def print_row(result, baseline):
+    speedup = ''
+    old = baseline.get((result['engine'], result['workload']))
+    if old and old.get('gens_per_s') and result['gens_per_s']:
+        speedup = f" x{result['gens_per_s'] / old['gens_per_s']:.2f}"
+    print(f"{result['engine']:>9} {result['workload']:>12} {result['generations']:>7} "
+          f"{format_number(result['gens_per_s']):>9}{speedup:<7} "
+          f"{format_number(result['live_cell_gens_per_s']):>12} "
+          f"{format_number(result['peak_memory_mb']):>9} {format_number(result['render_ms'], 2):>9}",
+          flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES))
+    parser.add_argument('--workloads', nargs='+', choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument('--generations', type=int, help="число поколений вместо стандартного для нагрузки")
+    parser.add_argument('--max-seconds', type=float, default=10.0,
+                        help="предел времени шагов на одну пару (движок, нагрузка)")
+    parser.add_argument('--density', type=float, default=0.35, help="плотность случайных полей")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--frames', type=int, default=10, help="кадров на замер отрисовки")
+    parser.add_argument('--size', type=int, nargs=2, default=(800, 600), metavar=('W', 'H'),
+                        help="размер окна отрисовки")
+    parser.add_argument('--no-render', action='store_true', help="не замерять отрисовку (без PyQt6)")
+    parser.add_argument('--no-memory', action='store_true', help="не замерять пиковую память")
+    parser.add_argument('--memory-generations', type=int, default=10,
+                        help="сколько поколений прогонять при замере памяти")
+    parser.add_argument('--json', help="записать результаты в этот файл")
+    parser.add_argument('--baseline', help="JSON прошлого прогона для сравнения скорости")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = {(r['engine'], r['workload']): r for r in json.load(f)['results']}
+
+    renderer = None if args.no_render else Renderer(*args.size)
+
+    print(f"{'движок':>9} {'нагрузка':>12} {'пок.':>7} {'пок/с':>9}{'':<7} {'жив.кл*пок/с':>12} "
+          f"{'память,МБ':>9} {'кадр,мс':>9}")
+    results = []
+    for workload in args.workloads:
+        for engine_name in args.engines:
+            result = run_one(engine_name, workload, args, renderer)
+            results.append(result)
+            print_row(result, baseline)
+
+    if args.json:
+        report = {
+            'meta': {
+                'commit': git_commit(),
+                'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'args': {key: value for key, value in vars(args).items() if key not in ('json', 'baseline')},
+            },
+            'results': results,
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
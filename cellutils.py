@@ -0,0 +1,251 @@
+"""
+Компактное двоичное представление набора клеток для хранения в БД.
+
+Первый байт - формат, дальше сжатые zlib данные:
+  - FORMAT_VARINT: клетки отсортированы по (ряд, колонка) и записаны
+    разностями соседних координат в виде varint (zigzag для знаковых).
+    Подходит для разреженных паттернов в большой рамке.
+  - FORMAT_BITMAP: битовая карта ограничивающего прямоугольника.
+    Подходит для плотных полей (супов, заполненных областей).
+Кодировщик выбирает формат по плотности клеток в прямоугольнике.
+
+Декодирование возвращает массивы NumPy (колонки, ряды): их движки
+принимают напрямую (BaseEngine.set_cell_arrays), без кортежей Python.
+
+Здесь же - метаданные паттерна для каталога: канонический хэш формы и
+класс поведения (натюрморт, осциллятор, корабль).
+"""
+import hashlib
+import struct
+import zlib
+
+import numpy as np
+
+from engine import LifeEngine
+
+FORMAT_VARINT = 1
+FORMAT_BITMAP = 2
+
+# Заголовок битовой карты: min_col, min_row, ширина, высота.
+_BITMAP_HEADER = struct.Struct('<qqII')
+
+
+class CellFormatError(ValueError):
+    """Данные не похожи на закодированный набор клеток."""
+
+
+def cells_to_arrays(cells):
+    """Массивы (колонки, ряды) int64 из итерируемого набора клеток (колонка, ряд)."""
+    if isinstance(cells, tuple) and len(cells) == 2 and isinstance(cells[0], np.ndarray):
+        return cells
+    coords = np.array(list(cells), dtype=np.int64).reshape(-1, 2)
+    return coords[:, 0], coords[:, 1]
+
+
+def parse_text_cells(text):
+    """Разбирает старый текстовый формат "x1,y1;x2,y2;..." в массивы (колонки, ряды)."""
+    if not text:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    values = np.array(text.replace(';', ',').split(','), dtype=np.int64).reshape(-1, 2)
+    return values[:, 0], values[:, 1]
+
+
+# --- varint ---
+
+def _zigzag(values):
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _unzigzag(values):
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+
+def _encode_varints(values):
+    """Кодирует массив uint64 в поток varint (по 7 бит, старший бит - продолжение)."""
+    if values.size == 0:
+        return b''
+    lengths = np.ones(values.size, dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        lengths += rest > 0
+        rest >>= np.uint64(7)
+    ends = np.cumsum(lengths)
+    out = np.empty(int(ends[-1]), dtype=np.uint8)
+    # Номер байта внутри своего числа для каждого байта потока.
+    owner = np.repeat(np.arange(values.size), lengths)
+    position = np.arange(out.size) - np.repeat(ends - lengths, lengths)
+    out[:] = (values[owner] >> (7 * position).astype(np.uint64)) & np.uint64(0x7F)
+    # У всех байтов, кроме последнего байта числа, ставим бит продолжения.
+    out[np.flatnonzero(position < lengths[owner] - 1)] |= 0x80
+    return out.tobytes()
+
+
+def _decode_varints(data):
+    """Разбирает поток varint в массив uint64."""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if raw.size == 0:
+        return np.zeros(0, dtype=np.uint64)
+    last = (raw & 0x80) == 0
+    if not last[-1]:
+        raise CellFormatError("Оборванный varint")
+    ends = np.flatnonzero(last)
+    owner = np.repeat(np.arange(ends.size), np.diff(np.concatenate([[-1], ends])))
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    position = np.arange(raw.size) - starts[owner]
+    if position.max() > 9:
+        raise CellFormatError("Слишком длинный varint")
+    parts = (raw & 0x7F).astype(np.uint64) << (7 * position).astype(np.uint64)
+    return np.bitwise_or.reduceat(parts, starts)
+
+
+# --- Кодирование ---
+
+def _encode_varint_payload(cols, rows):
+    order = np.lexsort((cols, rows))
+    cols, rows = cols[order], rows[order]
+    # Повторы клеток после сортировки стоят рядом - отбрасываем их.
+    keep = np.ones(cols.size, dtype=bool)
+    keep[1:] = (cols[1:] != cols[:-1]) | (rows[1:] != rows[:-1])
+    cols, rows = cols[keep], rows[keep]
+    # Ряды не убывают: их разности неотрицательны. Колонки - знаковые разности.
+    row_steps = _zigzag(np.diff(rows, prepend=0))
+    col_steps = _zigzag(np.diff(cols, prepend=0))
+    values = np.empty(2 * cols.size, dtype=np.uint64)
+    values[0::2] = row_steps
+    values[1::2] = col_steps
+    return _encode_varints(values)
+
+
+def _decode_varint_payload(payload):
+    values = _decode_varints(payload)
+    if values.size % 2:
+        raise CellFormatError("Нечетное число координат")
+    rows = np.cumsum(_unzigzag(values[0::2]))
+    cols = np.cumsum(_unzigzag(values[1::2]))
+    return cols, rows
+
+
+def _encode_bitmap_payload(cols, rows):
+    min_col, min_row = int(cols.min()), int(rows.min())
+    width = int(cols.max()) - min_col + 1
+    height = int(rows.max()) - min_row + 1
+    mask = np.zeros((height, width), dtype=np.uint8)
+    mask[rows - min_row, cols - min_col] = 1
+    return _BITMAP_HEADER.pack(min_col, min_row, width, height) + np.packbits(mask).tobytes()
+
+
+def _decode_bitmap_payload(payload):
+    if len(payload) < _BITMAP_HEADER.size:
+        raise CellFormatError("Короткий заголовок битовой карты")
+    min_col, min_row, width, height = _BITMAP_HEADER.unpack_from(payload)
+    bits = np.frombuffer(payload, dtype=np.uint8, offset=_BITMAP_HEADER.size)
+    if bits.size * 8 < width * height:
+        raise CellFormatError("Битовая карта короче заголовка")
+    mask = np.unpackbits(bits, count=width * height).reshape(height, width)
+    rows, cols = np.nonzero(mask)
+    return cols.astype(np.int64) + min_col, rows.astype(np.int64) + min_row
+
+
+def encode_cells(cells):
+    """Кодирует клетки (итерируемые кортежи или пара массивов (колонки, ряды)) в bytes."""
+    cols, rows = cells_to_arrays(cells)
+    if cols.size == 0:
+        return bytes([FORMAT_VARINT]) + zlib.compress(b'')
+    area = (int(cols.max()) - int(cols.min()) + 1) * (int(rows.max()) - int(rows.min()) + 1)
+    # Битовая карта - area / 8 байт до сжатия, varint - от 2 байт на клетку.
+    if area < 16 * cols.size:
+        fmt, payload = FORMAT_BITMAP, _encode_bitmap_payload(cols, rows)
+    else:
+        fmt, payload = FORMAT_VARINT, _encode_varint_payload(cols, rows)
+    return bytes([fmt]) + zlib.compress(payload)
+
+
+def decode_cells(data):
+    """Декодирует результат encode_cells в массивы (колонки, ряды) int64."""
+    if not data:
+        raise CellFormatError("Пустые данные")
+    fmt = data[0]
+    try:
+        payload = zlib.decompress(data[1:])
+    except zlib.error as e:
+        raise CellFormatError(f"Поврежденные данные: {e}") from None
+    if fmt == FORMAT_VARINT:
+        return _decode_varint_payload(payload)
+    if fmt == FORMAT_BITMAP:
+        return _decode_bitmap_payload(payload)
+    raise CellFormatError(f"Неизвестный формат клеток: {fmt}")
+
+
+# --- Канонический вид ---
+
+# Восемь симметрий квадрата: (x, y) -> (a*x + b*y, c*x + d*y).
+SYMMETRIES = [(1, 0, 0, 1), (0, -1, 1, 0), (-1, 0, 0, -1), (0, 1, -1, 0),
+              (-1, 0, 0, 1), (1, 0, 0, -1), (0, 1, 1, 0), (0, -1, -1, 0)]
+
+
+def canonical_hash(cells):
+    """
+    Хэш формы паттерна, не зависящий от его положения, поворотов и отражений:
+    из восьми симметричных вариантов, сдвинутых в начало координат, берется
+    наименьший по байтам.
+    """
+    cols, rows = cells_to_arrays(cells)
+    best = b''
+    for a, b, c, d in SYMMETRIES:
+        x = a * cols + b * rows
+        y = c * cols + d * rows
+        if x.size:
+            x = x - x.min()
+            y = y - y.min()
+        order = np.lexsort((x, y))
+        key = np.stack([x[order], y[order]], axis=1).astype('<i8').tobytes()
+        if not best or key < best:
+            best = key
+    return hashlib.sha1(best).hexdigest()
+
+
+# --- Классификация ---
+
+KIND_DIES = 'dies'
+KIND_STILL = 'still'
+KIND_OSCILLATOR = 'oscillator'
+KIND_SPACESHIP = 'spaceship'
+KIND_UNKNOWN = 'unknown'
+
+# Пределы классификации: дольше периода и больше клеток не проверяем.
+MAX_PERIOD = 128
+MAX_CLASSIFY_POPULATION = 10_000
+
+
+def _normalized(cells):
+    """Форма набора клеток (сдвинутая в начало координат) и ее сдвиг."""
+    min_col = min(col for col, _ in cells)
+    min_row = min(row for _, row in cells)
+    return frozenset((col - min_col, row - min_row) for col, row in cells), (min_col, min_row)
+
+
+def classify(cells, max_period=MAX_PERIOD, max_population=MAX_CLASSIFY_POPULATION, rule=None):
+    """
+    Определяет поведение паттерна: (класс, период). Период - число поколений,
+    за которое паттерн возвращается к исходной форме (на месте - натюрморт или
+    осциллятор, со сдвигом - корабль). Если форма не повторилась за
+    max_period поколений, класс KIND_UNKNOWN и период None. rule - правило
+    (rules.Rule, по умолчанию B3/S23); правила Generations не классифицируются.
+    """
+    cols, rows = cells_to_arrays(cells)
+    if cols.size == 0:
+        return KIND_DIES, None
+    if cols.size > max_population or (rule is not None and rule.states > 2):
+        return KIND_UNKNOWN, None
+    engine = LifeEngine(zip(cols.tolist(), rows.tolist()), rule=rule)
+    shape, offset = _normalized(engine.live_cells)
+    for generation in range(1, max_period + 1):
+        engine.step()
+        if not engine.live_cells:
+            return KIND_DIES, None
+        new_shape, new_offset = _normalized(engine.live_cells)
+        if new_shape == shape:
+            if new_offset != offset:
+                return KIND_SPACESHIP, generation
+            return (KIND_STILL if generation == 1 else KIND_OSCILLATOR), generation
+    return KIND_UNKNOWN, None
@@ -0,0 +1,254 @@
+"""
+Перепись объектов поля: какие натюрморты, осцилляторы и корабли на нем есть.
+
+Поле делится на связные (с учетом диагоналей) компоненты, каждая
+компонента приводится к каноническому виду с точностью до сдвига и восьми
+симметрий квадрата и ищется в индексе библиотеки паттернов (таблица
+patterns). Все делается векторно над массивами NumPy, без кортежа Python
+на клетку:
+  - компоненты - система непересекающихся множеств на отсортированных
+    упакованных ключах клеток (подвешивание корней и сжатие путей);
+  - ключ компоненты - полиномиальный хэш ее клеток (statehash.group_hashes)
+    относительно угла рамки; канонический ключ - наименьший из хэшей
+    восьми симметричных вариантов.
+Имена компонент кэшируются по ключу в исходной ориентации, поэтому на
+следующих поколениях не изменившиеся компоненты (натюрморты, осцилляторы в
+уже виденной фазе) не канонизируются заново. Модуль не зависит от Qt.
+"""
+from collections import Counter
+
+import numpy as np
+
+from cellutils import KIND_OSCILLATOR, KIND_SPACESHIP, KIND_STILL, SYMMETRIES, classify
+from engine import LifeEngine
+from statehash import group_hashes
+
+# Кэш имен сбрасывается, когда в нем больше записей (хаотичное поле
+# каждое поколение дает новые формы).
+MAX_CACHE = 1_000_000
+
+
+def components(cols, rows):
+    """
+    Делит клетки на связные компоненты. Возвращает (колонки, ряды, starts):
+    клетки переупорядочены так, что каждая компонента идет подряд, starts -
+    индексы начала компонент.
+    """
+    cols = np.asarray(cols, dtype=np.int64)
+    rows = np.asarray(rows, dtype=np.int64)
+    # np.sort, а не np.unique: в NumPy 2 unique основан на хэш-таблице и
+    # на миллионе ключей в разы медленнее сортировки.
+    if cols.size == 0:
+        return cols, rows, np.zeros(0, dtype=np.intp)
+    keys = np.sort((rows << 32) + (cols + (1 << 31)))
+    keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+    n = keys.size
+
+    # Клетки горизонтального отрезка сразу указывают на его первую клетку,
+    # ребра нужны только к соседям в ряду ниже (соседи сверху - те же ребра
+    # в обратную сторону). Ключи отсортированы по (ряд, колонка).
+    index = np.arange(n)
+    run_start = np.ones(n, dtype=bool)
+    run_start[1:] = keys[1:] != keys[:-1] + 1
+    parent = np.maximum.accumulate(np.where(run_start, index, 0))
+    below = keys + (1 << 32)
+    start = np.searchsorted(keys, below - 1)
+    first, second = [], []
+    for k in range(3):
+        # Среди трех ключей, начиная с первого >= (ряд + 1, колонка - 1),
+        # соседи - те, что не дальше (ряд + 1, колонка + 1).
+        pos = start + k
+        valid = np.flatnonzero(pos < n)
+        valid = valid[keys[pos[valid]] <= below[valid] + 1]
+        first.append(valid)
+        second.append(pos[valid])
+    first = np.concatenate(first)
+    second = np.concatenate(second)
+
+    # Каждая клетка указывает на клетку с меньшим или равным индексом;
+    # корень компоненты - клетка с наименьшим индексом.
+    while True:
+        a, b = parent[first], parent[second]
+        low, high = np.minimum(a, b), np.maximum(a, b)
+        differ = low != high
+        if not differ.any():
+            break
+        # Подвешиваем больший корень к меньшему, затем сжимаем пути до корней.
+        np.minimum.at(parent, high[differ], low[differ])
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+
+    order = np.argsort(parent, kind='stable')
+    labels = parent[order]
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate([[True], labels[1:] != labels[:-1]]))
+    return (keys & 0xFFFFFFFF) - (1 << 31), keys >> 32, starts
+
+
+def _relative(cols, rows, starts):
+    """Координаты клеток относительно угла рамки своей компоненты."""
+    group = np.repeat(np.arange(starts.size), np.diff(np.append(starts, cols.size)))
+    return (cols - np.minimum.reduceat(cols, starts)[group],
+            rows - np.minimum.reduceat(rows, starts)[group], group)
+
+
+def canonical_keys(cols, rows, starts):
+    """
+    Канонические ключи компонент (клетки каждой идут подряд, starts - начала):
+    наименьший из хэшей восьми симметричных вариантов, сдвинутых в начало
+    координат. Не зависит от положения, поворота и отражения компоненты.
+    """
+    dx, dy, group = _relative(cols, rows, starts)
+    width = np.maximum.reduceat(dx, starts)[group]
+    height = np.maximum.reduceat(dy, starts)[group]
+    best = None
+    for a, b, c, d in SYMMETRIES:
+        # Каждая симметрия переставляет оси и/или отражает их: отраженная
+        # ось сдвигается в начало координат на ширину или высоту рамки.
+        x = a * dx + b * dy + (width if a < 0 else 0) + (height if b < 0 else 0)
+        y = c * dx + d * dy + (width if c < 0 else 0) + (height if d < 0 else 0)
+        keys = group_hashes(x, y, starts)
+        best = keys if best is None else np.minimum(best, keys)
+    return best
+
+
+def shape_key(cols, rows):
+    """Канонический ключ одного набора клеток (массивы колонок и рядов)."""
+    cols = np.asarray(cols, dtype=np.int64)
+    rows = np.asarray(rows, dtype=np.int64)
+    return int(canonical_keys(cols, rows, np.zeros(1, dtype=np.intp))[0])
+
+
+def _phase_keys(cols, rows, period, rule=None):
+    """(Канонический ключ, население) каждой фазы паттерна с периодом period."""
+    keys = [(shape_key(cols, rows), int(cols.size))]
+    engine = LifeEngine(zip(cols.tolist(), rows.tolist()), rule=rule)
+    for _ in range(period - 1):
+        engine.step()
+        phase_cols, phase_rows = engine.cell_arrays()
+        keys.append((shape_key(phase_cols, phase_rows), int(phase_cols.size)))
+    return keys
+
+
+def library_index(patterns):
+    """
+    Индекс для распознавания: (канонический ключ, население) -> имя.
+    patterns - итерируемые (имя, класс, период, (колонки, ряды)), как у
+    database.get_pattern_shapes. Осцилляторы и корабли индексируются во
+    всех фазах; при совпадении форм остается первое имя.
+    """
+    index = {}
+    for name, kind, period, (cols, rows) in patterns:
+        if cols.size == 0:
+            continue
+        phases = period if kind in (KIND_OSCILLATOR, KIND_SPACESHIP) and period else 1
+        for key in _phase_keys(cols, rows, phases):
+            index.setdefault(key, name)
+    return index
+
+
+def load_library():
+    """Индекс библиотеки паттернов из базы данных."""
+    import database
+    return library_index(database.get_pattern_shapes())
+
+
+class Census:
+    """
+    Перепись объектов поля. Объекты из библиотеки называются ее именами,
+    остальные - в духе apgcode: xs<население> (натюрморт), xp<период>
+    (осциллятор), xq<период> (корабль), zz<население> (не классифицирован)
+    и шестнадцатеричный канонический ключ после "_". Библиотека хранит
+    паттерны B3/S23, поэтому при другом правиле (rule) по ней узнаются формы,
+    а классифицируются объекты по правилу поля.
+    """
+
+    def __init__(self, library=None, classify=False, rule=None):
+        # Индекс library_index; None - загрузить из базы при первой переписи.
+        self.library = library
+        # Классифицировать ли объекты не из библиотеки (прогон до 128
+        # поколений на каждую новую форму - для осевших полей, не для хаоса).
+        self.classify = classify
+        # Правило поля (rules.Rule) для классификации; None - B3/S23.
+        self.rule = rule
+        # (хэш в исходной ориентации, население, ширина, высота) -> имя.
+        self._names = {}
+        # Имена неизвестных объектов по каноническому ключу (все фазы).
+        self._unknown = {}
+
+    def count(self, cols, rows):
+        """Перепись клеток (колонки, ряды): Counter имя объекта -> количество."""
+        cols, rows, starts = components(cols, rows)
+        if starts.size == 0:
+            return Counter()
+        if self.library is None:
+            self.library = load_library()
+        if len(self._names) > MAX_CACHE:
+            self._names.clear()
+
+        dx, dy, group = _relative(cols, rows, starts)
+        sizes = np.diff(np.append(starts, cols.size))
+        widths = np.maximum.reduceat(dx, starts)
+        heights = np.maximum.reduceat(dy, starts)
+        hashes = group_hashes(dx, dy, starts)
+
+        # Одинаковые формы в одной ориентации (тысячи блоков и мигалок)
+        # склеиваются здесь, и дальше Python видит только разные формы.
+        order = np.lexsort((heights, widths, sizes, hashes))
+        fields = [a[order] for a in (hashes, sizes, widths, heights)]
+        new = np.zeros(order.size, dtype=bool)
+        new[0] = True
+        for a in fields:
+            new[1:] |= a[1:] != a[:-1]
+        shapes = order[new]
+        counts = np.diff(np.append(np.flatnonzero(new), order.size))
+        oriented = list(zip(*(a[new].tolist() for a in fields)))
+        names = [self._names.get(key) for key in oriented]
+
+        missing = [i for i, name in enumerate(names) if name is None]
+        if missing:
+            # Канонизируем по одной компоненте каждой формы, которой еще не было в кэше.
+            need = np.zeros(starts.size, dtype=bool)
+            need[shapes[missing]] = True
+            cells = np.flatnonzero(need[group])
+            # Компоненты идут в cells по возрастанию номера, а не в порядке missing.
+            components_needed = np.flatnonzero(need)
+            sub_sizes = sizes[components_needed]
+            sub_starts = np.concatenate([[0], np.cumsum(sub_sizes)[:-1]])
+            keys = canonical_keys(cols[cells], rows[cells], sub_starts)
+            found = np.searchsorted(components_needed, shapes[missing])
+            for i, key, start, size in zip(missing, keys[found].tolist(), sub_starts[found].tolist(),
+                                           sub_sizes[found].tolist()):
+                name = self.library.get((key, size)) or self._unknown.get((key, size))
+                if name is None:
+                    if self.classify:
+                        name = self._classify_unknown(key, size, cols[cells[start:start + size]],
+                                                      rows[cells[start:start + size]])
+                    else:
+                        name = f'zz{size}_{key:016x}'
+                names[i] = self._names[oriented[i]] = name
+
+        census = Counter()
+        for name, count in zip(names, counts.tolist()):
+            census[name] += count
+        return census
+
+    def count_engine(self, engine):
+        """Перепись текущего поля движка."""
+        return self.count(*engine.cell_arrays())
+
+    def _classify_unknown(self, key, size, cols, rows):
+        """Имя объекта не из библиотеки по его классу; запоминается для всех фаз."""
+        kind, period = classify((cols, rows), rule=self.rule)
+        phases = [(key, size)]
+        if kind in (KIND_OSCILLATOR, KIND_SPACESHIP):
+            phases = _phase_keys(cols, rows, period, self.rule)
+        prefix = {KIND_STILL: f'xs{size}', KIND_OSCILLATOR: f'xp{period}',
+                  KIND_SPACESHIP: f'xq{period}'}.get(kind, f'zz{size}')
+        name = f'{prefix}_{min(phase_key for phase_key, _ in phases):016x}'
+        for phase in phases:
+            self._unknown[phase] = name
+        return name
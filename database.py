@@ -1,60 +1,403 @@
+"""
+Библиотека паттернов в SQLite.
+
+Все функции модуля работают через общий менеджер соединений (get_db):
+у каждого потока свое долгоживущее соединение с базой в режиме WAL, так
+что читать библиотеку можно и из интерфейса, и из фонового потока импорта
+одновременно, а записи выполняются по одной. Схема создается и обновляется
+один раз, при первом обращении к базе.
+"""
+import hashlib
 import sqlite3
+import threading
+from contextlib import contextmanager
+
+import cellutils
 
 DATABASE_NAME = 'patterns.db'
 
 
+class ConnectionManager:
+    """Потокобезопасный источник соединений с одной базой (по одному на поток)."""
+
+    # Сколько секунд ждать, пока другой процесс держит блокировку записи.
+    BUSY_TIMEOUT = 30.0
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # Все открытые соединения - чтобы закрыть их в close().
+        self._connections = []
+        self._lock = threading.Lock()
+        # Записи внутри процесса выполняются по одной: так транзакции не
+        # упираются друг в друга с SQLITE_BUSY.
+        self._write_lock = threading.RLock()
+        self._schema_ready = False
+
+    def connection(self):
+        """Соединение текущего потока (создается при первом обращении)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Соединение используется только своим потоком, но закрывается
+            # в close() из любого, поэтому проверку потока отключаем.
+            conn = sqlite3.connect(self.path, timeout=self.BUSY_TIMEOUT, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            with self._lock:
+                self._connections.append(conn)
+            self._local.conn = conn
+            self._ensure_schema(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Транзакция на соединении текущего потока: commit при успехе, rollback при ошибке."""
+        conn = self.connection()
+        with self._write_lock, conn:
+            yield conn
+
+    def _ensure_schema(self, conn):
+        if self._schema_ready:
+            return
+        with self._write_lock:
+            if not self._schema_ready:
+                with conn:
+                    create_schema(conn)
+                self._schema_ready = True
+
+    def close(self):
+        """Закрывает все соединения (вызывать, когда база больше не используется)."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def close_thread(self):
+        """Закрывает соединение текущего потока (вызывать перед завершением рабочего потока)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_db():
+    """Менеджер соединений для текущего DATABASE_NAME."""
+    with _managers_lock:
+        manager = _managers.get(DATABASE_NAME)
+        if manager is None:
+            manager = _managers[DATABASE_NAME] = ConnectionManager(DATABASE_NAME)
+        return manager
+
+
+def close():
+    """Закрывает все соединения со всеми открытыми базами."""
+    with _managers_lock:
+        managers = list(_managers.values())
+        _managers.clear()
+    for manager in managers:
+        manager.close()
+
+
+def close_thread():
+    """Закрывает соединения текущего потока со всеми открытыми базами."""
+    with _managers_lock:
+        managers = list(_managers.values())
+    for manager in managers:
+        manager.close_thread()
+
+
+def create_schema(conn):
+    """Создает таблицу, если ее нет, и применяет недостающие миграции."""
+    if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+        return
+    # Вся миграция - одна транзакция (иначе sqlite3 выполняет DDL вне ее).
+    # Пока мы ждали блокировку записи, базу мог обновить другой процесс
+    # (например, окно и soupsearch --library над одним patterns.db), поэтому
+    # migrate перечитывает версию уже под блокировкой.
+    conn.execute("BEGIN IMMEDIATE")
+    cursor = conn.cursor()
+    # Создаем таблицу для хранения паттернов
+    # name - название паттерна
+    # cells - клетки паттерна в двоичном виде (см. cellutils.encode_cells)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS patterns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            cells BLOB NOT NULL
+        )
+    """)
+    migrate(conn)
+
+
 def init_db():
-    """Создает базу данных и таблицу, если их не существует."""
-    with sqlite3.connect(DATABASE_NAME) as conn:
-        cursor = conn.cursor()
-        # Создаем таблицу для хранения паттернов
-        # name - название паттерна
-        # cells - координаты живых клеток в виде текста
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS patterns (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                cells TEXT NOT NULL
-            )
-        """)
-        conn.commit()
-
-
-def get_patterns():
-    """Возвращает список всех паттернов (id, name) из базы данных."""
-    with sqlite3.connect(DATABASE_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name FROM patterns ORDER BY name")
-        return cursor.fetchall()
+    """Открывает базу данных, при необходимости создавая и обновляя схему."""
+    get_db().connection()
+
+
+# --- Миграции схемы ---
+# Номер версии схемы хранится в PRAGMA user_version. Миграция с индексом i
+# переводит базу из версии i в версию i + 1.
+
+def _migrate_cells_to_blob(conn):
+    """Переводит клетки из текста "x1,y1;x2,y2;..." в двоичный формат."""
+    rows = conn.execute("SELECT id, cells FROM patterns WHERE typeof(cells) = 'text'").fetchall()
+    for pattern_id, text in rows:
+        blob = cellutils.encode_cells(cellutils.parse_text_cells(text))
+        conn.execute("UPDATE patterns SET cells = ? WHERE id = ?", (blob, pattern_id))
+
+
+# Метаданные паттерна, вычисляемые при сохранении (см. pattern_metadata).
+METADATA_COLUMNS = [
+    ('population', 'INTEGER'),
+    ('min_col', 'INTEGER'),
+    ('min_row', 'INTEGER'),
+    ('width', 'INTEGER'),
+    ('height', 'INTEGER'),
+    ('kind', 'TEXT'),
+    ('period', 'INTEGER'),
+    ('canonical_hash', 'TEXT'),
+]
+
+
+def _migrate_add_metadata(conn):
+    """Добавляет колонки метаданных, индексы и полнотекстовый поиск по имени."""
+    for column, column_type in METADATA_COLUMNS:
+        conn.execute(f"ALTER TABLE patterns ADD COLUMN {column} {column_type}")
+    for pattern_id, blob in conn.execute("SELECT id, cells FROM patterns").fetchall():
+        metadata = pattern_metadata(cellutils.decode_cells(blob))
+        assignments = ", ".join(f"{column} = ?" for column in metadata)
+        conn.execute(f"UPDATE patterns SET {assignments} WHERE id = ?", (*metadata.values(), pattern_id))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_patterns_population ON patterns (population)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_patterns_kind ON patterns (kind, period)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_patterns_hash ON patterns (canonical_hash)")
+    try:
+        conn.execute("CREATE VIRTUAL TABLE patterns_fts USING fts5(name, content='patterns', content_rowid='id')")
+    except sqlite3.OperationalError:
+        # SQLite собран без FTS5 - поиск будет работать через LIKE.
+        return
+    # Внешнее содержимое FTS синхронизируется с таблицей триггерами.
+    conn.execute("""
+        CREATE TRIGGER patterns_fts_insert AFTER INSERT ON patterns BEGIN
+            INSERT INTO patterns_fts (rowid, name) VALUES (new.id, new.name);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER patterns_fts_delete AFTER DELETE ON patterns BEGIN
+            INSERT INTO patterns_fts (patterns_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER patterns_fts_update AFTER UPDATE OF name ON patterns BEGIN
+            INSERT INTO patterns_fts (patterns_fts, rowid, name) VALUES ('delete', old.id, old.name);
+            INSERT INTO patterns_fts (rowid, name) VALUES (new.id, new.name);
+        END
+    """)
+    conn.execute("INSERT INTO patterns_fts (patterns_fts) VALUES ('rebuild')")
+
+
+def content_hash(blob):
+    """Хэш содержимого паттерна (его клеток в двоичном виде) - ключ миниатюр."""
+    return hashlib.sha1(blob).hexdigest()
+
+
+def _migrate_add_thumbnails(conn):
+    """Добавляет хэш содержимого паттернов и таблицу их миниатюр (PNG, см. thumbnails.py)."""
+    conn.execute("ALTER TABLE patterns ADD COLUMN content_hash TEXT")
+    for pattern_id, blob in conn.execute("SELECT id, cells FROM patterns").fetchall():
+        conn.execute("UPDATE patterns SET content_hash = ? WHERE id = ?", (content_hash(blob), pattern_id))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_patterns_content ON patterns (content_hash)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS thumbnails (
+            content_hash TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            png BLOB NOT NULL,
+            PRIMARY KEY (content_hash, size)
+        )
+    """)
+    # Миниатюра удаляется вместе с последним паттерном с таким содержимым.
+    conn.execute("""
+        CREATE TRIGGER thumbnails_delete AFTER DELETE ON patterns BEGIN
+            DELETE FROM thumbnails WHERE content_hash = old.content_hash
+                AND NOT EXISTS (SELECT 1 FROM patterns WHERE content_hash = old.content_hash);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER thumbnails_update AFTER UPDATE OF content_hash ON patterns BEGIN
+            DELETE FROM thumbnails WHERE content_hash = old.content_hash
+                AND NOT EXISTS (SELECT 1 FROM patterns WHERE content_hash = old.content_hash);
+        END
+    """)
+
+
+MIGRATIONS = [
+    _migrate_cells_to_blob,
+    _migrate_add_metadata,
+    _migrate_add_thumbnails,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn):
+    """
+    Применяет к базе недостающие миграции (в транзакции вызывающего, под
+    блокировкой записи). Версия читается заново перед каждым шагом и
+    повышается после него, поэтому уже примененный шаг не повторяется.
+    """
+    while True:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            break
+        MIGRATIONS[version](conn)
+        # PRAGMA не поддерживает параметры, версия - наше собственное число.
+        conn.execute(f"PRAGMA user_version = {version + 1}")
+
+
+def pattern_metadata(cells):
+    """Метаданные паттерна для колонок METADATA_COLUMNS (клетки - массивы (колонки, ряды))."""
+    cols, rows = cellutils.cells_to_arrays(cells)
+    kind, period = cellutils.classify((cols, rows))
+    metadata = {'population': int(cols.size), 'min_col': None, 'min_row': None, 'width': 0, 'height': 0,
+                'kind': kind, 'period': period, 'canonical_hash': cellutils.canonical_hash((cols, rows))}
+    if cols.size:
+        metadata.update(min_col=int(cols.min()), min_row=int(rows.min()),
+                        width=int(cols.max() - cols.min()) + 1, height=int(rows.max() - rows.min()) + 1)
+    return metadata
+
+
+def _has_fts(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'patterns_fts'").fetchone() is not None
+
+
+def _filter_clause(conn, query):
+    """
+    Условие WHERE для поиска по имени: все слова запроса должны встречаться
+    в имени как начала слов (FTS5) или как подстроки (если FTS5 недоступен).
+    """
+    words = query.split()
+    if not words:
+        return "", ()
+    if _has_fts(conn):
+        match = " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+        return "WHERE id IN (SELECT rowid FROM patterns_fts WHERE patterns_fts MATCH ?)", (match,)
+    like = [word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') for word in words]
+    return "WHERE " + " AND ".join("name LIKE ? ESCAPE '\\'" for _ in like), tuple(f"%{w}%" for w in like)
+
+
+def get_patterns(query="", offset=0, limit=-1):
+    """
+    Возвращает страницу паттернов, отсортированных по имени:
+    список (id, name, population, kind, period, content_hash). query
+    фильтрует по имени.
+    """
+    conn = get_db().connection()
+    where, params = _filter_clause(conn, query)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT id, name, population, kind, period, content_hash FROM patterns {where} "
+                   f"ORDER BY name LIMIT ? OFFSET ?", (*params, limit, offset))
+    return cursor.fetchall()
+
+
+def count_patterns(query=""):
+    """Количество паттернов, подходящих под фильтр query."""
+    conn = get_db().connection()
+    where, params = _filter_clause(conn, query)
+    return conn.execute(f"SELECT COUNT(*) FROM patterns {where}", params).fetchone()[0]
+
+
+def find_patterns_by_hash(canonical_hash):
+    """Паттерны с такой же формой (с точностью до сдвига и симметрий): список (id, name)."""
+    cursor = get_db().connection().cursor()
+    cursor.execute("SELECT id, name FROM patterns WHERE canonical_hash = ? ORDER BY name", (canonical_hash,))
+    return cursor.fetchall()
+
+
+def get_pattern_shapes():
+    """
+    Все паттерны для распознавания объектов на поле (см. census.py):
+    список (name, kind, period, клетки в виде массивов (колонки, ряды)).
+    """
+    cursor = get_db().connection().cursor()
+    cursor.execute("SELECT name, kind, period, cells FROM patterns ORDER BY name")
+    return [(name, kind, period, cellutils.decode_cells(blob)) for name, kind, period, blob in cursor.fetchall()]
 
 
 def get_pattern_cells(pattern_id):
-    """Возвращает строку с клетками для указанного паттерна."""
-    with sqlite3.connect(DATABASE_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT cells FROM patterns WHERE id = ?", (pattern_id,))
-        result = cursor.fetchone()
-        return result[0] if result else None
+    """Возвращает клетки паттерна в виде массивов NumPy (колонки, ряды) или None."""
+    cursor = get_db().connection().cursor()
+    cursor.execute("SELECT cells FROM patterns WHERE id = ?", (pattern_id,))
+    result = cursor.fetchone()
+    return cellutils.decode_cells(result[0]) if result else None
+
+
+def _pattern_row(name, cells):
+    """Значения колонок строки паттерна: имя, клетки в двоичном виде и метаданные."""
+    # Кодируем клетки в компактный двоичный вид (см. cellutils)
+    # и сразу считаем метаданные для поиска и сортировки.
+    cells = cellutils.cells_to_arrays(cells)
+    metadata = pattern_metadata(cells)
+    blob = cellutils.encode_cells(cells)
+    return {'name': name, 'cells': blob, 'content_hash': content_hash(blob), **metadata}
+
+
+def _insert_sql(row, verb="INSERT"):
+    return f"{verb} INTO patterns ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})"
 
 
 def add_pattern(name, cells_set):
     """Добавляет новый паттерн в базу данных."""
-    # Преобразуем множество клеток в строку вида "x1,y1;x2,y2;..."
-    cells_str = ";".join([f"{col},{row}" for col, row in cells_set])
+    row = _pattern_row(name, cells_set)
+    try:
+        with get_db().transaction() as conn:
+            conn.execute(_insert_sql(row), tuple(row.values()))
+        return True, "Паттерн успешно сохранен."
+    except sqlite3.IntegrityError:
+        return False, "Паттерн с таким именем уже существует."
+
 
-    with sqlite3.connect(DATABASE_NAME) as conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute("INSERT INTO patterns (name, cells) VALUES (?, ?)", (name, cells_str))
-            conn.commit()
-            return True, "Паттерн успешно сохранен."
-        except sqlite3.IntegrityError:
-            return False, "Паттерн с таким именем уже существует."
+def add_patterns(patterns):
+    """
+    Добавляет много паттернов одной транзакцией: patterns - итерируемые пары
+    (имя, клетки). Паттерны с уже занятыми именами пропускаются. Клетки
+    кодируются и классифицируются до начала транзакции, чтобы не держать
+    блокировку записи. Возвращает число добавленных паттернов.
+    """
+    rows = [_pattern_row(name, cells) for name, cells in patterns]
+    if not rows:
+        return 0
+    with get_db().transaction() as conn:
+        cursor = conn.executemany(_insert_sql(rows[0], "INSERT OR IGNORE"), [tuple(row.values()) for row in rows])
+        return cursor.rowcount
 
 
 def delete_pattern(pattern_id):
     """Удаляет паттерн из базы данных по его ID."""
-    with sqlite3.connect(DATABASE_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM patterns WHERE id = ?", (pattern_id,))
-        conn.commit()
\ No newline at end of file
+    with get_db().transaction() as conn:
+        conn.execute("DELETE FROM patterns WHERE id = ?", (pattern_id,))
+
+
+# --- Миниатюры ---
+
+def get_thumbnail(content_hash, size):
+    """PNG миниатюры паттерна с хэшем содержимого content_hash или None."""
+    cursor = get_db().connection().cursor()
+    cursor.execute("SELECT png FROM thumbnails WHERE content_hash = ? AND size = ?", (content_hash, size))
+    result = cursor.fetchone()
+    return result[0] if result else None
+
+
+def save_thumbnail(content_hash, size, png):
+    """Сохраняет миниатюру, если паттерн с таким содержимым еще есть в библиотеке."""
+    with get_db().transaction() as conn:
+        conn.execute("INSERT OR REPLACE INTO thumbnails (content_hash, size, png) "
+                     "SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM patterns WHERE content_hash = ?)",
+                     (content_hash, size, png, content_hash))
@@ -0,0 +1,405 @@
+"""
+Движок симуляции игры «Жизнь», не зависящий от Qt.
+
+Движок хранит состояние поля и умеет вычислять следующие поколения.
+GridWidget только отображает это состояние, поэтому шагать паттерн можно
+и без QApplication (например, в пакетных прогонах на сервере).
+
+Все движки реализуют один и тот же набор методов (см. BaseEngine), поэтому
+их можно взаимозаменять. Движки, которым нужны дополнительные библиотеки,
+регистрируются в ENGINES и импортируются только при создании.
+"""
+import importlib
+from collections import Counter, namedtuple
+from collections.abc import MutableSet
+
+from rules import LIFE
+
+# Неизменяемый снимок состояния поля. Его можно безопасно передавать
+# между потоками: движок продолжает считать, а снимок остается прежним.
+# cells - неизменяемое множество клеток с методом region_mask (см. spatial.py).
+Snapshot = namedtuple('Snapshot', ['generation', 'population', 'bounding_box', 'cells'])
+
+# Сторона квадратного блока, которым движки отмечают области, где при шаге
+# рождались или умирали клетки (см. BaseEngine.take_changes).
+CHANGE_BLOCK = 64
+
+# Топология поля: бесконечная плоскость, прямоугольник с мертвыми краями
+# или тор (края склеены). Конечные поля считает FixedGridEngine.
+TOPOLOGY_INFINITE = 'infinite'
+TOPOLOGY_BOUNDED = 'bounded'
+TOPOLOGY_TORUS = 'torus'
+
+# Смещения восьми соседей клетки (колонка, ряд).
+_NEIGHBOURS = [(dc, dr) for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc]
+
+
+class CellSetView(MutableSet):
+    """
+    Представление состояния движка в виде множества клеток (колонка, ряд).
+    Нужно для совместимости с кодом, который работает с live_cells как с set,
+    когда движок хранит клетки в другом формате (массив, дерево и т.д.).
+    """
+
+    def __init__(self, engine):
+        self._engine = engine
+
+    def __contains__(self, cell):
+        return self._engine.is_alive(cell)
+
+    def __iter__(self):
+        return self._engine.iter_cells()
+
+    def __len__(self):
+        return self._engine.population
+
+    def add(self, cell):
+        self._engine.set_cell(cell, True)
+
+    def discard(self, cell):
+        self._engine.set_cell(cell, False)
+
+    def __repr__(self):
+        return f"CellSetView({set(self)!r})"
+
+
+class BaseEngine:
+    """
+    Общий интерфейс движков. Наследники обязаны реализовать iter_cells,
+    is_alive, set_cell, set_live_cells, clear и _step_once; остальное
+    выражено через них и при необходимости переопределяется ради скорости.
+    """
+
+    # Умеет ли движок сообщать, какие блоки изменились при шаге.
+    reports_changes = False
+    # Умеет ли движок сообщать родившиеся и умершие клетки (см. take_delta).
+    reports_deltas = False
+    # Умеет ли движок считать многосостоятельные правила Generations.
+    supports_generations = False
+    # Топология поля и его границы (min_col, min_row, max_col, max_row), концы
+    # не включаются; None - поле бесконечно.
+    topology = TOPOLOGY_INFINITE
+    bounds = None
+
+    def __init__(self, rule=None):
+        # Правило (rules.Rule); по умолчанию - B3/S23.
+        self.rule = self._check_rule(rule or LIFE)
+        # Номер текущего поколения.
+        self.generation = 0
+        # Отмечать ли при шагах изменившиеся блоки. Включается потоком
+        # симуляции, чтобы интерфейс перерисовывал только их.
+        self.track_changes = False
+        self._changes = set()
+        # Собирать ли при шагах родившиеся и умершие клетки. Включается
+        # тем, кто их забирает (хэш состояния в statehash.py): иначе
+        # список частей дельты растет без ограничений.
+        self.track_deltas = False
+        self._delta_parts = []
+
+    @property
+    def live_cells(self):
+        """Живые клетки в виде множества (или совместимого представления)."""
+        return self.get_live_cells()
+
+    def _check_rule(self, rule):
+        if rule.states > 2 and not self.supports_generations:
+            raise ValueError(f"Движок {type(self).__name__} не поддерживает правила Generations")
+        return rule
+
+    def set_rule(self, rule):
+        """Меняет правило; клетки поля сохраняются (умирающие - если правило их допускает)."""
+        self.rule = self._check_rule(rule)
+        self._rule_changed()
+
+    def _rule_changed(self):
+        """Вызывается после смены правила: движки сбрасывают то, что от него зависело."""
+
+    def clamp_cell(self, cell):
+        """Ближайшая к cell клетка поля (у тора - та же клетка после склейки краев)."""
+        return cell
+
+    @property
+    def population(self):
+        """Количество живых клеток."""
+        return sum(1 for _ in self.iter_cells())
+
+    @property
+    def bounding_box(self):
+        """
+        Возвращает ограничивающий прямоугольник живых клеток
+        в виде (min_col, min_row, max_col, max_row) или None для пустого поля.
+        """
+        cells = list(self.iter_cells())
+        if not cells:
+            return None
+        cols = [col for col, _ in cells]
+        rows = [row for _, row in cells]
+        return min(cols), min(rows), max(cols), max(rows)
+
+    def get_live_cells(self):
+        """Возвращает живые клетки в виде множества."""
+        return CellSetView(self)
+
+    def snapshot(self):
+        """Возвращает неизменяемый снимок текущего поколения."""
+        from spatial import CellIndex
+        cells = CellIndex(self.iter_cells())
+        return Snapshot(self.generation, len(cells), self.bounding_box, cells)
+
+    def take_changes(self):
+        """
+        Возвращает блоки CHANGE_BLOCK x CHANGE_BLOCK (множество ключей (bx, by)),
+        в которых при шагах с прошлого вызова рождались или умирали клетки, и
+        начинает отсчет заново. None означает, что движок изменения не
+        отслеживает и поменяться могло что угодно. Правки поля (set_cell,
+        clear и т.д.) не учитываются - после них вид обновляется целиком.
+        """
+        if not (self.track_changes and self.reports_changes):
+            return None
+        changes, self._changes = self._changes, set()
+        return changes
+
+    def _mark_changed(self, cells):
+        """Отмечает блоки, содержащие клетки cells, как изменившиеся."""
+        self._changes.update((col // CHANGE_BLOCK, row // CHANGE_BLOCK) for col, row in cells)
+
+    def take_delta(self):
+        """
+        Клетки, которые родились и умерли при шагах с прошлого вызова:
+        (born_cols, born_rows, died_cols, died_rows) - массивы NumPy int64,
+        и начинает отсчет заново. None означает, что движок их не сообщает
+        или не смог посчитать (см. _lose_delta). Как и в take_changes,
+        правки поля не учитываются.
+        """
+        if not (self.track_deltas and self.reports_deltas):
+            return None
+        import numpy as np
+        parts, self._delta_parts = self._delta_parts, []
+        if parts is None:
+            return None
+        if len(parts) == 1:
+            return parts[0]
+        empty = np.zeros(0, dtype=np.int64)
+        if not parts:
+            return empty, empty, empty, empty
+        # За несколько шагов клетка может родиться и умереть: итог по клетке -
+        # сумма +1 за рождения и -1 за смерти (они чередуются).
+        keys = np.concatenate([(rows << 32) + (cols + (1 << 31))
+                               for part in parts for cols, rows in (part[:2], part[2:])])
+        weights = np.concatenate([np.full(part[i].size, sign, dtype=np.int64)
+                                  for part in parts for i, sign in ((0, 1), (2, -1))])
+        values, inverse = np.unique(keys, return_inverse=True)
+        net = np.bincount(inverse.reshape(-1), weights, minlength=values.size)
+        born, died = values[net > 0], values[net < 0]
+        return ((born & 0xFFFFFFFF) - (1 << 31), born >> 32,
+                (died & 0xFFFFFFFF) - (1 << 31), died >> 32)
+
+    def _record_delta(self, born_cols, born_rows, died_cols, died_rows):
+        """Запоминает родившиеся и умершие за шаг клетки (массивы int64)."""
+        if self._delta_parts is not None:
+            self._delta_parts.append((born_cols, born_rows, died_cols, died_rows))
+
+    def _lose_delta(self):
+        """Отмечает, что дельту шага посчитать не удалось: take_delta вернет None."""
+        self._delta_parts = None
+
+    def cell_arrays(self):
+        """
+        Живые клетки в виде массивов NumPy (колонки, ряды) int64. Движки на
+        массивах переопределяют метод и обходятся без кортежей.
+        """
+        import numpy as np
+        coords = np.array(list(self.iter_cells()), dtype=np.int64).reshape(-1, 2)
+        return coords[:, 0], coords[:, 1]
+
+    def set_cell_arrays(self, cols, rows):
+        """
+        Заменяет состояние поля клетками из массивов NumPy (колонки, ряды).
+        Движки на массивах переопределяют метод и строят поле без кортежей.
+        """
+        self.set_live_cells(zip(cols.tolist(), rows.tolist()))
+
+    def toggle_cell(self, cell):
+        """Инвертирует состояние одной клетки."""
+        self.set_cell(cell, not self.is_alive(cell))
+
+    def add_cells(self, cells):
+        """Оживляет все переданные клетки."""
+        for cell in cells:
+            self.set_cell(cell, True)
+
+    def step(self, n=1):
+        """Продвигает симуляцию на n поколений."""
+        for _ in range(n):
+            self._step_once()
+            self.generation += 1
+
+
+class LifeEngine(BaseEngine):
+    """Движок на основе множества живых клеток (бесконечное поле)."""
+
+    reports_changes = True
+    reports_deltas = True
+
+    def __init__(self, cells=None, rule=None):
+        super().__init__(rule)
+        # Множество координат живых клеток в формате (колонка, ряд).
+        self._cells = set(cells) if cells else set()
+
+    # --- Состояние поля ---
+
+    @property
+    def live_cells(self):
+        return self._cells
+
+    @live_cells.setter
+    def live_cells(self, cells):
+        self._cells = cells
+
+    @property
+    def population(self):
+        """Количество живых клеток."""
+        return len(self.live_cells)
+
+    @property
+    def bounding_box(self):
+        """
+        Возвращает ограничивающий прямоугольник живых клеток
+        в виде (min_col, min_row, max_col, max_row) или None для пустого поля.
+        """
+        if not self.live_cells:
+            return None
+        cols = [col for col, _ in self.live_cells]
+        rows = [row for _, row in self.live_cells]
+        return min(cols), min(rows), max(cols), max(rows)
+
+    def get_live_cells(self):
+        """Возвращает множество всех живых клеток."""
+        return self.live_cells
+
+    def set_live_cells(self, cells):
+        """Заменяет состояние поля новым набором клеток."""
+        self.live_cells = set(cells)
+
+    def iter_cells(self):
+        """Перебирает координаты всех живых клеток."""
+        return iter(self.live_cells)
+
+    def is_alive(self, cell):
+        """Проверяет, жива ли клетка (колонка, ряд)."""
+        return cell in self.live_cells
+
+    def set_cell(self, cell, alive):
+        """Делает клетку живой или мертвой."""
+        if alive:
+            self.live_cells.add(cell)
+        else:
+            self.live_cells.discard(cell)
+
+    def toggle_cell(self, cell):
+        """Инвертирует состояние одной клетки."""
+        if cell in self.live_cells:
+            self.live_cells.remove(cell)
+        else:
+            self.live_cells.add(cell)
+
+    def add_cells(self, cells):
+        """Оживляет все переданные клетки."""
+        self.live_cells.update(cells)
+
+    def clear(self):
+        """Полностью очищает поле и сбрасывает счетчик поколений."""
+        self.live_cells = set()
+        self.generation = 0
+
+    # --- Симуляция ---
+
+    def count_neighbors(self, col, row):
+        """Считает количество живых соседей для указанной клетки."""
+        count = 0
+        # dr (delta row) и dc (delta col) - смещения для проверки 8 соседей.
+        for dr in range(-1, 2):
+            for dc in range(-1, 2):
+                if dr == 0 and dc == 0:
+                    continue  # Пропускаем саму клетку.
+                if (col + dc, row + dr) in self.live_cells:
+                    count += 1
+        return count
+
+    def _next_generation(self):
+        """Вычисляет следующее поколение клеток по правилу движка."""
+        # Каждая живая клетка "раздает" по единице всем своим соседям.
+        # Так за один проход получаем число соседей у всех кандидатов,
+        # без отдельной проверки 8 соседей для каждого из них.
+        live = self.live_cells
+        counts = Counter((col + dc, row + dr) for col, row in live for dc, dr in _NEIGHBOURS)
+
+        # Числа соседей разбиты правилом на три группы, поэтому проверять,
+        # жива ли клетка, нужно только для тех, чья судьба от этого зависит.
+        always, if_alive, if_dead = self.rule.count_groups()
+        new_cells = {cell for cell, n in counts.items() if n in always}
+        if if_alive:
+            # counts.get: при S0 выживает и клетка вовсе без соседей.
+            new_cells.update(cell for cell in live if counts.get(cell, 0) in if_alive)
+        if if_dead:
+            new_cells.update(cell for cell, n in counts.items() if n in if_dead and cell not in live)
+        return new_cells
+
+    def _step_once(self):
+        new_cells = self._next_generation()
+        if self.track_changes:
+            # Родившиеся и умершие клетки - симметрическая разность поколений.
+            self._mark_changed(new_cells ^ self.live_cells)
+        if self.track_deltas:
+            import numpy as np
+            born = np.array(list(new_cells - self.live_cells), dtype=np.int64).reshape(-1, 2)
+            died = np.array(list(self.live_cells - new_cells), dtype=np.int64).reshape(-1, 2)
+            self._record_delta(born[:, 0], born[:, 1], died[:, 0], died[:, 1])
+        self.live_cells = new_cells
+
+
+# --- Реестр движков ---
+# Имя движка -> (модуль, класс). Модуль импортируется только при создании
+# движка, чтобы engine.py не тянул за собой NumPy и прочие зависимости.
+# Такой импорт сборщик EXE не видит: модули движков перечислены в шаге
+# Nuitka (--include-module) в .github/workflows/build.yml.
+ENGINES = {
+    'set': ('engine', 'LifeEngine'),
+    'sparse': ('sparse_engine', 'SparseEngine'),
+    'numpy': ('numpy_engine', 'NumpyEngine'),
+    'hashlife': ('hashlife', 'HashlifeEngine'),
+    'tiles': ('tile_engine', 'TileEngine'),
+    'parallel': ('parallel_engine', 'ParallelEngine'),
+}
+
+DEFAULT_ENGINE = 'sparse'
+
+
+def engine_supports(name, rule):
+    """Может ли движок name считать правило rule (без импорта модуля движка - нет)."""
+    if rule.states == 2:
+        return True
+    module_name, class_name = ENGINES[name]
+    return getattr(importlib.import_module(module_name), class_name).supports_generations
+
+
+def create_engine(name=DEFAULT_ENGINE, cells=None, **kwargs):
+    """Создает движок по имени из ENGINES и (опционально) заполняет его клетками."""
+    try:
+        module_name, class_name = ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный движок: {name}") from None
+    engine_class = getattr(importlib.import_module(module_name), class_name)
+    engine = engine_class(**kwargs)
+    if cells:
+        engine.set_live_cells(cells)
+    return engine
+
+
+def convert_engine(engine, name, **kwargs):
+    """Переносит состояние (клетки, правило и номер поколения) в движок другого типа."""
+    kwargs.setdefault('rule', engine.rule)
+    new_engine = create_engine(name, **kwargs)
+    new_engine.set_live_cells(engine.iter_cells())
+    new_engine.generation = engine.generation
+    return new_engine
@@ -0,0 +1,249 @@
+"""
+Движок конечного поля: прямоугольник width x height с мертвыми краями
+(bounded) или тор, у которого противоположные края склеены (torus).
+
+Поле хранится в двух заранее выделенных массивах uint8 с рамкой в одну
+клетку: шаг читает текущий массив и пишет следующее поколение во второй,
+после чего они меняются ролями (двойная буферизация). Рамка ограниченного
+поля всегда пуста, а у тора перед шагом заполняется противоположными
+краями поля. Рабочие массивы подсчета соседей тоже выделены заранее
+(numpy_engine.StepBuffers), поэтому шаг не выделяет память, а его время и
+расход памяти не зависят от того, что происходит на поле. Исключение -
+учет изменений для отрисовки и дельт шага, если он включен: маски
+рождений и смертей тоже лежат в StepBuffers, но карта измененных блоков
+(changed_blocks) и координаты изменившихся клеток создаются заново.
+
+Поле занимает колонки от -(width // 2) до width - width // 2 - 1 (и так же
+ряды): начало координат в его центре, как у ограниченных полей Golly.
+В файлах RLE и Macrocell размер и топология поля записываются, как в Golly,
+суффиксом строки правила: "B3/S23:T100,80" - тор, "B3/S23:P100,80" -
+ограниченное поле.
+"""
+import re
+
+import numpy as np
+
+from engine import TOPOLOGY_BOUNDED, TOPOLOGY_INFINITE, TOPOLOGY_TORUS, BaseEngine, Snapshot
+from numpy_engine import StepBuffers, changed_blocks, step_rows
+from spatial import ArrayIndex
+
+# Размер поля по умолчанию.
+DEFAULT_WIDTH = 256
+DEFAULT_HEIGHT = 256
+# Предел стороны поля: массивы движка занимают около 8 байт на клетку.
+MAX_SIDE = 1 << 15
+
+# Суффикс конечного поля в строке правила Golly и буквы топологий в нем.
+_GRID_SUFFIX = re.compile(r'(.*):([TP])(\d+),(\d+)', re.IGNORECASE)
+_TOPOLOGY_LETTERS = {'T': TOPOLOGY_TORUS, 'P': TOPOLOGY_BOUNDED}
+
+
+def split_grid_rule(text):
+    """
+    Делит строку правила Golly на правило и поле: (правило, топология,
+    ширина, высота). Без суффикса поле бесконечно: (text, 'infinite', None,
+    None). Бросает ValueError на суффикс, который движок не поддерживает
+    (полоса вроде ":T100,0", сдвиги и повороты краев).
+    """
+    if ':' not in text:
+        return text, TOPOLOGY_INFINITE, None, None
+    match = _GRID_SUFFIX.fullmatch(text.strip())
+    if not match:
+        raise ValueError(f"Поле не поддерживается: {text}")
+    rule, letter, width, height = match.groups()
+    width, height = int(width), int(height)
+    if width == height == 0:
+        return rule, TOPOLOGY_INFINITE, None, None
+    if not (1 <= width <= MAX_SIDE and 1 <= height <= MAX_SIDE):
+        raise ValueError(f"Поле не поддерживается: {text}")
+    return rule, _TOPOLOGY_LETTERS[letter.upper()], width, height
+
+
+def grid_rule(engine):
+    """Строка правила движка с суффиксом Golly для конечного поля."""
+    rulestring = engine.rule.rulestring
+    if engine.topology == TOPOLOGY_INFINITE:
+        return rulestring
+    letter = 'T' if engine.topology == TOPOLOGY_TORUS else 'P'
+    return f"{rulestring}:{letter}{engine.width},{engine.height}"
+
+
+class FixedGridEngine(BaseEngine):
+    """Движок на двух массивах постоянного размера: ограниченное поле или тор."""
+
+    reports_changes = True
+    reports_deltas = True
+    supports_generations = True
+
+    def __init__(self, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, topology=TOPOLOGY_TORUS, cells=None, rule=None):
+        if topology not in (TOPOLOGY_BOUNDED, TOPOLOGY_TORUS):
+            raise ValueError(f"Неизвестная топология конечного поля: {topology}")
+        if not (1 <= width <= MAX_SIDE and 1 <= height <= MAX_SIDE):
+            raise ValueError(f"Стороны поля должны быть от 1 до {MAX_SIDE}")
+        super().__init__(rule)
+        self.topology = topology
+        self.width = width
+        self.height = height
+        # grid[r + 1, c + 1] соответствует клетке (origin_col + c, origin_row + r).
+        self.origin_col = -(width // 2)
+        self.origin_row = -(height // 2)
+        self.bounds = (self.origin_col, self.origin_row, self.origin_col + width, self.origin_row + height)
+        # Текущее поколение и буфер следующего; шаг меняет их местами.
+        self._grids = [np.zeros((height + 2, width + 2), dtype=np.uint8) for _ in range(2)]
+        self.grid = self._grids[0]
+        self._buffers = StepBuffers((height, width))
+        # Маска живых клеток с рамкой для правил Generations.
+        self._alive_grid = np.zeros((height + 2, width + 2), dtype=np.uint8)
+        if cells:
+            self.set_live_cells(cells)
+
+    # --- Координаты ---
+
+    def _index(self, cols, rows):
+        """
+        Индексы (ряды, колонки) клеток в поле без рамки. У тора координаты
+        сворачиваются по модулю сторон, у ограниченного поля клетки за краем
+        отбрасываются.
+        """
+        c = np.asarray(cols, dtype=np.int64) - self.origin_col
+        r = np.asarray(rows, dtype=np.int64) - self.origin_row
+        if self.topology == TOPOLOGY_TORUS:
+            return r % self.height, c % self.width
+        inside = (c >= 0) & (c < self.width) & (r >= 0) & (r < self.height)
+        return r[inside], c[inside]
+
+    def clamp_cell(self, cell):
+        """Ближайшая к cell клетка поля (у тора - та же клетка после склейки краев)."""
+        col, row = cell[0] - self.origin_col, cell[1] - self.origin_row
+        if self.topology == TOPOLOGY_TORUS:
+            col, row = col % self.width, row % self.height
+        else:
+            col, row = min(max(col, 0), self.width - 1), min(max(row, 0), self.height - 1)
+        return col + self.origin_col, row + self.origin_row
+
+    def _contains(self, cell):
+        return (self.topology == TOPOLOGY_TORUS
+                or self.origin_col <= cell[0] < self.bounds[2] and self.origin_row <= cell[1] < self.bounds[3])
+
+    # --- Состояние поля ---
+
+    def _inner(self, grid=None):
+        """Поле без рамки (представление массива grid, по умолчанию текущего)."""
+        return (self.grid if grid is None else grid)[1:-1, 1:-1]
+
+    def _alive(self):
+        """Маска живых клеток поля: само поле или, у правил Generations, состояние 1."""
+        inner = self._inner()
+        return inner if self.rule.states == 2 else (inner == 1).view(np.uint8)
+
+    @property
+    def population(self):
+        """Количество живых клеток."""
+        return int(np.count_nonzero(self._alive()))
+
+    @property
+    def bounding_box(self):
+        """
+        Возвращает ограничивающий прямоугольник живых клеток
+        в виде (min_col, min_row, max_col, max_row) или None для пустого поля.
+        """
+        alive = self._alive()
+        rows = np.flatnonzero(alive.any(axis=1))
+        if rows.size == 0:
+            return None
+        cols = np.flatnonzero(alive.any(axis=0))
+        return (self.origin_col + int(cols[0]), self.origin_row + int(rows[0]),
+                self.origin_col + int(cols[-1]), self.origin_row + int(rows[-1]))
+
+    def snapshot(self):
+        """Снимок поверх копии поля: без перебора клеток в Python."""
+        cells = ArrayIndex(self._inner().copy(), self.origin_col, self.origin_row, self.rule.states > 2)
+        return Snapshot(self.generation, len(cells), self.bounding_box, cells)
+
+    def iter_cells(self):
+        """Перебирает координаты всех живых клеток."""
+        cols, rows = self.cell_arrays()
+        return zip(cols.tolist(), rows.tolist())
+
+    def cell_arrays(self):
+        """Живые клетки в виде массивов (колонки, ряды)."""
+        rows, cols = np.nonzero(self._alive())
+        return cols + self.origin_col, rows + self.origin_row
+
+    def set_live_cells(self, cells):
+        """Заменяет состояние поля новым набором клеток."""
+        cells = np.array(list(cells), dtype=np.int64).reshape(-1, 2)
+        self.set_cell_arrays(cells[:, 0], cells[:, 1])
+
+    def set_cell_arrays(self, cols, rows):
+        """Заменяет состояние поля клетками из массивов (колонки, ряды)."""
+        self.grid[...] = 0
+        r, c = self._index(cols, rows)
+        self.grid[r + 1, c + 1] = 1
+
+    def is_alive(self, cell):
+        """Проверяет, жива ли клетка (колонка, ряд)."""
+        if not self._contains(cell):
+            return False
+        col, row = self.clamp_cell(cell)
+        return self.grid[row - self.origin_row + 1, col - self.origin_col + 1] == 1
+
+    def set_cell(self, cell, alive):
+        """Делает клетку живой или мертвой; клетки за краем ограниченного поля не меняются."""
+        if not self._contains(cell):
+            return
+        col, row = self.clamp_cell(cell)
+        self.grid[row - self.origin_row + 1, col - self.origin_col + 1] = 1 if alive else 0
+
+    def clear(self):
+        """Полностью очищает поле и сбрасывает счетчик поколений."""
+        for grid in self._grids:
+            grid[...] = 0
+        self.generation = 0
+
+    # --- Симуляция ---
+
+    def _wrap_edges(self, grid):
+        """Заполняет рамку тора противоположными краями поля (углы - противоположными углами)."""
+        grid[0, 1:-1] = grid[-2, 1:-1]
+        grid[-1, 1:-1] = grid[1, 1:-1]
+        grid[:, 0] = grid[:, -2]
+        grid[:, -1] = grid[:, 1]
+
+    def _step_once(self):
+        grid = self.grid
+        new_grid = self._grids[1] if grid is self._grids[0] else self._grids[0]
+        if self.topology == TOPOLOGY_TORUS:
+            self._wrap_edges(grid)
+        alive = None
+        if self.rule.states > 2:
+            alive = self._alive_grid
+            np.equal(grid, 1, out=alive.view(bool))
+        step_rows(grid, new_grid, 1, self.height + 1, self.rule, alive, self._buffers)
+        self._finish_step(new_grid)
+
+    def _rule_changed(self):
+        # Состояния, которых нет в новом правиле, становятся мертвыми клетками.
+        inner = self._inner()
+        inner[inner >= self.rule.states] = 0
+
+    def _finish_step(self, new_grid):
+        """Делает new_grid текущим поколением, отметив изменения, если их собирают."""
+        old, new = self._inner(), self._inner(new_grid)
+        if self.track_changes:
+            changed = np.not_equal(old, new, out=self._buffers.mask)
+            self._changes.update(changed_blocks(changed, self.origin_col, self.origin_row))
+        if self.track_deltas:
+            # Маски рождений и смертей - в рабочих массивах шага (step_rows они уже не нужны);
+            # память выделяет только np.nonzero под координаты изменившихся клеток.
+            buffers = self._buffers
+            if self.rule.states > 2:
+                old = np.equal(old, 1, out=buffers.mask)
+                new = np.equal(new, 1, out=buffers.shifted.view(bool))
+            born = np.greater(new, old, out=buffers.born)
+            died = np.less(new, old, out=buffers.run)
+            born_rows, born_cols = np.nonzero(born)
+            died_rows, died_cols = np.nonzero(died)
+            self._record_delta(born_cols + self.origin_col, born_rows + self.origin_row,
+                               died_cols + self.origin_col, died_rows + self.origin_row)
+        self.grid = new_grid
@@ -1,11 +1,41 @@
 import sys
-import random
-from PyQt6.QtWidgets import QListWidget, QInputDialog, QTabWidget, QFileDialog, QMessageBox, QStyle, QLabel, \
+import multiprocessing
+
+# --- Пакетный режим ---
+# Поиск супов (gameofthelife.py soupsearch [параметры]) запускается до
+# импорта Qt и модулей интерфейса: окна ему не нужны, а их загрузка заняла
+# бы больше времени, чем старт самого поиска. Процессы пула в собранном
+# .exe тоже выходят здесь, в freeze_support, не загружая Qt.
+if __name__ == "__main__":
+    # Нужно для пула процессов поиска супов в собранном .exe.
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1 and sys.argv[1] == 'soupsearch':
+        import soupsearch
+        sys.exit(soupsearch.main(sys.argv[2:]))
+
+import math
+import re
+import functools
+import threading
+import time
+from collections import OrderedDict
+from PyQt6.QtWidgets import QSlider, QListView, QLineEdit, QInputDialog, QTabWidget, QFileDialog, QMessageBox, QStyle, QLabel, \
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QDialog,QDialogButtonBox, QComboBox
-from PyQt6.QtGui import QPainter, QColor, QPen, QIcon, QAction, QPixmap
-from PyQt6.QtCore import pyqtSignal, QTimer, QRectF, Qt
+from PyQt6.QtGui import QKeySequence, QPainter, QColor, QPen, QIcon, QAction, QActionGroup, QPixmap, QImage, QRegion, qRgb, qRgba
+from PyQt6.QtCore import pyqtSignal, QSettings, QSize, QThread, QTimer, QRect, QRectF, Qt, QAbstractListModel, \
+    QModelIndex
 import database
+from engine import ENGINES, DEFAULT_ENGINE, CHANGE_BLOCK, convert_engine, create_engine, engine_supports, \
+    TOPOLOGY_INFINITE, TOPOLOGY_BOUNDED, TOPOLOGY_TORUS
+from fixed_engine import FixedGridEngine, DEFAULT_WIDTH, DEFAULT_HEIGHT, MAX_SIDE, split_grid_rule, grid_rule
+from rules import RULES, parse_rule
+from simulation import SimulationThread
+from history import History
+from statehash import CycleDetector
+from profiling import Profiler, ProfileSession
+from thumbnails import THUMBNAIL_SIZE, LRUCache, pattern_thumbnail
 import os
+import numpy as np
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 ## Файл Переводов
@@ -18,6 +48,8 @@ TRANSLATIONS = {
         'act_load': "Загрузить паттерн...",
         'act_lib': "Библиотека паттернов...",
         'act_help': "Справка",
+        'act_language': "Язык...",
+        'msg_language': "Язык интерфейса изменится при следующем запуске.",
         'btn_start': "Старт",
         'btn_stop': "Стоп",
         'btn_reset': "Сброс (Глайдер)",
@@ -26,6 +58,13 @@ TRANSLATIONS = {
         'msg_clear_text': "Вы уверены, что хотите очистить все поле?",
         'lib_title': "Библиотека паттернов",
         'lib_avail': "Доступные паттерны:",
+        'lib_filter': "Поиск по имени...",
+        'lib_item': "{name}  ({population} кл., {kind})",
+        'kind_dies': "вымирает",
+        'kind_still': "натюрморт",
+        'kind_oscillator': "осциллятор p{period}",
+        'kind_spaceship': "корабль p{period}",
+        'kind_unknown': "не определен",
         'btn_load_sel': "Загрузить выбранный",
         'btn_save_cur': "Сохранить текущий паттерн",
         'btn_del_sel': "Удалить выбранный",
@@ -36,6 +75,57 @@ TRANSLATIONS = {
         'tab_rules': "Правила",
         'tab_about': "О программе",
         'MSG_ERROR': "Ошибка",
+        'menu_engine': "&Движок",
+        'engine_set': "Множество клеток",
+        'engine_sparse': "Упакованные ключи (разреженные поля)",
+        'engine_numpy': "NumPy (плотные поля)",
+        'engine_hashlife': "Hashlife (длинные прогоны)",
+        'engine_tiles': "Битовые тайлы (стабильные поля)",
+        'engine_parallel': "NumPy, многопоточный",
+        'act_jump': "Прыжок на 2^k поколений...",
+        'input_jump_label': "Показатель степени k:",
+        'input_jump_steps_label': "Показатель степени k (не больше {0}; кнопка «Стоп» прерывает прыжок):",
+        'act_census': "Перепись объектов...",
+        'census_line': "{count} x {name}",
+        'census_more': "... и еще видов: {}",
+        'census_empty': "Поле пустое.",
+        'census_too_big': "Поле слишком большое для переписи ({} клеток).",
+        'census_generations': "Перепись не поддерживает правила Generations: она видит только живые клетки.",
+        'menu_history': "&История",
+        'act_step_back': "Шаг назад",
+        'act_goto_gen': "Перейти к поколению...",
+        'input_goto_label': "Номер поколения:",
+        'btn_step_back': "Шаг назад",
+        'label_generation': "Поколение {}",
+        'label_cycle': "{kind} с поколения {start}",
+        'label_history_paused': "история приостановлена: поле слишком большое ({} клеток)",
+        'act_stop_on_cycle': "Останавливаться на цикле",
+        'menu_speed': "&Скорость",
+        'speed_gps': "{} пок./с",
+        'speed_max': "Максимально быстро",
+        'menu_profiling': "&Профилирование",
+        'act_stats_overlay': "Панель статистики",
+        'act_save_stats': "Сохранить замеры...",
+        'act_reset_stats': "Сбросить замеры",
+        'act_profile_start': "Начать сеанс cProfile",
+        'act_profile_stop': "Остановить cProfile и сохранить...",
+        'stats_rates': "{:.1f} пок./с  {:.1f} FPS",
+        'stats_population': "Население: {}",
+        'stats_timer': "{}: p50 {:.2f} / p99 {:.2f} мс",
+        'stats_step': "Шаг",
+        'stats_render': "Кадр",
+        'profile_empty': "Сеанс cProfile пуст: за время сеанса ничего не выполнялось.",
+        'menu_rule': "П&равило",
+        'act_rule_other': "Другое правило...",
+        'input_rule_label': "Строка правила (например, B36/S23 или B2/S/C3):",
+        'msg_engine_rule': "Движок «{engine}» не поддерживает правило {rule}.",
+        'msg_file_rule': "Правило файла «{}» не поддерживается, оставлено текущее правило.",
+        'menu_topology': "Т&опология",
+        'topology_infinite': "Бесконечное поле",
+        'topology_bounded': "Ограниченное поле...",
+        'topology_torus': "Тор...",
+        'input_size_label': "Размер поля (ширина x высота):",
+        'msg_bad_size': "Размер поля задается как «ширина x высота», стороны от 1 до {}.",
         # Длинные тексты можно хранить так же
         'html_controls': """
             <h3>Управление</h3>
@@ -46,7 +136,10 @@ TRANSLATIONS = {
                 <li><b>Enter:</b> Поставить/Убрать клетку.</li>
             </ul>
         """,
-        'html_rules': "<h3>Правила</h3><ol><li>Выживание: 2-3 соседа.</li><li>Смерть: <2 или >3.</li><li>Рождение: 3 соседа.</li></ol>",
+        'html_rules': "<h3>Правила</h3><ol><li>Выживание: 2-3 соседа.</li><li>Смерть: <2 или >3.</li><li>Рождение: 3 соседа.</li></ol>"
+                      "<p>Это правило B3/S23. Другие правила (HighLife, Seeds, Brian's Brain...) выбираются "
+                      "в меню «Правило»: B - числа соседей для рождения, S - для выживания, C - число "
+                      "состояний у правил Generations (умирающие клетки показаны серым).</p>",
         'html_about': "<h3>Игра «Жизнь»</h3><p>Версия 1.0<br>Автор: uberd1</p>"
     },
     'en': {
@@ -57,6 +150,8 @@ TRANSLATIONS = {
         'act_load': "Load Pattern...",
         'act_lib': "Pattern Library...",
         'act_help': "Help",
+        'act_language': "Language...",
+        'msg_language': "The interface language will change on the next launch.",
         'btn_start': "Start",
         'btn_stop': "Stop",
         'btn_reset': "Reset (Glider)",
@@ -65,6 +160,13 @@ TRANSLATIONS = {
         'msg_clear_text': "Are you sure you want to clear the whole grid?",
         'lib_title': "Pattern Library",
         'lib_avail': "Available patterns:",
+        'lib_filter': "Search by name...",
+        'lib_item': "{name}  ({population} cells, {kind})",
+        'kind_dies': "dies out",
+        'kind_still': "still life",
+        'kind_oscillator': "oscillator p{period}",
+        'kind_spaceship': "spaceship p{period}",
+        'kind_unknown': "unclassified",
         'btn_load_sel': "Load Selected",
         'btn_save_cur': "Save Current Pattern",
         'btn_del_sel': "Delete Selected",
@@ -75,6 +177,57 @@ TRANSLATIONS = {
         'tab_rules': "Rules",
         'tab_about': "About",
         'MSG_ERROR': "Error",
+        'menu_engine': "&Engine",
+        'engine_set': "Cell set",
+        'engine_sparse': "Packed keys (sparse fields)",
+        'engine_numpy': "NumPy (dense fields)",
+        'engine_hashlife': "Hashlife (long runs)",
+        'engine_tiles': "Bit-packed tiles (settled fields)",
+        'engine_parallel': "NumPy, multi-threaded",
+        'act_jump': "Jump 2^k generations...",
+        'input_jump_label': "Exponent k:",
+        'input_jump_steps_label': "Exponent k (at most {0}; the Stop button cancels the jump):",
+        'act_census': "Object Census...",
+        'census_line': "{count} x {name}",
+        'census_more': "... and {} more kinds",
+        'census_empty': "The field is empty.",
+        'census_too_big': "The field is too large for a census ({} cells).",
+        'census_generations': "The census does not support Generations rules: it only sees live cells.",
+        'menu_history': "&History",
+        'act_step_back': "Step Back",
+        'act_goto_gen': "Go to Generation...",
+        'input_goto_label': "Generation:",
+        'btn_step_back': "Step Back",
+        'label_generation': "Generation {}",
+        'label_cycle': "{kind} since generation {start}",
+        'label_history_paused': "history paused: the field is too large ({} cells)",
+        'act_stop_on_cycle': "Stop When Periodic",
+        'menu_speed': "&Speed",
+        'speed_gps': "{} gen/s",
+        'speed_max': "As fast as possible",
+        'menu_profiling': "&Profiling",
+        'act_stats_overlay': "Performance Overlay",
+        'act_save_stats': "Save Timing Stats...",
+        'act_reset_stats': "Reset Timings",
+        'act_profile_start': "Start cProfile Session",
+        'act_profile_stop': "Stop cProfile Session and Save...",
+        'stats_rates': "{:.1f} gen/s  {:.1f} FPS",
+        'stats_population': "Population: {}",
+        'stats_timer': "{}: p50 {:.2f} / p99 {:.2f} ms",
+        'stats_step': "Step",
+        'stats_render': "Frame",
+        'profile_empty': "The cProfile session is empty: nothing ran while it was active.",
+        'menu_rule': "&Rule",
+        'act_rule_other': "Other Rule...",
+        'input_rule_label': "Rulestring (e.g. B36/S23 or B2/S/C3):",
+        'msg_engine_rule': "The \"{engine}\" engine does not support the {rule} rule.",
+        'msg_file_rule': "The file's rule \"{}\" is not supported; the current rule is kept.",
+        'menu_topology': "T&opology",
+        'topology_infinite': "Infinite Plane",
+        'topology_bounded': "Bounded Grid...",
+        'topology_torus': "Torus...",
+        'input_size_label': "Grid size (width x height):",
+        'msg_bad_size': "Enter the grid size as \"width x height\", each side from 1 to {}.",
         'html_controls': """
             <h3>Controls</h3>
             <ul>
@@ -84,16 +237,93 @@ TRANSLATIONS = {
                 <li><b>Enter:</b> Toggle cell.</li>
             </ul>
         """,
-        'html_rules': "<h3>Rules</h3><ol><li>Survival: 2-3 neighbors.</li><li>Death: <2 or >3.</li><li>Birth: 3 neighbors.</li></ol>",
+        'html_rules': "<h3>Rules</h3><ol><li>Survival: 2-3 neighbors.</li><li>Death: <2 or >3.</li><li>Birth: 3 neighbors.</li></ol>"
+                      "<p>This is the B3/S23 rule. Other rules (HighLife, Seeds, Brian's Brain...) are chosen "
+                      "in the Rule menu: B lists neighbour counts for birth, S for survival, C is the number "
+                      "of states of Generations rules (dying cells are shown in gray).</p>",
         'html_about': "<h3>Game of Life</h3><p>Version 1.0<br>Author: uberd1</p>"
     }
 }
 ###Конец файла переводов
 
+# Палитра маски клеток при отрисовке: 0 - прозрачный фон, 1 - живая клетка.
+CELL_COLOR_TABLE = [qRgba(0, 0, 0, 0), qRgb(0, 0, 0)]
+
+
+@functools.lru_cache(maxsize=None)
+def cell_color_table(states):
+    """
+    Палитра для правила с states состояниями: умирающие клетки Generations
+    (2..states-1) светлеют от темно- до светло-серого по мере старения.
+    """
+    grays = np.linspace(96, 224, max(0, states - 2)).astype(int).tolist()
+    return CELL_COLOR_TABLE + [qRgb(gray, gray, gray) for gray in grays]
+
+# Конечное поле: фон за его краями и цвет границы (у тора - пунктир).
+OUTSIDE_COLOR = QColor(225, 225, 225)
+BOUNDARY_COLOR = QColor(40, 90, 200)
+
+# Ниже этого масштаба (меньше пикселя на клетку) поле рисуется плотностью
+# блоков клеток, а не отдельными клетками. MIN_ZOOM - предел отдаления.
+LOD_ZOOM = 1.0
+MIN_ZOOM = 2 ** -24
+
+# Частичная перерисовка: изменившиеся блоки мельче DIRTY_SNAP пикселей
+# объединяются по экранной сетке с таким шагом, а если прямоугольников
+# набирается больше MAX_DIRTY_RECTS, виджет перерисовывается целиком.
+DIRTY_SNAP = 32
+MAX_DIRTY_RECTS = 64
+
+# Фильтры диалогов открытия и сохранения паттернов. Формат выбирается по
+# расширению файла, *.txt - старый формат "колонка,ряд" по строке на клетку,
+# *.tiles - снимок огромного поля, открываемый через mmap.
+PATTERN_FILE_FILTER = ("RLE (*.rle);;Macrocell (*.mc);;Tile Snapshot (*.tiles);;"
+                       "Cell List (*.txt);;All Files (*)")
+
+# Перепись объектов: сколько видов объектов показывать и предел населения
+# поля (больше - массивы клеток не поместятся в память).
+CENSUS_LINES = 30
+CENSUS_MAX_POPULATION = 10_000_000
+
+# Панель статистики: период обновления (мс), отступ от угла виджета и
+# внутренние поля (пиксели).
+STATS_INTERVAL = 500
+STATS_MARGIN = 8
+STATS_PADDING = 6
+
+# Варианты темпа симуляции в поколениях в секунду; None - максимально быстро.
+SPEED_OPTIONS = [10, 30, 60, None]
+
+# Прыжок на 2^k поколений: наибольший k для Hashlife (один запоминаемый
+# шаг) и для остальных движков, которые считают все 2^k поколений подряд.
+JUMP_MAX_EXPONENT = 62
+JUMP_MAX_STEPS_EXPONENT = 16
+
+# --- Настройки ---
+# Настройки приложения хранятся в QSettings (реестр Windows, ~/.config в
+# Linux). Выбранный язык запоминается, и при следующих запусках диалог
+# выбора языка не показывается.
+SETTINGS_ORGANIZATION = "uberd1"
+SETTINGS_APPLICATION = "GameOfLife"
+
+
+def app_settings():
+    return QSettings(SETTINGS_ORGANIZATION, SETTINGS_APPLICATION)
+
+
+def saved_language():
+    """Язык, выбранный при прошлых запусках, или None."""
+    lang = app_settings().value('language')
+    return lang if lang in TRANSLATIONS else None
+
+
+def save_language(lang):
+    app_settings().setValue('language', lang)
+
 ## - - - Класс выбора языка
 # Отвечает за перевод текста в правильный язык.
 class LanguageSelectDialog(QDialog):
-    def __init__(self):
+    def __init__(self, lang='ru'):
         super().__init__()
         self.setWindowTitle("Language / Язык")
         self.setFixedSize(300, 150)
@@ -107,6 +337,7 @@ class LanguageSelectDialog(QDialog):
         self.combo = QComboBox()
         self.combo.addItem("Русский", "ru")  # "ru" - это userData
         self.combo.addItem("English", "en")  # "en" - это userData
+        self.combo.setCurrentIndex(max(0, self.combo.findData(lang)))
         layout.addWidget(self.combo)
 
         # Кнопка ОК
@@ -114,7 +345,7 @@ class LanguageSelectDialog(QDialog):
         btn_box.accepted.connect(self.accept)  # Закрывает окно с кодом Accepted
         layout.addWidget(btn_box)
 
-        self.selected_lang = 'ru'  # По умолчанию
+        self.selected_lang = lang  # По умолчанию
 
     def accept(self):
         # Сохраняем выбор перед закрытием
@@ -125,15 +356,38 @@ class LanguageSelectDialog(QDialog):
         return self.selected_lang
 
 # --- Класс игрового поля ---
-# Отвечает за всю логику, отрисовку и обработку пользовательского ввода.
+# Отвечает за отрисовку поля и обработку пользовательского ввода.
+# Сами правила игры и состояние клеток живут в движке (engine.py).
 class GridWidget(QWidget):
-    def __init__(self, parent=None):
+    # Сигнал об окончании отрисовки очередного кадра.
+    frame_rendered = pyqtSignal()
+    # Сигнал о новом показанном снимке (аргумент - номер его поколения).
+    generation_shown = pyqtSignal(object)
+
+    def __init__(self, parent=None, engine=None):
         super().__init__(parent)
         self.setMinimumSize(500, 500)
 
-        # Для "бесконечного" поля используется множество (set) для хранения координат
-        # только живых клеток в формате (колонка, ряд).
-        self.live_cells = set()
+        # Движок симуляции хранит живые клетки (колонка, ряд) и вычисляет
+        # поколения. Он шагает в фоновом потоке, а виджет
+        # рисует последний полученный от него неизменяемый снимок.
+        # Замеры шага, отрисовки и ввода-вывода (profiling.Profiler) и сеанс
+        # cProfile, общие для виджета и потока симуляции.
+        self.profiler = Profiler()
+        self.profile_session = ProfileSession()
+        self.simulation = SimulationThread(engine if engine is not None else create_engine(), self,
+                                           history=History(), detector=CycleDetector(),
+                                           profiler=self.profiler, profile_session=self.profile_session)
+        self.history.record(self.engine)
+        self.simulation.snapshot_ready.connect(self.show_snapshot)
+        self.frame_rendered.connect(self._ack_snapshot)
+        self.snapshot = self.simulation.snapshot()
+        self._unacked_snapshot = False  # Снимок от потока еще не отрисован.
+        # Экранные прямоугольники, запрошенные на частичную перерисовку.
+        self._dirty_rects = []
+        # Был отброшен устаревший снимок: его изменения неизвестны, поэтому
+        # следующий снимок рисуется целиком.
+        self._lost_changes = False
 
         # Шаблон фигуры "Глайдер" в виде смещений (ряд, колонка).
         self.glider_pattern = [(0, 1), (1, 2), (2, 0), (2, 1), (2, 2)]
@@ -156,10 +410,24 @@ class GridWidget(QWidget):
         self.panning = False  # Флаг, активен ли режим перетаскивания.
         self.last_mouse_pos = None  # Хранит последнюю позицию мыши при перетаскивании.
 
+        # Кэш картинок сетки: (масштаб, ширина, высота) -> QPixmap.
+        self._grid_cache = {}
+
+        # --- Панель статистики ---
+        # Строки панели пересчитываются таймером, а не в каждом кадре.
+        self.stats_visible = False
+        self.t = TRANSLATIONS['ru']  # Строки панели; окно подставляет свой язык.
+        self._stats_lines = []
+        self._stats_rect = QRect()
+        # (время, поколение, число кадров) прошлого обновления панели.
+        self._stats_last = None
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self._refresh_stats)
+
     def _toggle_cursor_visibility(self):
         """Инвертирует видимость курсора для создания эффекта мигания."""
         self.cursor_visible = not self.cursor_visible
-        self.update()  # Запрашивает перерисовку для обновления вида курсора.
+        self._update_rect(self._cursor_rect())  # Перерисовываем только клетку курсора.
 
     def showEvent(self, event):
         """
@@ -171,10 +439,105 @@ class GridWidget(QWidget):
             self.offset_x = self.width() / 2
             self.offset_y = self.height() / 2
 
+    @property
+    def engine(self):
+        """Текущий движок симуляции."""
+        return self.simulation.engine
+
+    @property
+    def history(self):
+        """История поколений поля (history.History)."""
+        return self.simulation.history
+
+    @property
+    def detector(self):
+        """Поиск циклов поля (statehash.CycleDetector)."""
+        return self.simulation.detector
+
+    @property
+    def live_cells(self):
+        """Множество живых клеток текущего движка."""
+        return self.engine.get_live_cells()
+
+    # --- Связь с потоком симуляции ---
+
+    def show_snapshot(self, snapshot, changes, epoch):
+        """
+        Слот: принимает снимок из потока симуляции и планирует перерисовку
+        только тех мест, где изменились клетки.
+        """
+        if self.simulation.published_at is not None:
+            self.profiler.record('queue', time.perf_counter() - self.simulation.published_at)
+        if epoch != self.simulation.epoch:
+            # Снимок устарел (была пауза или правка) - просто подтверждаем его.
+            self.simulation.consumed()
+            self._lost_changes = True
+            return
+        if self._unacked_snapshot:
+            # Предыдущий снимок так и не успел отрисоваться - он вытеснен,
+            # но его области уже запрошены на перерисовку.
+            self.simulation.consumed()
+        self.snapshot = snapshot
+        self._unacked_snapshot = True
+        self.generation_shown.emit(snapshot.generation)
+        if self._lost_changes:
+            self._lost_changes = False
+            changes = None
+        if not self._update_changes(changes):
+            # На экране ничего не изменилось - перерисовывать нечего.
+            self._ack_snapshot()
+
+    def _ack_snapshot(self):
+        if self._unacked_snapshot:
+            self._unacked_snapshot = False
+            self.simulation.consumed()
+
+    def refresh(self):
+        """Синхронно берет снимок из движка (после правок или паузы) и перерисовывает поле."""
+        self.simulation.invalidate()
+        self.snapshot = self.simulation.snapshot()
+        self.generation_shown.emit(self.snapshot.generation)
+        self.update()
+
+    def edit_engine(self, action, *args):
+        """
+        Выполняет действие над движком под блокировкой потока симуляции,
+        записывает результат в историю и обновляет вид.
+        """
+        with self.simulation.lock:
+            result = action(*args)
+            self.history.record(self.engine)
+            self.detector.reset()
+        self.refresh()
+        return result
+
+    def seek_generation(self, generation):
+        """
+        Возвращает поле к поколению generation из истории (или к ближайшему
+        записанному раньше него). Возвращает False, если его нет в истории.
+        """
+        with self.simulation.lock:
+            restored = self.history.restore(generation)
+            if restored is not None:
+                restored_generation, cols, rows = restored
+                self.engine.set_cell_arrays(cols, rows)
+                self.engine.generation = restored_generation
+                self.detector.reset()
+        self.refresh()
+        return restored is not None
+
+    def step_back(self):
+        """Возвращает поле на одно поколение назад."""
+        return self.seek_generation(self.engine.generation - 1)
+
+    def shutdown(self):
+        """Останавливает поток симуляции (при закрытии окна)."""
+        self.simulation.shutdown()
+        self.history.close_spill()
+
     def clear_grid(self):
         """Полностью очищает поле от живых клеток."""
-        self.live_cells.clear()
-        self.update()
+        self.edit_engine(self.engine.clear)
 
     def screen_to_world(self, pos):
         """Преобразует экранные координаты (пиксели) в мировые (клетки)."""
@@ -182,39 +545,9 @@ class GridWidget(QWidget):
         row = int((pos.y() - self.offset_y) / self.zoom)
         return col, row
 
-    def count_neighbors(self, col, row):
-        """Считает количество живых соседей для указанной клетки."""
-        count = 0
-        # dr (delta row) и dc (delta col) - смещения для проверки 8 соседей.
-        for dr in range(-1, 2):
-            for dc in range(-1, 2):
-                if dr == 0 and dc == 0:
-                    continue  # Пропускаем саму клетку.
-                if (col + dc, row + dr) in self.live_cells:
-                    count += 1
-        return count
-
     def update_grid(self):
-        """Вычисляет следующее поколение клеток по правилам игры 'Жизнь'."""
-        # Собираем всех "кандидатов" - живые клетки и их непосредственных соседей.
-        # Только эти клетки могут изменить свое состояние.
-        candidates = set()
-        for (col, row) in self.live_cells:
-            for dr in range(-1, 2):
-                for dc in range(-1, 2):
-                    candidates.add((col + dc, row + dr))
-
-        next_live_cells = set()
-        # Проверяем каждого кандидата и решаем, будет ли он жив в след. поколении.
-        for (col, row) in candidates:
-            neighbors = self.count_neighbors(col, row)
-            is_alive = (col, row) in self.live_cells
-
-            if (is_alive and neighbors in (2, 3)) or (not is_alive and neighbors == 3):
-                next_live_cells.add((col, row))
-
-        self.live_cells = next_live_cells
-        self.update()
+        """Продвигает движок на одно поколение и перерисовывает поле."""
+        self.edit_engine(self.engine.step)
 
     def keyPressEvent(self, event):
         """Обрабатывает нажатия клавиш для управления курсором и клетками."""
@@ -231,12 +564,10 @@ class GridWidget(QWidget):
             col += 1
         # Нажатие Enter инвертирует состояние клетки под курсором.
         elif event.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
-            if self.cursor_pos in self.live_cells:
-                self.live_cells.remove(self.cursor_pos)
-            else:
-                self.live_cells.add(self.cursor_pos)
+            self.edit_engine(self.engine.toggle_cell, self.cursor_pos)
 
-        self.cursor_pos = (col, row)
+        # На конечном поле курсор не уходит за край (на торе - переходит через него).
+        self.cursor_pos = self.engine.clamp_cell((col, row))
         self.cursor_visible = True  # Делаем курсор видимым после любого действия.
         self.cursor_timer.start(500)  # Перезапускаем таймер мигания.
         self.update()
@@ -245,7 +576,7 @@ class GridWidget(QWidget):
         """Обрабатывает нажатия кнопок мыши."""
         # Левая кнопка: перемещает курсор в указанную точку.
         if event.button() == Qt.MouseButton.LeftButton:
-            self.cursor_pos = self.screen_to_world(event.position())
+            self.cursor_pos = self.engine.clamp_cell(self.screen_to_world(event.position()))
             self.cursor_visible = True
             self.cursor_timer.start(500)
             self.update()
@@ -283,7 +614,10 @@ class GridWidget(QWidget):
             self.zoom *= 1.2
         else:
             self.zoom /= 1.2
-        self.zoom = max(1, min(self.zoom, 100))  # Ограничиваем масштаб.
+        self.zoom = max(MIN_ZOOM, min(self.zoom, 100))  # Ограничиваем масштаб.
+        # Пока поле рисуется плотностью, поток симуляции готовит пирамиду
+        # плотности для каждого снимка заранее.
+        self.simulation.prepare_density = self.zoom < LOD_ZOOM
 
         # Корректируем смещение, чтобы точка под курсором осталась на месте.
         self.offset_x = mouse_pos.x() - world_before_zoom_x * self.zoom
@@ -292,41 +626,304 @@ class GridWidget(QWidget):
 
     def get_live_cells(self):
         """Возвращает множество всех живых клеток."""
-        return self.live_cells
+        return self.engine.get_live_cells()
+
+    def set_engine(self, name):
+        """Переключает движок симуляции, сохраняя текущее поле."""
+        with self.simulation.lock:
+            self.simulation.set_engine(convert_engine(self.engine, name))
+        self.refresh()
+
+    def set_topology(self, topology, width=None, height=None, engine_name=DEFAULT_ENGINE):
+        """
+        Переносит поле на бесконечную плоскость (движок engine_name) или на
+        конечное поле width x height: клетки за краем ограниченного поля
+        пропадают, на торе - сворачиваются на него.
+        """
+        with self.simulation.lock:
+            engine = self.engine
+            if topology == TOPOLOGY_INFINITE:
+                new_engine = convert_engine(engine, engine_name)
+            else:
+                new_engine = FixedGridEngine(width, height, topology, rule=engine.rule)
+                new_engine.set_cell_arrays(*engine.cell_arrays())
+                new_engine.generation = engine.generation
+            self.simulation.set_engine(new_engine)
+            self.history.record(new_engine)
+            self.detector.reset()
+        self.cursor_pos = new_engine.clamp_cell(self.cursor_pos)
+        self.refresh()
+
+    def set_rule(self, rule):
+        """Меняет правило движка (rules.Rule), сохраняя поле, и перерисовывает его."""
+        with self.simulation.lock:
+            self.engine.set_rule(rule)
+            self.history.record(self.engine)
+            self.detector.reset()
+        self.refresh()
+
+    def replace_engine(self, engine):
+        """Подменяет движок готовым (например, загруженным из файла) и перерисовывает поле."""
+        with self.simulation.lock:
+            self.simulation.set_engine(engine)
+            self.history.record(engine)
+        self.refresh()
 
     def set_live_cells(self, cells):
         """Устанавливает новое состояние живых клеток и перерисовывает поле."""
-        self.live_cells = cells
-        self.update()
+        self.edit_engine(self.engine.set_live_cells, cells)
+
+    def set_cell_arrays(self, cols, rows):
+        """Устанавливает клетки из массивов NumPy (колонки, ряды) и перерисовывает поле."""
+        self.edit_engine(self.engine.set_cell_arrays, cols, rows)
+
+    def visible_region(self, rect=None):
+        """
+        Диапазон клеток, видимых в прямоугольнике rect виджета (по умолчанию -
+        во всем виджете): (start_col, start_row, end_col, end_row), концы не включаются.
+        """
+        if rect is None:
+            rect = self.rect()
+        start_col = math.floor((rect.x() - self.offset_x) / self.zoom)
+        end_col = math.floor((rect.x() + rect.width() - self.offset_x) / self.zoom) + 1
+        start_row = math.floor((rect.y() - self.offset_y) / self.zoom)
+        end_row = math.floor((rect.y() + rect.height() - self.offset_y) / self.zoom) + 1
+        return start_col, start_row, end_col, end_row
+
+    # --- Частичная перерисовка ---
+
+    def _update_rect(self, rect):
+        """Запрашивает перерисовку одного прямоугольника виджета."""
+        if len(self._dirty_rects) >= MAX_DIRTY_RECTS:
+            # Запросы копятся (например, окно свернуто) - проще перерисовать все.
+            self._dirty_rects = []
+            self.update()
+            return
+        self._dirty_rects.append(rect)
+        self.update(rect)
+
+    def _cursor_rect(self):
+        """Экранный прямоугольник клетки курсора вместе с толщиной рамки."""
+        col, row = self.cursor_pos
+        x = col * self.zoom + self.offset_x
+        y = row * self.zoom + self.offset_y
+        return QRect(math.floor(x) - 2, math.floor(y) - 2, math.ceil(self.zoom) + 5, math.ceil(self.zoom) + 5)
+
+    def _update_changes(self, changes):
+        """
+        Запрашивает перерисовку экранных прямоугольников изменившихся блоков
+        CHANGE_BLOCK x CHANGE_BLOCK (changes - их ключи; None - перерисовать все).
+        Возвращает False, если видимых изменений нет и перерисовка не нужна.
+        """
+        if changes is None:
+            self.update()
+            return True
+        start_col, start_row, end_col, end_row = self.visible_region()
+        size = CHANGE_BLOCK * self.zoom
+        # Мелкие на экране блоки привязываем к сетке DIRTY_SNAP, чтобы
+        # соседние блоки давали один и тот же прямоугольник.
+        snap = DIRTY_SNAP if size < DIRTY_SNAP else 1
+        rects = set()
+        for bx, by in changes:
+            col, row = bx * CHANGE_BLOCK, by * CHANGE_BLOCK
+            if col >= end_col or row >= end_row or col + CHANGE_BLOCK <= start_col or row + CHANGE_BLOCK <= start_row:
+                continue
+            # Запас в пару пикселей на сглаживание краев и пиксели карты плотности.
+            left = (math.floor(col * self.zoom + self.offset_x) - 2) // snap * snap
+            top = (math.floor(row * self.zoom + self.offset_y) - 2) // snap * snap
+            right = -(-(math.ceil(col * self.zoom + self.offset_x + size) + 2) // snap) * snap
+            bottom = -(-(math.ceil(row * self.zoom + self.offset_y + size) + 2) // snap) * snap
+            rects.add((left, top, right - left, bottom - top))
+            if len(rects) > MAX_DIRTY_RECTS:
+                self.update()
+                return True
+        for rect in rects:
+            self._update_rect(QRect(*rect))
+        return bool(rects)
+
+    def _grid_pixmap(self):
+        """
+        Прозрачная картинка с линиями сетки для текущего масштаба. Строится один
+        раз на масштаб и размер виджета, а при панорамировании только сдвигается.
+        """
+        key = (self.zoom, self.width(), self.height())
+        pixmap = self._grid_cache.get(key)
+        if pixmap is None:
+            if len(self._grid_cache) > 8:
+                self._grid_cache.clear()
+            step = math.ceil(self.zoom)
+            pixmap = QPixmap(self.width() + 2 * step, self.height() + 2 * step)
+            pixmap.fill(Qt.GlobalColor.transparent)
+            grid_painter = QPainter(pixmap)
+            grid_painter.setPen(QPen(QColor("#dcdcdc"), 1))
+            for i in range(int(pixmap.width() / self.zoom) + 1):
+                x = int(i * self.zoom)
+                grid_painter.drawLine(x, 0, x, pixmap.height())
+            for i in range(int(pixmap.height() / self.zoom) + 1):
+                y = int(i * self.zoom)
+                grid_painter.drawLine(0, y, pixmap.width(), y)
+            grid_painter.end()
+            self._grid_cache[key] = pixmap
+        return pixmap
+
+    def _paint_density(self, painter, start_col, start_row, end_col, end_row):
+        """
+        Рисует поле с уровнем детализации: один пиксель картинки - блок
+        block x block клеток, закрашенный тем темнее, чем больше в нем живых.
+        """
+        block = 1 << max(0, math.ceil(math.log2(1 / self.zoom)))
+        # Выравниваем область по границам блоков.
+        min_col = start_col // block * block
+        min_row = start_row // block * block
+        max_col = -(-end_col // block) * block
+        max_row = -(-end_row // block) * block
+        counts = self.snapshot.cells.region_density(min_col, min_row, max_col, max_row, block)
+        if not counts.any():
+            return
+        density = counts / (block * block)
+        # Пустые блоки - белые, непустые - от серого (одна клетка) до черного.
+        shades = np.where(counts > 0, 160 * (1 - np.sqrt(density)), 255).astype(np.uint8)
+        height, width = shades.shape
+        image = QImage(shades.data, width, height, width, QImage.Format.Format_Grayscale8)
+        painter.drawImage(QRectF(min_col * self.zoom + self.offset_x, min_row * self.zoom + self.offset_y,
+                                 width * block * self.zoom, height * block * self.zoom), image)
+
+    def _paint_cells(self, painter, start_col, start_row, end_col, end_row):
+        """
+        Рисует клетки диапазона: запрашиваем у снимка только эту область в виде
+        маски (одна клетка = один пиксель) и растягиваем ее одним вызовом.
+        """
+        mask = self.snapshot.cells.region_mask(start_col, start_row, end_col, end_row)
+        if mask.any():
+            height, width = mask.shape
+            image = QImage(mask.data, width, height, width, QImage.Format.Format_Indexed8)
+            image.setColorTable(cell_color_table(self.engine.rule.states))
+            painter.drawImage(QRectF(start_col * self.zoom + self.offset_x, start_row * self.zoom + self.offset_y,
+                                     width * self.zoom, height * self.zoom), image)
+
+    # --- Границы конечного поля ---
+
+    def _field_rect(self):
+        """Экранный прямоугольник конечного поля или None, если поле бесконечно."""
+        bounds = self.engine.bounds
+        if bounds is None:
+            return None
+        min_col, min_row, max_col, max_row = bounds
+        return QRectF(min_col * self.zoom + self.offset_x, min_row * self.zoom + self.offset_y,
+                      (max_col - min_col) * self.zoom, (max_row - min_row) * self.zoom)
+
+    def _paint_boundary(self, painter, field):
+        """Рисует край поля: сплошной у ограниченного поля, пунктир у тора (края склеены)."""
+        pen = QPen(BOUNDARY_COLOR)
+        pen.setWidth(2)
+        if self.engine.topology == TOPOLOGY_TORUS:
+            pen.setStyle(Qt.PenStyle.DashLine)
+        painter.setPen(pen)
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+        painter.drawRect(field)
+
+    # --- Панель статистики ---
+
+    def set_stats_visible(self, visible):
+        """Показывает или прячет панель с темпом, FPS, населением и временем шага и кадра."""
+        self.stats_visible = visible
+        if visible:
+            self._stats_last = None
+            self._refresh_stats()
+            self.stats_timer.start(STATS_INTERVAL)
+        else:
+            self.stats_timer.stop()
+            self._update_rect(self._stats_rect)
+            self._stats_rect = QRect()
+
+    def _refresh_stats(self):
+        """Пересчитывает строки панели статистики и перерисовывает ее."""
+        now = time.perf_counter()
+        generation = self.snapshot.generation
+        frames = self.profiler.count('render')
+        gps = fps = 0.0
+        if self._stats_last is not None:
+            last_time, last_generation, last_frames = self._stats_last
+            elapsed = now - last_time
+            if elapsed > 0:
+                gps = max(0, generation - last_generation) / elapsed
+                fps = (frames - last_frames) / elapsed
+        self._stats_last = (now, generation, frames)
+
+        lines = [self.t['stats_rates'].format(gps, fps),
+                 self.t['stats_population'].format(self.snapshot.population)]
+        for name in ('step', 'render'):
+            p50, p99 = self.profiler.percentiles(name)
+            if p50 is not None:
+                lines.append(self.t['stats_timer'].format(self.t[f'stats_{name}'], p50, p99))
+        self._stats_lines = lines
+
+        metrics = self.fontMetrics()
+        width = max(metrics.horizontalAdvance(line) for line in lines) + 2 * STATS_PADDING
+        height = metrics.height() * len(lines) + 2 * STATS_PADDING
+        old_rect = self._stats_rect
+        self._stats_rect = QRect(STATS_MARGIN, STATS_MARGIN, width, height)
+        self._update_rect(old_rect.united(self._stats_rect))
+
+    def _paint_stats(self, painter):
+        """Рисует панель статистики в левом верхнем углу."""
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QColor(0, 0, 0, 160))
+        painter.drawRect(self._stats_rect)
+        painter.setPen(QColor("white"))
+        metrics = self.fontMetrics()
+        x = self._stats_rect.x() + STATS_PADDING
+        y = self._stats_rect.y() + STATS_PADDING + metrics.ascent()
+        for line in self._stats_lines:
+            painter.drawText(x, y, line)
+            y += metrics.height()
 
     def paintEvent(self, event):
         """Главный метод отрисовки. Вызывается каждый раз при self.update()."""
+        with self.profiler.time('render'):
+            self._paint(event)
+        self.frame_rendered.emit()
+
+    def _paint(self, event):
+        # Если перерисовать нужно только запрошенные прямоугольники (изменившиеся
+        # блоки, курсор), клетки считаются только для них. Иначе (панорамирование,
+        # зум, перекрытие окна) - для всей области события.
+        requested = QRegion()
+        for rect in self._dirty_rects:
+            requested = requested.united(rect)
+        if self._dirty_rects and event.region().subtracted(requested).isEmpty():
+            areas = self._dirty_rects
+        else:
+            areas = [event.rect()]
+        self._dirty_rects = []
+
         painter = QPainter(self)
         painter.fillRect(self.rect(), QColor("white"))  # Заливаем фон белым.
+        # У конечного поля все, что за его краями, закрашивается серым.
+        field = self._field_rect()
+        if field is not None:
+            painter.fillRect(self.rect(), OUTSIDE_COLOR)
+            painter.fillRect(field, QColor("white"))
 
         # Вычисляем, какие мировые координаты (клетки) сейчас видны на экране.
-        start_col = int(-self.offset_x / self.zoom);
-        end_col = int((-self.offset_x + self.width()) / self.zoom) + 1
-        start_row = int(-self.offset_y / self.zoom);
-        end_row = int((-self.offset_y + self.height()) / self.zoom) + 1
+        start_col, start_row, end_col, end_row = self.visible_region()
+        left = start_col * self.zoom + self.offset_x
+        top = start_row * self.zoom + self.offset_y
 
-        # Рисуем сетку, только если масштаб достаточно большой.
+        # Рисуем сетку, только если масштаб достаточно большой: готовая
+        # картинка сдвигается так, чтобы линии совпали с краями клеток.
         if self.zoom > 4:
-            pen = QPen(QColor("#dcdcdc"));
-            pen.setWidth(1);
-            painter.setPen(pen)
-            for x in range(start_col, end_col): painter.drawLine(int(x * self.zoom + self.offset_x), 0,
-                                                                 int(x * self.zoom + self.offset_x), self.height())
-            for y in range(start_row, end_row): painter.drawLine(0, int(y * self.zoom + self.offset_y), self.width(),
-                                                                 int(y * self.zoom + self.offset_y))
-
-        # Рисуем все живые клетки, которые попадают в видимую область.
-        painter.setBrush(QColor("black"));
-        painter.setPen(Qt.PenStyle.NoPen)
-        for (col, row) in self.live_cells:
-            if start_col <= col < end_col and start_row <= row < end_row:
-                painter.drawRect(
-                    QRectF(col * self.zoom + self.offset_x, row * self.zoom + self.offset_y, self.zoom, self.zoom))
+            painter.drawPixmap(math.floor(left), math.floor(top), self._grid_pixmap())
+
+        for area in areas:
+            if self.zoom < LOD_ZOOM:
+                # При сильном отдалении вместо клеток рисуем их плотность.
+                self._paint_density(painter, *self.visible_region(area))
+            else:
+                self._paint_cells(painter, *self.visible_region(area))
+
+        if field is not None:
+            self._paint_boundary(painter, field)
 
         # Рисуем мигающий курсор поверх всего остального.
         if self.cursor_visible:
@@ -339,10 +936,187 @@ class GridWidget(QWidget):
                 painter.drawRect(
                     QRectF(col * self.zoom + self.offset_x, row * self.zoom + self.offset_y, self.zoom, self.zoom))
 
+        if self.stats_visible:
+            self._paint_stats(painter)
+        painter.end()
+
+
+class ThumbnailLoader(QThread):
+    """
+    Фоновый поток миниатюр библиотеки: берет PNG из базы или рисует его по
+    клеткам паттерна (thumbnails.pattern_thumbnail) и отдает интерфейсу
+    готовую QImage. Первыми обрабатываются последние запросы - строки,
+    которые видны сейчас, а не те, мимо которых список уже прокрутили.
+    """
+
+    # (хэш содержимого паттерна, миниатюра QImage).
+    thumbnail_ready = pyqtSignal(str, QImage)
+
+    # Сколько запросов может ждать; самые старые отбрасываются.
+    MAX_PENDING = 256
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._cond = threading.Condition()
+        # Хэш содержимого -> id паттерна, в порядке запросов.
+        self._queue = OrderedDict()
+        # Хэш, который рисуется сейчас, и хэши, которые нарисовать не удалось.
+        self._current = None
+        self._failed = set()
+        self._quit = False
+
+    def request(self, pattern_id, content_hash):
+        """Просит миниатюру паттерна (повторный запрос поднимает ее в начало очереди)."""
+        with self._cond:
+            if content_hash == self._current or content_hash in self._failed:
+                return
+            self._queue[content_hash] = pattern_id
+            self._queue.move_to_end(content_hash)
+            while len(self._queue) > self.MAX_PENDING:
+                self._queue.popitem(last=False)
+            self._cond.notify()
+
+    def clear(self):
+        """Забывает ожидающие запросы (например, при смене фильтра списка)."""
+        with self._cond:
+            self._queue.clear()
+
+    def shutdown(self):
+        """Завершает поток и дожидается его остановки."""
+        with self._cond:
+            self._quit = True
+            self._cond.notify()
+        self.wait()
+
+    def run(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._queue and not self._quit:
+                        self._cond.wait()
+                    if self._quit:
+                        return
+                    content_hash, pattern_id = self._queue.popitem()
+                    self._current = content_hash
+                try:
+                    png = pattern_thumbnail(pattern_id, content_hash)
+                except Exception:
+                    # Битые клетки или ошибка базы: строка остается без миниатюры.
+                    png = None
+                    with self._cond:
+                        self._failed.add(content_hash)
+                with self._cond:
+                    self._current = None
+                if png is not None:
+                    self.thumbnail_ready.emit(content_hash, QImage.fromData(png, 'PNG'))
+        finally:
+            # Соединение с базой, открытое этим потоком, закрывается вместе с ним.
+            database.close_thread()
+
+
+class PatternListModel(QAbstractListModel):
+    """
+    Список паттернов библиотеки. Строки подгружаются из БД страницами по мере
+    прокрутки (canFetchMore/fetchMore), а фильтр по имени выполняет сама БД,
+    поэтому открытие библиотеки не зависит от числа паттернов в ней.
+    Миниатюры рисуются в фоновом потоке (ThumbnailLoader) только для строк,
+    которые список запросил для показа; до готовности строка показывает
+    пустую заглушку того же размера.
+    """
+
+    PAGE_SIZE = 200
+
+    # Миниатюры (QPixmap) по хэшу содержимого паттерна, общие для всех окон
+    # библиотеки: повторно открытое окно показывает их сразу.
+    thumbnail_cache = LRUCache()
+
+    def __init__(self, lang='ru', parent=None):
+        super().__init__(parent)
+        self.lang = lang
+        self._query = ""
+        self._rows = []  # (id, name, population, kind, period, content_hash)
+        # Хэш содержимого -> номера строк с ним (чтобы обновить их, когда миниатюра готова).
+        self._hash_rows = {}
+        self._total = 0
+        self._placeholder = QPixmap(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        self._placeholder.fill(QColor(240, 240, 240))
+        self.loader = ThumbnailLoader(self)
+        self.loader.thumbnail_ready.connect(self._thumbnail_ready)
+        self.loader.start()
+        self.set_filter("")
+
+    def set_filter(self, query):
+        """Задает строку поиска и начинает загрузку списка заново."""
+        self.beginResetModel()
+        self._query = query
+        self._rows = []
+        self._hash_rows = {}
+        self._total = database.count_patterns(query)
+        self.loader.clear()
+        self.endResetModel()
+
+    def shutdown(self):
+        """Останавливает поток миниатюр (при закрытии окна библиотеки)."""
+        self.loader.shutdown()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and len(self._rows) < self._total
+
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+        page = database.get_patterns(self._query, len(self._rows), self.PAGE_SIZE)
+        if not page:
+            # Часть паттернов удалили, пока список был открыт.
+            self._total = len(self._rows)
+            return
+        self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(page) - 1)
+        for row, pattern in enumerate(page, len(self._rows)):
+            self._hash_rows.setdefault(pattern[5], []).append(row)
+        self._rows.extend(page)
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        pattern_id, name, population, kind, period, content_hash = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            t = TRANSLATIONS[self.lang]
+            kind_text = t.get(f'kind_{kind}', t['kind_unknown']).format(period=period)
+            return t['lib_item'].format(name=name, population=population, kind=kind_text)
+        if role == Qt.ItemDataRole.DecorationRole:
+            # Список запрашивает миниатюры только у видимых строк.
+            pixmap = self.thumbnail_cache.get(content_hash)
+            if pixmap is None:
+                self.loader.request(pattern_id, content_hash)
+                return self._placeholder
+            return pixmap
+        if role == Qt.ItemDataRole.UserRole:
+            return pattern_id
+        return None
+
+    def _thumbnail_ready(self, content_hash, image):
+        """Кладет готовую миниатюру в кэш и перерисовывает строки с ней."""
+        self.thumbnail_cache.put(content_hash, QPixmap.fromImage(image))
+        for row in self._hash_rows.get(content_hash, ()):
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+    def pattern_at(self, row):
+        """(id, name) паттерна в строке row."""
+        pattern_id, name = self._rows[row][:2]
+        return pattern_id, name
+
 
 class PatternLibraryWindow(QWidget):
-    # Сигнал, который будет отправляться, когда пользователь выберет паттерн
-    pattern_selected = pyqtSignal(set)
+    # Сигнал, который будет отправляться, когда пользователь выберет паттерн:
+    # клетки в виде массивов NumPy (колонки, ряды).
+    pattern_selected = pyqtSignal(object, object)
+    # Сигнал о добавлении или удалении паттерна.
+    library_changed = pyqtSignal()
 
     def __init__(self, current_cells, lang='ru'):
         super().__init__()
@@ -353,9 +1127,22 @@ class PatternLibraryWindow(QWidget):
 
         layout = QVBoxLayout(self)
 
+        # Строка поиска: фильтр применяется с небольшой задержкой после ввода.
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText(TRANSLATIONS[self.lang]['lib_filter'])
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(200)
+        self.filter_timer.timeout.connect(self.refresh_list)
+        self.filter_edit.textChanged.connect(self.filter_timer.start)
+
         # Список для отображения паттернов
-        self.pattern_list = QListWidget()
-        self.pattern_list.itemDoubleClicked.connect(self.load_selected_pattern)
+        self.model = PatternListModel(self.lang, self)
+        self.pattern_list = QListView()
+        self.pattern_list.setUniformItemSizes(True)
+        self.pattern_list.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.pattern_list.setModel(self.model)
+        self.pattern_list.doubleClicked.connect(self.load_selected_pattern)
 
         # Кнопки управления
         load_button = QPushButton(TRANSLATIONS[self.lang]['btn_load_sel'])
@@ -367,39 +1154,41 @@ class PatternLibraryWindow(QWidget):
         delete_button = QPushButton(TRANSLATIONS[self.lang]['btn_del_sel'])
         delete_button.clicked.connect(self.delete_selected_pattern)
 
+        layout.addWidget(self.filter_edit)
         layout.addWidget(self.pattern_list)
         layout.addWidget(load_button)
         layout.addWidget(save_button)
         layout.addWidget(delete_button)
 
-        self.refresh_list()
-
     def refresh_list(self):
-        """Обновляет список паттернов из базы данных."""
-        self.pattern_list.clear()
-        self.patterns_map = {}
-        patterns = database.get_patterns()
-        for pattern_id, name in patterns:
-            self.pattern_list.addItem(name)
-            self.patterns_map[name] = pattern_id
+        """Перечитывает список паттернов из базы данных с текущим фильтром."""
+        self.model.set_filter(self.filter_edit.text())
+
+    def closeEvent(self, event):
+        """Останавливает поток миниатюр перед закрытием окна."""
+        self.model.shutdown()
+        super().closeEvent(event)
+
+    def selected_pattern(self):
+        """(id, name) выбранного паттерна или None."""
+        index = self.pattern_list.currentIndex()
+        if not index.isValid():
+            return None
+        return self.model.pattern_at(index.row())
 
     def load_selected_pattern(self):
         """Загружает выбранный паттерн и отправляет его в главное окно."""
-        selected_item = self.pattern_list.currentItem()
-        if not selected_item:
+        selected = self.selected_pattern()
+        if not selected:
             return
 
-        pattern_id = self.patterns_map[selected_item.text()]
-        cells_str = database.get_pattern_cells(pattern_id)
-
-        new_cells = set()
-        if cells_str:
-            for part in cells_str.split(';'):
-                col, row = map(int, part.split(','))
-                new_cells.add((col, row))
+        pattern_id, _ = selected
+        cells = database.get_pattern_cells(pattern_id)
+        if cells is None:
+            return
 
         # Отправляем сигнал с загруженными клетками
-        self.pattern_selected.emit(new_cells)
+        self.pattern_selected.emit(*cells)
         self.close()  # Закрываем окно после загрузки
 
     def save_current_pattern(self):
@@ -411,20 +1200,22 @@ class PatternLibraryWindow(QWidget):
             QMessageBox.information(self, "Result", message)
             if success:
                 self.refresh_list()
+                self.library_changed.emit()
 
     def delete_selected_pattern(self):
         """Удаляет выбранный паттерн из БД."""
-        selected_item = self.pattern_list.currentItem()
+        selected = self.selected_pattern()
         t = TRANSLATIONS[self.lang]
-        if not selected_item:
+        if not selected:
             return
 
-        reply = QMessageBox.question(self, "Confirm", t['msg_del_confirm'].format(selected_item.text()))
+        pattern_id, name = selected
+        reply = QMessageBox.question(self, "Confirm", t['msg_del_confirm'].format(name))
 
         if reply == QMessageBox.StandardButton.Yes:
-            pattern_id = self.patterns_map[selected_item.text()]
             database.delete_pattern(pattern_id)
             self.refresh_list()
+            self.library_changed.emit()
 
 
 ### --- Классс окна справки ---
@@ -518,6 +1309,9 @@ class GameOfLifeWindow(QMainWindow):
         self.t = TRANSLATIONS[self.lang]
         self.help_win = None
         self.library_win = None
+        # Перепись объектов (census.Census) со своим кэшем имен; создается
+        # заново при изменении библиотеки.
+        self.census = None
         icon_path = os.path.join(BASE_DIR, "icon.ico")
         self.setWindowIcon(QIcon(icon_path))
         self.setWindowTitle(self.t['window_title'])
@@ -526,6 +1320,7 @@ class GameOfLifeWindow(QMainWindow):
         main_layout = QVBoxLayout(central_widget)
 
         self.grid_widget = GridWidget()
+        self.grid_widget.t = self.t
         # Разрешаем виджету отслеживать нажатия клавиш.
         self.grid_widget.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
         main_layout.addWidget(self.grid_widget)
@@ -548,9 +1343,26 @@ class GameOfLifeWindow(QMainWindow):
         button_layout.addWidget(reset_glider_button)
         button_layout.addWidget(clear_button)
 
-        # Главный таймер, отвечающий за симуляцию.
-        self.timer = QTimer();
-        self.timer.timeout.connect(self.grid_widget.update_grid)
+        # Полоса истории: шаг назад и ползунок по записанным поколениям.
+        history_layout = QHBoxLayout()
+        main_layout.addLayout(history_layout)
+        step_back_button = QPushButton(self.t['btn_step_back'])
+        step_back_button.clicked.connect(self.step_back)
+        self.history_slider = QSlider(Qt.Orientation.Horizontal)
+        self.history_slider.valueChanged.connect(self.scrub_history)
+        self.generation_label = QLabel(self.t['label_generation'].format(0))
+        history_layout.addWidget(step_back_button)
+        history_layout.addWidget(self.history_slider)
+        history_layout.addWidget(self.generation_label)
+        self.grid_widget.generation_shown.connect(self.update_history_bar)
+        self.grid_widget.simulation.cycle_found.connect(self.cycle_found)
+        self.grid_widget.simulation.run_finished.connect(self.grid_widget.refresh)
+        self.update_history_bar(self.grid_widget.engine.generation)
+
+        # Симуляция идет в фоновом потоке виджета; по умолчанию 10 пок./с,
+        # как у прежнего таймера с интервалом 100 мс.
+        self.simulation = self.grid_widget.simulation
+        self.simulation.set_speed(SPEED_OPTIONS[0])
 
         # Главное меню игры
         self._create_menu_bar()
@@ -579,6 +1391,11 @@ class GameOfLifeWindow(QMainWindow):
         help_menu = menu_bar.addMenu(self.t['menu_help'])
         help_menu.addAction(help_action)
 
+        # Смена языка (выбор запоминается, см. save_language)
+        language_action = QAction(self.t['act_language'], self)
+        language_action.triggered.connect(self.choose_language)
+        help_menu.addAction(language_action)
+
         # Библиотекарь sqlite
         library_action = QAction(self.t['lib_title'], self)
         library_action.triggered.connect(self.show_pattern_library)
@@ -586,6 +1403,389 @@ class GameOfLifeWindow(QMainWindow):
 
         file_menu.addSeparator()
 
+        # МЕНЮ "ДВИЖОК" - выбор реализации симуляции
+        engine_menu = menu_bar.addMenu(self.t['menu_engine'])
+        engine_group = QActionGroup(self)
+        # Имя движка -> пункт меню (чтобы отметить движок, выбранный не из меню).
+        self.engine_actions = {}
+        for name in ENGINES:
+            engine_action = QAction(self.t.get(f'engine_{name}', name), self)
+            engine_action.setCheckable(True)
+            engine_action.setChecked(name == DEFAULT_ENGINE)
+            engine_action.triggered.connect(lambda checked, n=name: self.change_engine(n))
+            engine_group.addAction(engine_action)
+            engine_menu.addAction(engine_action)
+            self.engine_actions[name] = engine_action
+
+        engine_menu.addSeparator()
+        # Прыжок на 2^k поколений (быстро только для Hashlife)
+        jump_action = QAction(self.t['act_jump'], self)
+        jump_action.triggered.connect(self.jump_generations)
+        engine_menu.addAction(jump_action)
+        # Перепись объектов поля по библиотеке паттернов
+        census_action = QAction(self.t['act_census'], self)
+        census_action.triggered.connect(self.show_census)
+        engine_menu.addAction(census_action)
+
+        # МЕНЮ "ПРАВИЛО" - известные правила и ввод своей строки правила
+        rule_menu = menu_bar.addMenu(self.t['menu_rule'])
+        rule_group = QActionGroup(self)
+        # Правило -> пункт меню (чтобы отметить правило, выбранное не из меню).
+        self.rule_actions = {}
+        for name, rulestring in RULES.items():
+            rule = parse_rule(rulestring)
+            rule_action = QAction(f"{name} ({rulestring})", self)
+            rule_action.setCheckable(True)
+            rule_action.triggered.connect(lambda checked, r=rule: self.change_rule(r))
+            rule_group.addAction(rule_action)
+            rule_menu.addAction(rule_action)
+            self.rule_actions[rule] = rule_action
+        rule_menu.addSeparator()
+        self.other_rule_action = QAction(self.t['act_rule_other'], self)
+        self.other_rule_action.setCheckable(True)
+        self.other_rule_action.triggered.connect(self.enter_rule)
+        rule_group.addAction(self.other_rule_action)
+        rule_menu.addAction(self.other_rule_action)
+        self.update_rule_actions()
+
+        # МЕНЮ "ТОПОЛОГИЯ" - бесконечное поле, ограниченное поле или тор
+        topology_menu = menu_bar.addMenu(self.t['menu_topology'])
+        topology_group = QActionGroup(self)
+        self.topology_actions = {}
+        for topology in (TOPOLOGY_INFINITE, TOPOLOGY_BOUNDED, TOPOLOGY_TORUS):
+            topology_action = QAction(self.t[f'topology_{topology}'], self)
+            topology_action.setCheckable(True)
+            topology_action.triggered.connect(lambda checked, t=topology: self.change_topology(t))
+            topology_group.addAction(topology_action)
+            topology_menu.addAction(topology_action)
+            self.topology_actions[topology] = topology_action
+        self.update_topology_actions()
+
+        # МЕНЮ "ИСТОРИЯ" - возврат к прошлым поколениям
+        history_menu = menu_bar.addMenu(self.t['menu_history'])
+        step_back_action = QAction(self.t['act_step_back'], self)
+        step_back_action.setShortcut(QKeySequence(Qt.Key.Key_Backspace))
+        step_back_action.triggered.connect(self.step_back)
+        history_menu.addAction(step_back_action)
+        goto_action = QAction(self.t['act_goto_gen'], self)
+        goto_action.triggered.connect(self.goto_generation)
+        history_menu.addAction(goto_action)
+        history_menu.addSeparator()
+        # Автоостановка, когда поле стало периодичным (statehash.CycleDetector)
+        stop_on_cycle_action = QAction(self.t['act_stop_on_cycle'], self)
+        stop_on_cycle_action.setCheckable(True)
+        stop_on_cycle_action.toggled.connect(self.set_stop_on_cycle)
+        history_menu.addAction(stop_on_cycle_action)
+
+        # МЕНЮ "СКОРОСТЬ" - поколений в секунду или максимально быстро
+        speed_menu = menu_bar.addMenu(self.t['menu_speed'])
+        speed_group = QActionGroup(self)
+        for gps in SPEED_OPTIONS:
+            text = self.t['speed_gps'].format(gps) if gps else self.t['speed_max']
+            speed_action = QAction(text, self)
+            speed_action.setCheckable(True)
+            speed_action.setChecked(gps == SPEED_OPTIONS[0])
+            speed_action.triggered.connect(lambda checked, g=gps: self.set_speed(g))
+            speed_group.addAction(speed_action)
+            speed_menu.addAction(speed_action)
+
+        # МЕНЮ "ПРОФИЛИРОВАНИЕ" - замеры времени и сеансы cProfile
+        profiling_menu = menu_bar.addMenu(self.t['menu_profiling'])
+        stats_action = QAction(self.t['act_stats_overlay'], self)
+        stats_action.setCheckable(True)
+        stats_action.setShortcut(QKeySequence(Qt.Key.Key_F3))
+        stats_action.toggled.connect(self.grid_widget.set_stats_visible)
+        profiling_menu.addAction(stats_action)
+        save_stats_action = QAction(self.t['act_save_stats'], self)
+        save_stats_action.triggered.connect(self.save_stats)
+        profiling_menu.addAction(save_stats_action)
+        reset_stats_action = QAction(self.t['act_reset_stats'], self)
+        reset_stats_action.triggered.connect(self.grid_widget.profiler.reset)
+        profiling_menu.addAction(reset_stats_action)
+        profiling_menu.addSeparator()
+        self.profile_action = QAction(self.t['act_profile_start'], self)
+        self.profile_action.triggered.connect(self.toggle_profile_session)
+        profiling_menu.addAction(self.profile_action)
+
+    def jump_generations(self):
+        """
+        Продвигает поле на 2^k поколений. Hashlife делает это одним
+        запоминаемым шагом; остальные движки считают 2^k поколений в потоке
+        симуляции, и прыжок можно прервать кнопкой "Стоп".
+        """
+        self.stop_game()
+        engine = self.grid_widget.engine
+        if hasattr(engine, 'advance_pow2'):
+            k, ok = QInputDialog.getInt(self, self.t['act_jump'], self.t['input_jump_label'],
+                                        10, 0, JUMP_MAX_EXPONENT)
+            if ok:
+                self.grid_widget.edit_engine(engine.advance_pow2, k)
+        else:
+            k, ok = QInputDialog.getInt(self, self.t['act_jump'],
+                                        self.t['input_jump_steps_label'].format(JUMP_MAX_STEPS_EXPONENT),
+                                        10, 0, JUMP_MAX_STEPS_EXPONENT)
+            if ok:
+                self.simulation.run_for(1 << k)
+
+    def show_census(self):
+        """Показывает, какие объекты (по библиотеке паттернов) есть на поле."""
+        self.stop_game()
+        with self.simulation.lock:
+            engine = self.grid_widget.engine
+            if engine.rule.states > 2:
+                QMessageBox.warning(self, self.t['act_census'], self.t['census_generations'])
+                return
+            if engine.population > CENSUS_MAX_POPULATION:
+                QMessageBox.warning(self, self.t['act_census'], self.t['census_too_big'].format(engine.population))
+                return
+            cols, rows = engine.cell_arrays()
+        if self.census is None:
+            from census import Census
+            self.census = Census()
+        counts = self.census.count(cols, rows)
+        lines = [self.t['census_line'].format(count=count, name=name)
+                 for name, count in counts.most_common(CENSUS_LINES)]
+        if len(counts) > CENSUS_LINES:
+            lines.append(self.t['census_more'].format(len(counts) - CENSUS_LINES))
+        QMessageBox.information(self, self.t['act_census'], "\n".join(lines) or self.t['census_empty'])
+
+    def forget_census(self):
+        """Слот: библиотека изменилась - имена объектов нужно искать заново."""
+        self.census = None
+
+    def update_history_bar(self, generation):
+        """Обновляет ползунок истории и номер поколения под показанный снимок."""
+        text = self.t['label_generation'].format(generation)
+        cycle = self.grid_widget.detector.cycle
+        if cycle is not None and generation >= cycle.start:
+            kind = self.t.get(f'kind_{cycle.kind}', self.t['kind_unknown']).format(period=cycle.period)
+            text += " - " + self.t['label_cycle'].format(kind=kind, start=cycle.start)
+        history = self.grid_widget.history
+        if history.paused is not None:
+            text += " - " + self.t['label_history_paused'].format(history.paused)
+        self.generation_label.setText(text)
+        first, last = history.first, history.last
+        # Ползунок не должен вызывать переход, когда его двигает программа.
+        self.history_slider.blockSignals(True)
+        if first is None:
+            self.history_slider.setRange(0, 0)
+        else:
+            # Значение ползунка - смещение от первого записанного поколения.
+            self.history_slider.setRange(0, min(last - first, 2 ** 31 - 1))
+            self.history_slider.setValue(max(0, min(generation - first, 2 ** 31 - 1)))
+        self.history_slider.blockSignals(False)
+
+    def cycle_found(self, cycle):
+        """Слот: поле стало периодичным. Если поток сам остановился, показываем итог."""
+        if not self.simulation.running:
+            self.grid_widget.refresh()
+
+    def set_stop_on_cycle(self, enabled):
+        self.simulation.stop_on_cycle = enabled
+
+    def scrub_history(self, value):
+        """Слот ползунка: переходит к выбранному поколению."""
+        first = self.grid_widget.history.first
+        if first is not None:
+            self.stop_game()
+            self.grid_widget.seek_generation(first + value)
+
+    def step_back(self):
+        self.stop_game()
+        self.grid_widget.step_back()
+
+    def goto_generation(self):
+        """Переходит к поколению, номер которого вводит пользователь."""
+        self.stop_game()
+        history = self.grid_widget.history
+        if history.first is None:
+            return
+        generation, ok = QInputDialog.getInt(self, self.t['act_goto_gen'], self.t['input_goto_label'],
+                                             self.grid_widget.engine.generation,
+                                             history.first, min(history.last, 2 ** 31 - 1))
+        if ok:
+            self.grid_widget.seek_generation(generation)
+
+    def change_engine(self, name):
+        """Останавливает симуляцию и переключает движок."""
+        self.stop_game()
+        rule = self.grid_widget.engine.rule
+        try:
+            if not engine_supports(name, rule):
+                QMessageBox.warning(self, self.t['menu_engine'].replace('&', ''), self.t['msg_engine_rule'].format(
+                    engine=self.t.get(f'engine_{name}', name), rule=rule.rulestring))
+                self.update_engine_actions()
+                return
+            # С конечного поля движок из меню возвращает на бесконечную плоскость.
+            self.grid_widget.set_engine(name)
+        except ImportError as e:
+            QMessageBox.critical(self, self.t['MSG_ERROR'], str(e))
+            self.update_engine_actions()
+        self.update_topology_actions()
+
+    def update_engine_actions(self):
+        """Отмечает в меню текущий движок."""
+        engine_class = type(self.grid_widget.engine).__name__
+        for name, (_, class_name) in ENGINES.items():
+            if class_name == engine_class:
+                self.engine_actions[name].setChecked(True)
+
+    def change_topology(self, topology):
+        """
+        Останавливает симуляцию и меняет топологию поля. Размер конечного
+        поля вводит пользователь; бесконечное поле считает движок, отмеченный
+        в меню «Движок».
+        """
+        self.stop_game()
+        if topology == TOPOLOGY_INFINITE:
+            self.grid_widget.set_topology(topology, engine_name=self.infinite_engine_name())
+        else:
+            size = self.ask_grid_size()
+            if size is not None:
+                self.grid_widget.set_topology(topology, *size)
+        self.update_topology_actions()
+
+    def ask_grid_size(self):
+        """Спрашивает размер конечного поля: (ширина, высота) или None."""
+        engine = self.grid_widget.engine
+        current = f"{engine.width}x{engine.height}" if engine.bounds else f"{DEFAULT_WIDTH}x{DEFAULT_HEIGHT}"
+        text, ok = QInputDialog.getText(self, self.t['menu_topology'].replace('&', ''),
+                                        self.t['input_size_label'], text=current)
+        if not ok:
+            return None
+        match = re.fullmatch(r'\s*(\d+)\s*[xXхХ*×]\s*(\d+)\s*', text)
+        if match:
+            width, height = int(match.group(1)), int(match.group(2))
+            if 1 <= width <= MAX_SIDE and 1 <= height <= MAX_SIDE:
+                return width, height
+        QMessageBox.warning(self, self.t['menu_topology'].replace('&', ''), self.t['msg_bad_size'].format(MAX_SIDE))
+        return None
+
+    def infinite_engine_name(self):
+        """Движок бесконечного поля: отмеченный в меню или NumPy, если он не считает правило."""
+        name = next((name for name, action in self.engine_actions.items() if action.isChecked()), DEFAULT_ENGINE)
+        if not engine_supports(name, self.grid_widget.engine.rule):
+            name = 'numpy'
+            self.engine_actions[name].setChecked(True)
+        return name
+
+    def update_topology_actions(self):
+        """Отмечает в меню топологию текущего поля."""
+        self.topology_actions[self.grid_widget.engine.topology].setChecked(True)
+
+    def change_rule(self, rule):
+        """
+        Останавливает симуляцию и меняет правило. Правила Generations считает
+        только NumPy: с другого движка поле сначала переносится на него.
+        """
+        self.stop_game()
+        if rule.states > 2 and not self.grid_widget.engine.supports_generations:
+            self.change_engine('numpy')
+            if not self.grid_widget.engine.supports_generations:
+                self.update_rule_actions()
+                return
+            self.update_engine_actions()
+        self.grid_widget.set_rule(rule)
+        self.update_rule_actions()
+
+    def enter_rule(self):
+        """Меняет правило на строку, которую вводит пользователь."""
+        self.stop_game()
+        text, ok = QInputDialog.getText(self, self.t['act_rule_other'], self.t['input_rule_label'],
+                                        text=self.grid_widget.engine.rule.rulestring)
+        if ok:
+            try:
+                self.change_rule(parse_rule(text))
+            except ValueError as e:
+                QMessageBox.warning(self, self.t['act_rule_other'], str(e))
+        self.update_rule_actions()
+
+    def update_rule_actions(self):
+        """Отмечает в меню текущее правило (неизвестное - пунктом «Другое правило»)."""
+        rule = self.grid_widget.engine.rule
+        action = self.rule_actions.get(rule, self.other_rule_action)
+        action.setChecked(True)
+        other = self.t['act_rule_other']
+        self.other_rule_action.setText(other if rule in self.rule_actions else f"{other} ({rule.rulestring})")
+
+    def apply_file_rule(self, rulestring, engine=None):
+        """
+        Ставит правило из заголовка загруженного файла: полю или, если
+        передан, новому движку из файла (он еще не показан). Если правило не
+        разобрать или движок его не считает, остается текущее правило.
+        """
+        try:
+            rule = parse_rule(split_grid_rule(rulestring)[0])
+        except ValueError:
+            rule = None
+        if engine is None:
+            if rule is not None:
+                self.change_rule(rule)
+                return
+        else:
+            if rule is not None and (rule.states == 2 or engine.supports_generations):
+                engine.set_rule(rule)
+                return
+            current = self.grid_widget.engine.rule
+            if current.states == 2 or engine.supports_generations:
+                engine.set_rule(current)
+        QMessageBox.warning(self, self.t['act_load'], self.t['msg_file_rule'].format(rulestring))
+
+    def apply_file_grid(self, rulestring):
+        """
+        Переносит поле на конечное поле из суффикса правила файла (":T100,80"
+        - тор, ":P100,80" - ограниченное поле). Без суффикса топология не меняется.
+        """
+        try:
+            _, topology, width, height = split_grid_rule(rulestring)
+        except ValueError:
+            return
+        if topology != TOPOLOGY_INFINITE:
+            self.grid_widget.set_topology(topology, width, height)
+            self.update_topology_actions()
+
+    def save_stats(self):
+        """Сохраняет сводку замеров (p50/p99 шага, отрисовки, ввода-вывода...) в JSON."""
+        file_path, _ = QFileDialog.getSaveFileName(self, self.t['act_save_stats'], "stats.json", "JSON (*.json)")
+        if not file_path:
+            return
+        snapshot = self.grid_widget.snapshot
+        try:
+            self.grid_widget.profiler.dump(file_path, engine=type(self.grid_widget.engine).__name__,
+                                           generation=snapshot.generation, population=snapshot.population,
+                                           zoom=self.grid_widget.zoom)
+        except OSError as e:
+            QMessageBox.critical(self, self.t['MSG_ERROR'], str(e))
+
+    def toggle_profile_session(self):
+        """Начинает сеанс cProfile или завершает его и сохраняет статистику в файл."""
+        session = self.grid_widget.profile_session
+        if not session.active:
+            session.start()
+            self.profile_action.setText(self.t['act_profile_stop'])
+            return
+        # Под блокировкой поток симуляции не находится внутри профилируемого шага.
+        with self.simulation.lock:
+            session.stop()
+        self.profile_action.setText(self.t['act_profile_start'])
+        file_path, _ = QFileDialog.getSaveFileName(self, self.t['act_profile_stop'], "session.prof",
+                                                   "cProfile (*.prof);;Text (*.txt)")
+        if file_path:
+            try:
+                session.dump(file_path)
+            except ValueError:
+                QMessageBox.warning(self, self.t['act_profile_stop'], self.t['profile_empty'])
+            except OSError as e:
+                QMessageBox.critical(self, self.t['MSG_ERROR'], str(e))
+        self.grid_widget.profile_session = self.simulation.profile_session = ProfileSession()
+
+    def choose_language(self):
+        """Запоминает другой язык интерфейса; он применяется при следующем запуске."""
+        dialog = LanguageSelectDialog(self.lang)
+        if dialog.exec() and dialog.get_lang() != self.lang:
+            save_language(dialog.get_lang())
+            QMessageBox.information(self, self.t['act_language'], TRANSLATIONS[dialog.get_lang()]['msg_language'])
+
     def show_help_window(self):
         """Создает и показывает окно справки."""
         # Проверяем, не открыто ли уже окно
@@ -596,8 +1796,8 @@ class GameOfLifeWindow(QMainWindow):
 
     def save_pattern(self):
         """
-        Открывает диалог сохранения файла и записывает в него
-        координаты живых клеток.
+        Открывает диалог сохранения файла и записывает в него живые клетки.
+        Формат определяется расширением: .rle, .mc или .txt (по строке на клетку).
         """
         self.stop_game()  # Останавливаем симуляцию перед сохранением
 
@@ -606,26 +1806,39 @@ class GameOfLifeWindow(QMainWindow):
             self,
             self.t['input_save_title'],
             "",  # Начальная директория (пусто = по умолчанию)
-            "Pattern Files (*.txt);;All Files (*)"  # Фильтры файлов
+            PATTERN_FILE_FILTER  # Фильтры файлов
         )
 
         # Если пользователь выбрал файл (не нажал "Отмена")
         if file_path:
             try:
-                with open(file_path, 'w') as f:
-                    # Получаем клетки от виджета
-                    live_cells = self.grid_widget.get_live_cells()
-                    # Записываем каждую координату (col, row) в новую строку
-                    for col, row in live_cells:
-                        f.write(f"{col},{row}\n")
+                with self.grid_widget.profiler.time('io'):
+                    import patternio
+                    ext = os.path.splitext(file_path)[1].lower()
+                    engine = self.grid_widget.engine
+                    if ext == '.mc':
+                        # Дерево Hashlife записывается узлами, без перебора клеток.
+                        with self.simulation.lock:
+                            patternio.write_macrocell(file_path, engine, rule=grid_rule(engine))
+                    elif ext == '.tiles':
+                        with self.simulation.lock:
+                            patternio.write_tiles(file_path, engine)
+                    else:
+                        with self.simulation.lock:
+                            cells = engine.cell_arrays()
+                        if ext == '.txt':
+                            patternio.write_cell_list(file_path, cells)
+                        else:
+                            patternio.write_rle(file_path, cells, rule=grid_rule(engine))
             except Exception as e:
                 # Показываем сообщение об ошибке, если что-то пошло не так
                 QMessageBox.critical(self, self.t['MSG_ERROR'], f"Не удалось сохранить файл:\n{e}")
 
     def load_pattern(self):
         """
-        Открывает диалог загрузки файла и считывает из него
-        координаты живых клеток.
+        Открывает диалог загрузки файла и считывает из него живые клетки.
+        Macrocell загружается сразу в движок Hashlife, снимок тайлов - в
+        движок тайлов.
         """
         self.stop_game()  # Останавливаем симуляцию
 
@@ -633,26 +1846,41 @@ class GameOfLifeWindow(QMainWindow):
             self,
             self.t['act_load'],
             "",
-            "Pattern Files (*.txt);;All Files (*)"
+            PATTERN_FILE_FILTER
         )
 
         if file_path:
             try:
-                new_live_cells = set()
-                with open(file_path, 'r') as f:
-                    for line in f:
-                        # Убираем лишние пробелы и пустые строки
-                        line = line.strip()
-                        if not line:
-                            continue
-                        # Разделяем строку "col,row" на две части
-                        parts = line.split(',')
-                        col = int(parts[0])
-                        row = int(parts[1])
-                        new_live_cells.add((col, row))
-
-                # Передаем новые клетки в виджет
-                self.grid_widget.set_live_cells(new_live_cells)
+                with self.grid_widget.profiler.time('io'):
+                    import patternio
+                    ext = os.path.splitext(file_path)[1].lower()
+                    if ext == '.mc':
+                        engine, meta = patternio.read_macrocell(file_path)
+                        self.apply_file_rule(meta['rule'], engine)
+                        self.grid_widget.replace_engine(engine)
+                        self.update_engine_actions()
+                        self.update_rule_actions()
+                        self.update_topology_actions()
+                        self.apply_file_grid(meta['rule'])
+                        return
+                    if ext == '.tiles':
+                        # В снимке тайлов нет правила: остается текущее, если движок его считает.
+                        engine = patternio.read_tiles(file_path)
+                        if self.grid_widget.engine.rule.states == 2:
+                            engine.set_rule(self.grid_widget.engine.rule)
+                        self.grid_widget.replace_engine(engine)
+                        self.update_engine_actions()
+                        self.update_rule_actions()
+                        self.update_topology_actions()
+                        return
+                    if ext == '.txt':
+                        cols, rows = patternio.read_cell_list(file_path)
+                    else:
+                        cols, rows, meta = patternio.read_rle(file_path)
+                        self.apply_file_grid(meta['rule'])
+                        self.apply_file_rule(meta['rule'])
+                    # Передаем новые клетки в виджет
+                    self.grid_widget.set_cell_arrays(cols, rows)
             except Exception as e:
                 QMessageBox.critical(self, self.t['MSG_ERROR'], f"Не удалось загрузить файл:\n{e}")
 
@@ -661,14 +1889,18 @@ class GameOfLifeWindow(QMainWindow):
         self.stop_game()
         # Передаем текущие клетки, чтобы их можно было сохранить
         current_cells = self.grid_widget.get_live_cells()
+        if self.library_win is not None:
+            # Прежнее окно закрывается (и останавливает свой поток миниатюр).
+            self.library_win.close()
         self.library_win = PatternLibraryWindow(current_cells, lang=self.lang)
         # Подключаемся к сигналу, который вернет выбранный паттерн
         self.library_win.pattern_selected.connect(self.load_pattern_from_db)
+        self.library_win.library_changed.connect(self.forget_census)
         self.library_win.show()
 
-    def load_pattern_from_db(self, cells):
+    def load_pattern_from_db(self, cols, rows):
         """Слот, который принимает клетки от окна библиотеки и загружает их."""
-        self.grid_widget.set_live_cells(cells)
+        self.grid_widget.set_cell_arrays(cols, rows)
 
     def reset_and_center_glider(self):
         self.stop_game()
@@ -677,15 +1909,26 @@ class GameOfLifeWindow(QMainWindow):
         self.grid_widget.offset_x = self.grid_widget.width() / 2
         self.grid_widget.offset_y = self.grid_widget.height() / 2
 
-        for dr, dc in self.grid_widget.glider_pattern:
-            self.grid_widget.live_cells.add((0 + dc, 0 + dr))
-        self.grid_widget.update()
+        self.grid_widget.edit_engine(self.grid_widget.engine.add_cells,
+                                     [(0 + dc, 0 + dr) for dr, dc in self.grid_widget.glider_pattern])
 
     def start_game(self):
-        self.timer.start(100)
+        self.simulation.resume()
 
     def stop_game(self):
-        self.timer.stop()
+        """Ставит симуляцию на паузу и показывает поколение, на котором она остановилась."""
+        if self.simulation.running:
+            self.simulation.pause()
+            self.grid_widget.refresh()
+
+    def set_speed(self, generations_per_second):
+        """Меняет темп симуляции; None - максимально быстро."""
+        self.simulation.set_speed(generations_per_second)
+
+    def closeEvent(self, event):
+        """Останавливает поток симуляции перед закрытием окна."""
+        self.grid_widget.shutdown()
+        super().closeEvent(event)
 
     def reset_glider(self):
         self.stop_game()
@@ -714,21 +1957,24 @@ class GameOfLifeWindow(QMainWindow):
 
 # --- Точка входа в приложение ---
 if __name__ == "__main__":
-    database.init_db()
+    # База паттернов открывается при первом обращении к библиотеке, а не здесь.
     app = QApplication(sys.argv)
 
-    # 1. Сначала показываем выбор языка
-    lang_dialog = LanguageSelectDialog()
-
-    # exec() запускает окно в модальном режиме. Возвращает True (Accepted), если нажали ОК.
-    if lang_dialog.exec():
+    # 1. Язык выбирается при первом запуске и запоминается в настройках.
+    selected_lang = saved_language()
+    if selected_lang is None:
+        lang_dialog = LanguageSelectDialog()
+        # exec() запускает окно в модальном режиме. Возвращает True (Accepted), если нажали ОК.
+        if not lang_dialog.exec():
+            # Если закрыли окно выбора языка, просто выходим
+            sys.exit(0)
         selected_lang = lang_dialog.get_lang()
+        save_language(selected_lang)
 
-        # 2. Передаем выбранный язык в главное окно
-        window = GameOfLifeWindow(lang=selected_lang)
-        window.show()
+    # 2. Передаем выбранный язык в главное окно
+    window = GameOfLifeWindow(lang=selected_lang)
+    window.show()
 
-        sys.exit(app.exec())
-    else:
-        # Если закрыли окно выбора языка, просто выходим
-        sys.exit(0)
+    exit_code = app.exec()
+    database.close()
+    sys.exit(exit_code)
@@ -0,0 +1,600 @@
+"""
+Движок Hashlife для очень длинных прогонов.
+
+Поле хранится как квадродерево. Одинаковые поддеревья канонизируются
+(в памяти существует ровно один узел для каждого содержимого), а результат
+продвижения узла во времени запоминается. Благодаря этому периодические и
+повторяющиеся структуры (ружья, бриддеры) можно продвигать на 2^k поколений
+за время, почти не зависящее от k.
+
+Корень дерева всегда центрирован в мировой точке (0, 0): узел уровня k
+покрывает клетки от -2^(k-1) до 2^(k-1) - 1 по обеим осям.
+"""
+from collections.abc import Set
+
+import numpy as np
+
+from engine import BaseEngine, Snapshot
+from spatial import density_shape
+
+
+class HashlifeMemoryError(MemoryError):
+    """Дерево не помещается в заданный лимит памяти даже после сборки мусора."""
+
+
+class Node:
+    """Узел квадродерева. Уровень 0 - одна клетка, уровень k - квадрат 2^k x 2^k."""
+    __slots__ = ('level', 'nw', 'ne', 'sw', 'se', 'population')
+
+    def __init__(self, level, nw, ne, sw, se, population):
+        self.level = level
+        self.nw = nw
+        self.ne = ne
+        self.sw = sw
+        self.se = se
+        self.population = population
+
+
+# Листья (уровень 0): живая и мертвая клетка. Общие для всех движков.
+ON = Node(0, None, None, None, None, 1)
+OFF = Node(0, None, None, None, None, 0)
+# Лист по значению бита клетки.
+_LEAVES = (OFF, ON)
+
+
+class QuadtreeIndex(Set):
+    """
+    Неизменяемое множество клеток поверх корня квадродерева. Узлы Hashlife
+    никогда не меняются, поэтому снимок - это просто ссылка на корень,
+    даже если в нем миллиарды клеток.
+    """
+
+    # Узлы этого уровня (8x8) превращаются в маски целиком и кэшируются.
+    MASK_LEVEL = 3
+
+    def __init__(self, root, mask_cache):
+        self._root = root
+        # Общий с движком кэш: узел уровня MASK_LEVEL -> маска 8x8.
+        self._mask_cache = mask_cache
+
+    def __contains__(self, cell):
+        return _node_contains(self._root, cell[0], cell[1])
+
+    def __iter__(self):
+        return _iter_node(self._root)
+
+    def __len__(self):
+        return self._root.population
+
+    def _node_mask(self, node):
+        mask = self._mask_cache.get(node)
+        if mask is None:
+            size = 1 << node.level
+            mask = np.zeros((size, size), dtype=np.uint8)
+            half = 1 << (node.level - 1)
+            for col, row in _iter_node(node, -half, -half):
+                mask[row + half, col + half] = 1
+            self._mask_cache[node] = mask
+        return mask
+
+    def region_mask(self, min_col, min_row, max_col, max_row):
+        """Маска видимой области: спускаемся только в пересекающие ее непустые узлы."""
+        mask = np.zeros((max(0, max_row - min_row), max(0, max_col - min_col)), dtype=np.uint8)
+        if mask.size == 0:
+            return mask
+        half = 1 << (self._root.level - 1)
+        stack = [(self._root, -half, -half)]
+        while stack:
+            node, x, y = stack.pop()
+            size = 1 << node.level
+            if (node.population == 0 or x >= max_col or y >= max_row or
+                    x + size <= min_col or y + size <= min_row):
+                continue
+            if node.level <= self.MASK_LEVEL:
+                bits = self._node_mask(node)
+                c0 = max(min_col - x, 0)
+                c1 = min(max_col - x, size)
+                r0 = max(min_row - y, 0)
+                r1 = min(max_row - y, size)
+                mask[y + r0 - min_row:y + r1 - min_row, x + c0 - min_col:x + c1 - min_col] = bits[r0:r1, c0:c1]
+                continue
+            h = size >> 1
+            stack.append((node.nw, x, y))
+            stack.append((node.ne, x + h, y))
+            stack.append((node.sw, x, y + h))
+            stack.append((node.se, x + h, y + h))
+        return mask
+
+    def prepare_density(self):
+        """Пирамида плотности - само дерево, готовить нечего."""
+
+    def region_density(self, min_col, min_row, max_col, max_row, block):
+        """
+        Плотность по блокам (см. spatial.DensityMixin.region_density). Населенность
+        узла хранится в нем самом, поэтому дерево - готовая пирамида плотности:
+        спускаемся только до узлов размером с блок.
+        """
+        density = np.zeros(density_shape(min_col, min_row, max_col, max_row, block), dtype=np.int64)
+        if density.size == 0:
+            return density
+        level = block.bit_length() - 1
+        half = 1 << (self._root.level - 1)
+        stack = [(self._root, -half, -half)]
+        while stack:
+            node, x, y = stack.pop()
+            size = 1 << node.level
+            if (node.population == 0 or x >= max_col or y >= max_row or
+                    x + size <= min_col or y + size <= min_row):
+                continue
+            bx, by = (x - min_col) // block, (y - min_row) // block
+            if node.level <= level and bx == (x + size - 1 - min_col) // block \
+                    and by == (y + size - 1 - min_row) // block:
+                # Узел целиком лежит в одном блоке.
+                density[by, bx] += node.population
+                continue
+            if node.level == self.MASK_LEVEL:
+                # Блоки мельче узла 8x8: суммируем его кэшированную маску.
+                n = size // block
+                counts = self._node_mask(node).reshape(n, block, n, block).sum(axis=(1, 3), dtype=np.int64)
+                r0, c0 = max(0, -by), max(0, -bx)
+                r1 = min(n, density.shape[0] - by)
+                c1 = min(n, density.shape[1] - bx)
+                density[by + r0:by + r1, bx + c0:bx + c1] += counts[r0:r1, c0:c1]
+                continue
+            h = size >> 1
+            stack.append((node.nw, x, y))
+            stack.append((node.ne, x + h, y))
+            stack.append((node.sw, x, y + h))
+            stack.append((node.se, x + h, y + h))
+        return density
+
+
+def _iter_node(node, x=None, y=None):
+    """Перебирает живые клетки узла; по умолчанию узел центрирован в (0, 0)."""
+    if x is None:
+        x = y = -(1 << (node.level - 1)) if node.level else 0
+    stack = [(node, x, y)]
+    while stack:
+        node, x, y = stack.pop()
+        if node.population == 0:
+            continue
+        if node.level == 0:
+            yield x, y
+            continue
+        h = 1 << (node.level - 1)
+        stack.append((node.nw, x, y))
+        stack.append((node.ne, x + h, y))
+        stack.append((node.sw, x, y + h))
+        stack.append((node.se, x + h, y + h))
+
+
+def _node_diff(old, new, x, y, born, died, limit):
+    """
+    Добавляет в born клетки, живые в new, но не в old, а в died - наоборот
+    (узлы одного уровня с углом в (x, y)). Одинаковые поддеревья - один и тот
+    же канонический узел, поэтому обход спускается только туда, где поле
+    изменилось. Возвращает False, если клеток в разности больше limit.
+    """
+    stack = [(old, new, x, y)]
+    while stack:
+        old, new, x, y = stack.pop()
+        if old is new:
+            continue
+        if old.population == 0 or new.population == 0:
+            if len(born) + len(died) + old.population + new.population > limit:
+                return False
+            if old.population == 0:
+                born.extend(_iter_node(new, x, y))
+            else:
+                died.extend(_iter_node(old, x, y))
+            continue
+        h = 1 << (old.level - 1)
+        stack.append((old.nw, new.nw, x, y))
+        stack.append((old.ne, new.ne, x + h, y))
+        stack.append((old.sw, new.sw, x, y + h))
+        stack.append((old.se, new.se, x + h, y + h))
+    return True
+
+
+def _node_contains(node, col, row):
+    """Проверяет клетку в узле, центрированном в (0, 0)."""
+    half = 1 << (node.level - 1)
+    if not (-half <= col < half and -half <= row < half):
+        return False
+    x, y = col + half, row + half
+    while node.level > 0:
+        if node.population == 0:
+            return False
+        h = 1 << (node.level - 1)
+        if y < h:
+            node = node.nw if x < h else node.ne
+        else:
+            node = node.sw if x < h else node.se
+        x %= h
+        y %= h
+    return node is ON
+
+
+class HashlifeEngine(BaseEngine):
+    """Движок Hashlife с ограниченным кэшем узлов."""
+
+    reports_deltas = True
+
+    # Минимальный уровень корня (поле 8x8).
+    MIN_LEVEL = 3
+    # Дельта шага с большим числом клеток не собирается (их перебор идет
+    # в Python, а прыжок Hashlife может изменить миллиарды клеток).
+    MAX_DELTA_CELLS = 1_000_000
+    # Грубая оценка памяти на один узел: сам объект, ключ и записи в словарях.
+    NODE_BYTES = 300
+
+    def __init__(self, cells=None, rule=None, max_nodes=4_000_000, memory_limit_mb=None):
+        super().__init__(rule)
+        if memory_limit_mb is not None:
+            max_nodes = memory_limit_mb * 1024 * 1024 // self.NODE_BYTES
+        # Верхняя граница числа канонических узлов; при ее превышении
+        # запускается сборка мусора (во время шага - прямо из join).
+        self.max_nodes = max_nodes
+        # Сколько раз запускалась сборка мусора (полезно для диагностики).
+        self.gc_count = 0
+        self._reset_caches()
+        # Таблица правила: блок 4x4 (16 бит) -> центр 2x2 (4 бита), списком
+        # Python - индексировать его быстрее, чем массив NumPy.
+        self._table4x4 = self.rule.table4x4.tolist()
+        self.root = self.empty_node(self.MIN_LEVEL)
+        if cells:
+            self.set_live_cells(cells)
+
+    def _reset_caches(self):
+        # (nw, ne, sw, se) -> канонический узел.
+        self._nodes = {}
+        # (узел, j) -> центр узла, продвинутый на 2^j поколений.
+        self._results = {}
+        # уровень -> пустой узел этого уровня.
+        self._empties = [OFF]
+        # узел -> ограничивающий прямоугольник относительно его угла.
+        self._bbox_cache = {}
+        # узел 8x8 -> маска для отрисовки (см. QuadtreeIndex).
+        self._mask_cache = {}
+        # Идет ли шаг, и списки узлов, которые вызовы _successor держат
+        # в работе: сборка мусора посреди шага сохраняет их вместе с корнем.
+        self._stepping = False
+        self._in_progress = []
+
+    # --- Построение узлов ---
+
+    def join(self, nw, ne, sw, se):
+        """Возвращает канонический узел с указанными четвертями."""
+        key = (nw, ne, sw, se)
+        node = self._nodes.get(key)
+        if node is None:
+            node = Node(nw.level + 1, nw, ne, sw, se,
+                        nw.population + ne.population + sw.population + se.population)
+            self._nodes[key] = node
+            if self._stepping and len(self._nodes) > self.max_nodes:
+                self._collect(extra_roots=(node,))
+        return node
+
+    def empty_node(self, level):
+        """Пустой узел указанного уровня."""
+        while len(self._empties) <= level:
+            e = self._empties[-1]
+            self._empties.append(self.join(e, e, e, e))
+        return self._empties[level]
+
+    def _centre(self, node):
+        """Узел на уровень выше, в центре которого лежит node."""
+        e = self.empty_node(node.level - 1)
+        return self.join(self.join(e, e, e, node.nw), self.join(e, e, node.ne, e),
+                         self.join(e, node.sw, e, e), self.join(node.se, e, e, e))
+
+    def _inner(self, node):
+        """Центральная часть узла (на уровень ниже)."""
+        return self.join(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+    @staticmethod
+    def _is_padded(node):
+        """Все живые клетки узла лежат в его центральной половине."""
+        return (node.nw.population == node.nw.se.population and
+                node.ne.population == node.ne.sw.population and
+                node.sw.population == node.sw.ne.population and
+                node.se.population == node.se.nw.population)
+
+    # --- Сборка мусора ---
+
+    def _collect_if_full(self):
+        """Запускает сборку мусора, если кэш перерос лимит (после правок поля)."""
+        if len(self._nodes) > self.max_nodes:
+            self._collect()
+
+    def _collect(self, extra_roots=()):
+        """
+        Освобождает кэш: оставляет только узлы, достижимые из корня, из
+        extra_roots и из узлов, над которыми сейчас работает шаг, и
+        результаты, у которых и узел, и результат уцелели (так шаг, прерванный
+        сборкой, не считает заново уже пройденные подузлы). Если живое дерево
+        само по себе не влезает в лимит, бросает HashlifeMemoryError.
+        """
+        self.gc_count += 1
+        self._bbox_cache.clear()
+        # Новый словарь, а не clear(): старый может читать поток отрисовки.
+        self._mask_cache = {}
+        kept = {}
+        stack = [self.root, *extra_roots, *self._empties[1:]]
+        for held in self._in_progress:
+            stack.extend(held)
+        while stack:
+            node = stack.pop()
+            if node.level == 0:
+                continue
+            key = (node.nw, node.ne, node.sw, node.se)
+            if key in kept:
+                continue
+            kept[key] = node
+            stack.extend(key)
+        self._nodes = kept
+        alive = set(kept.values())
+        self._results = {key: result for key, result in self._results.items()
+                         if key[0] in alive and result in alive}
+        if len(kept) > self.max_nodes * 0.8:
+            raise HashlifeMemoryError(
+                f"Дерево из {len(kept)} узлов не помещается в лимит {self.max_nodes}")
+
+    @property
+    def node_count(self):
+        """Текущее число канонических узлов в кэше."""
+        return len(self._nodes)
+
+    # --- Вычисление поколений ---
+
+    def _rule_changed(self):
+        # Запомненные результаты посчитаны по старому правилу.
+        self._results.clear()
+        self._table4x4 = self.rule.table4x4.tolist()
+
+    def _life_4x4(self, node):
+        """Базовый случай: центр 2x2 узла 4x4 через одно поколение - по таблице правила."""
+        nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+        # Бит 4*y + x - клетка (x, y) блока 4x4 (см. rules.Rule.table4x4).
+        index = (nw.nw.population | nw.ne.population << 1 | ne.nw.population << 2 | ne.ne.population << 3 |
+                 nw.sw.population << 4 | nw.se.population << 5 | ne.sw.population << 6 | ne.se.population << 7 |
+                 sw.nw.population << 8 | sw.ne.population << 9 | se.nw.population << 10 | se.ne.population << 11 |
+                 sw.sw.population << 12 | sw.se.population << 13 | se.sw.population << 14 |
+                 se.se.population << 15)
+        centre = self._table4x4[index]
+        return self.join(_LEAVES[centre & 1], _LEAVES[centre >> 1 & 1],
+                         _LEAVES[centre >> 2 & 1], _LEAVES[centre >> 3 & 1])
+
+    def _successor(self, node, j):
+        """
+        Центр узла уровня k (уровень k-1), продвинутый на 2^j поколений.
+        Требует j <= k - 2.
+        """
+        if node.population == 0:
+            return node.nw
+        key = (node, j)
+        result = self._results.get(key)
+        if result is not None:
+            return result
+
+        if node.level == 2:
+            result = self._life_4x4(node)
+        else:
+            join = self.join
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            # held - узлы этого вызова, которые должны пережить сборку мусора
+            # посреди шага: сам узел, подузлы и уже посчитанные центры.
+            held = [node]
+            self._in_progress.append(held)
+            # Девять перекрывающихся подузлов уровня k-1.
+            held += (nw, join(nw.ne, ne.nw, nw.se, ne.sw), ne,
+                     join(nw.sw, nw.se, sw.nw, sw.ne), join(nw.se, ne.sw, sw.ne, se.nw), join(ne.sw, ne.se, se.nw, se.ne),
+                     sw, join(sw.ne, se.nw, sw.se, se.sw), se)
+            if j < node.level - 2:
+                # Продвигаем каждый подузел на 2^j и берем центры.
+                for n in held[1:10]:
+                    held.append(self._successor(n, j))
+                c = held[10:]
+                result = join(join(c[0].se, c[1].sw, c[3].ne, c[4].nw),
+                              join(c[1].se, c[2].sw, c[4].ne, c[5].nw),
+                              join(c[3].se, c[4].sw, c[6].ne, c[7].nw),
+                              join(c[4].se, c[5].sw, c[7].ne, c[8].nw))
+            else:
+                # Полная скорость: два полушага по 2^(k-3) поколений.
+                jj = node.level - 3
+                for n in held[1:10]:
+                    held.append(self._successor(n, jj))
+                c = held[10:]
+                held += (join(c[0], c[1], c[3], c[4]), join(c[1], c[2], c[4], c[5]),
+                         join(c[3], c[4], c[6], c[7]), join(c[4], c[5], c[7], c[8]))
+                for n in held[19:23]:
+                    held.append(self._successor(n, jj))
+                result = join(*held[23:27])
+            self._in_progress.pop()
+        self._results[key] = result
+        return result
+
+    def _shrink_root(self):
+        """Убирает лишние пустые уровни вокруг живой области."""
+        while self.root.level > self.MIN_LEVEL and self._is_padded(self.root):
+            self.root = self._inner(self.root)
+
+    def advance_pow2(self, k):
+        """Продвигает поле ровно на 2^k поколений одним запоминаемым шагом."""
+        root = old_root = self.root
+        # Корень должен быть достаточно велик и иметь пустую рамку, чтобы
+        # за 2^k поколений (скорость света - клетка за поколение) живая
+        # область не вышла за пределы результата.
+        # Пока идет шаг, join сам запускает сборку мусора при переполнении
+        # кэша; расширенный корень держится в работе вместе с узлами _successor.
+        self._stepping = True
+        held = [root]
+        self._in_progress.append(held)
+        try:
+            while root.level < k + 2 or not self._is_padded(root):
+                root = self._centre(root)
+                held.append(root)
+            root = self._centre(root)
+            held.append(root)
+            root = self._successor(root, k)
+        finally:
+            self._stepping = False
+            self._in_progress.clear()
+        self.root = root
+        self.generation += 1 << k
+        self._shrink_root()
+        if self.track_deltas:
+            self._record_root_delta(old_root)
+
+    def _record_root_delta(self, old_root):
+        """Запоминает дельту шага: разность деревьев old_root и текущего корня."""
+        old, new = old_root, self.root
+        while old.level < new.level:
+            old = self._centre(old)
+        while new.level < old.level:
+            new = self._centre(new)
+        half = 1 << (new.level - 1)
+        born, died = [], []
+        if not _node_diff(old, new, -half, -half, born, died, self.MAX_DELTA_CELLS):
+            self._lose_delta()
+            return
+        born = np.array(born, dtype=np.int64).reshape(-1, 2)
+        died = np.array(died, dtype=np.int64).reshape(-1, 2)
+        self._record_delta(born[:, 0], born[:, 1], died[:, 0], died[:, 1])
+
+    def step(self, n=1):
+        """Продвигает симуляцию ровно на n поколений (по степеням двойки)."""
+        j = 0
+        while n:
+            if n & 1:
+                self.advance_pow2(j)
+            n >>= 1
+            j += 1
+
+    def _step_once(self):
+        self.advance_pow2(0)
+
+    # --- Состояние поля ---
+
+    @property
+    def population(self):
+        """Количество живых клеток."""
+        return self.root.population
+
+    @property
+    def bounding_box(self):
+        """
+        Возвращает ограничивающий прямоугольник живых клеток
+        в виде (min_col, min_row, max_col, max_row) или None для пустого поля.
+        """
+        if self.root.population == 0:
+            return None
+        half = 1 << (self.root.level - 1)
+        x0, y0, x1, y1 = self._node_bbox(self.root)
+        return x0 - half, y0 - half, x1 - half, y1 - half
+
+    def _node_bbox(self, node):
+        """Прямоугольник живых клеток непустого узла относительно его угла."""
+        if node.level == 0:
+            return 0, 0, 0, 0
+        box = self._bbox_cache.get(node)
+        if box is not None:
+            return box
+        half = 1 << (node.level - 1)
+        boxes = []
+        for quad, dx, dy in ((node.nw, 0, 0), (node.ne, half, 0), (node.sw, 0, half), (node.se, half, half)):
+            if quad.population:
+                x0, y0, x1, y1 = self._node_bbox(quad)
+                boxes.append((x0 + dx, y0 + dy, x1 + dx, y1 + dy))
+        box = (min(b[0] for b in boxes), min(b[1] for b in boxes),
+               max(b[2] for b in boxes), max(b[3] for b in boxes))
+        self._bbox_cache[node] = box
+        return box
+
+    def snapshot(self):
+        """Снимок - ссылка на неизменяемый корень, без перебора клеток."""
+        return Snapshot(self.generation, self.root.population, self.bounding_box,
+                        QuadtreeIndex(self.root, self._mask_cache))
+
+    def iter_cells(self):
+        """Перебирает координаты всех живых клеток."""
+        return _iter_node(self.root)
+
+    def is_alive(self, cell):
+        """Проверяет, жива ли клетка (колонка, ряд)."""
+        return _node_contains(self.root, cell[0], cell[1])
+
+    def _contains(self, col, row):
+        half = 1 << (self.root.level - 1)
+        return -half <= col < half and -half <= row < half
+
+    def set_cell(self, cell, alive):
+        """Делает клетку живой или мертвой."""
+        col, row = cell
+        while not self._contains(col, row):
+            self.root = self._centre(self.root)
+        half = 1 << (self.root.level - 1)
+        self.root = self._set(self.root, col + half, row + half, ON if alive else OFF)
+        self._collect_if_full()
+
+    def _set(self, node, x, y, leaf):
+        """Копия узла, в которой клетка (x, y) заменена листом leaf."""
+        if node.level == 0:
+            return leaf
+        h = 1 << (node.level - 1)
+        nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+        if y < h:
+            if x < h:
+                nw = self._set(nw, x, y, leaf)
+            else:
+                ne = self._set(ne, x - h, y, leaf)
+        else:
+            if x < h:
+                sw = self._set(sw, x, y - h, leaf)
+            else:
+                se = self._set(se, x - h, y - h, leaf)
+        return self.join(nw, ne, sw, se)
+
+    def set_live_cells(self, cells):
+        """Заменяет состояние поля новым набором клеток."""
+        cells = list(cells)
+        level = self.MIN_LEVEL
+        if cells:
+            extent = max(max(-col, col + 1, -row, row + 1) for col, row in cells)
+            while (1 << (level - 1)) < extent:
+                level += 1
+        half = 1 << (level - 1)
+        # Строим дерево снизу вверх: на каждом уровне группируем узлы по четверкам.
+        nodes = {(col + half, row + half): ON for col, row in cells}
+        for lvl in range(1, level + 1):
+            e = self.empty_node(lvl - 1)
+            groups = {}
+            for (x, y), node in nodes.items():
+                quads = groups.get((x >> 1, y >> 1))
+                if quads is None:
+                    quads = groups[(x >> 1, y >> 1)] = [e, e, e, e]
+                quads[(x & 1) + 2 * (y & 1)] = node
+            nodes = {key: self.join(*quads) for key, quads in groups.items()}
+        self.root = nodes.get((0, 0), self.empty_node(level))
+        self._collect_if_full()
+
+    def set_root(self, root):
+        """
+        Делает корнем готовый узел этого движка (например, загруженный из
+        Macrocell). Узел ложится центром в точку (0, 0).
+        """
+        while root.level < self.MIN_LEVEL:
+            root = self._centre(root)
+        self.root = root
+        self._shrink_root()
+        self._collect_if_full()
+
+    def iter_node(self, node):
+        """Перебирает живые клетки узла, центрированного в (0, 0)."""
+        return _iter_node(node)
+
+    def clear(self):
+        """Полностью очищает поле и сбрасывает счетчик поколений."""
+        self.generation = 0
+        self._reset_caches()
+        self.root = self.empty_node(self.MIN_LEVEL)
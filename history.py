@@ -0,0 +1,281 @@
+"""
+История поколений: шаг назад, переход к поколению N и прокрутка.
+
+История хранит два вида записей:
+  - контрольные точки - полное состояние поля (после правок и прыжков, а
+    при прогоне - когда с прошлой точки прошло не меньше CHECKPOINT_INTERVAL
+    поколений и переключилось не меньше клеток, чем их живо сейчас, но
+    не реже чем раз в MAX_CHECKPOINT_GAP поколений);
+  - дельты - клетки, которые переключились (родились или умерли) при
+    переходе от поколения g - 1 к g. Дельта одна и та же в обе стороны,
+    поэтому хранится одним списком. Ее берут у движка (BaseEngine.take_delta),
+    поэтому запись шага стоит столько, сколько клеток переключилось, а не
+    сколько их на поле; полная разность поколений считается только для
+    движков, которые дельт не сообщают.
+Полное состояние поля крупнее MAX_FULL_POPULATION клеток не собирается:
+если без него не обойтись (правка, прыжок, движок без дельт), история
+приостанавливается (History.paused) до записи, для которой оно снова влезет.
+Записи сжимаются форматом cellutils.encode_cells. Переход к поколению N -
+это восстановление ближайшей контрольной точки не позже N и применение
+нескольких дельт после нее, а не прогон с нулевого поколения.
+
+Записи в памяти образуют кольцевой буфер ограниченного объема: самые старые
+при переполнении выгружаются во временный файл на диске (или отбрасываются,
+если выгрузка выключена). Модуль не зависит от Qt.
+"""
+import bisect
+import tempfile
+import threading
+from collections import deque
+
+import numpy as np
+
+from cellutils import decode_cells, encode_cells
+
+# Наименьшее и наибольшее число поколений между контрольными точками при
+# прогоне. Между ними точка ставится, только когда дельты после прошлой
+# точки в сумме не меньше поля: до этого применить их при переходе дешевле,
+# чем хранить и читать еще одну точку, а на спокойном поле точка (полный
+# перебор клеток) не снимается каждые несколько поколений.
+CHECKPOINT_INTERVAL = 32
+MAX_CHECKPOINT_GAP = 1024
+# Объем записей в памяти, после которого старые выгружаются на диск.
+MAX_MEMORY_BYTES = 64 * 1024 * 1024
+# Поля крупнее этого история не перебирает целиком: массивы клеток не
+# поместились бы в память. Дельты от движка записываются при любом населении.
+MAX_FULL_POPULATION = 10_000_000
+
+
+def _pack(cols, rows):
+    """
+    Отсортированные ключи клеток одним int64 (порядок - по рядам). Движки
+    не выдают повторов, а у движков на массивах ключи уже почти упорядочены.
+    """
+    return np.sort((rows << 32) + (cols + (1 << 31)))
+
+
+def _unpack(keys):
+    return (keys & 0xFFFFFFFF) - (1 << 31), keys >> 32
+
+
+class History:
+    """
+    История состояний одного поля. record вызывается после каждого шага
+    и каждой правки, restore возвращает состояние записанного поколения.
+    Все методы потокобезопасны.
+    """
+
+    def __init__(self, interval=CHECKPOINT_INTERVAL, max_memory=MAX_MEMORY_BYTES, max_gap=MAX_CHECKPOINT_GAP,
+                 max_full_population=MAX_FULL_POPULATION, spill=True):
+        self.interval = interval
+        self.max_memory = max_memory
+        self.max_gap = max_gap
+        self.max_full_population = max_full_population
+        self.spill = spill
+        self._lock = threading.Lock()
+        self._spill_file = None
+        self._reset()
+
+    def _reset(self):
+        # Поколение -> запись: bytes в памяти или (смещение, длина) на диске.
+        # Словари упорядочены по возрастанию поколения.
+        self._checkpoints = {}
+        self._deltas = {}
+        # Поколения контрольных точек по возрастанию (для bisect).
+        self._checkpoint_gens = []
+        # Записи в памяти от старых к новым: (поколение, контрольная ли точка).
+        self._memory = deque()
+        self._memory_bytes = 0
+        # Последнее записанное или восстановленное поколение и его ключи
+        # (None, если оно записано дельтой от движка и ключи не собирались):
+        # от него считается дельта следующего поколения.
+        self._last_gen = None
+        self._last_keys = None
+        # Сколько клеток переключили дельты после последней контрольной точки.
+        self._toggled = 0
+        # Население поля, из-за которого история приостановлена, или None.
+        self.paused = None
+
+    # --- Границы ---
+
+    @property
+    def first(self):
+        """Самое раннее доступное поколение (None, если история пуста)."""
+        with self._lock:
+            return self._checkpoint_gens[0] if self._checkpoint_gens else None
+
+    @property
+    def last(self):
+        """Самое позднее записанное поколение (None, если история пуста)."""
+        with self._lock:
+            return self._latest()
+
+    def _latest(self):
+        latest = [next(reversed(d)) for d in (self._checkpoints, self._deltas) if d]
+        return max(latest) if latest else None
+
+    @property
+    def memory_bytes(self):
+        """Объем записей, которые сейчас хранятся в памяти."""
+        return self._memory_bytes
+
+    # --- Запись ---
+
+    def record(self, engine, delta=None):
+        """
+        Запоминает текущее состояние движка. Следующее поколение после
+        записанного сохраняется дельтой, все остальное (правка поля, прыжок
+        на много поколений, первая запись) - контрольной точкой; записи
+        позже нее (прежнее "будущее") отбрасываются. delta - результат
+        engine.take_delta(), если вызывающий уже забрал его (поток симуляции
+        делит его с поиском циклов); иначе история забирает его сама.
+        """
+        if delta is None:
+            delta = engine.take_delta()
+        generation = engine.generation
+        with self._lock:
+            last_gen, last_keys = self._last_gen, self._last_keys
+            if last_gen is not None and generation == last_gen + 1 and delta is not None:
+                born_cols, born_rows, died_cols, died_rows = delta
+                self._record_delta(engine, generation, _pack(np.concatenate([born_cols, died_cols]),
+                                                             np.concatenate([born_rows, died_rows])))
+                return
+        if engine.population > self.max_full_population:
+            with self._lock:
+                # Разрыв: следующая запись начнется с контрольной точки.
+                self._last_gen = self._last_keys = None
+                self.paused = engine.population
+            return
+        self.paused = None
+        keys = _pack(*engine.cell_arrays())
+        with self._lock:
+            if last_gen is not None and generation == last_gen and np.array_equal(keys, last_keys):
+                return
+            if last_gen is not None and generation == last_gen + 1 and last_keys is not None:
+                self._record_delta(engine, generation, np.setxor1d(last_keys, keys, assume_unique=True), keys)
+            else:
+                self._truncate(generation - 1)
+                self._checkpoint(generation, keys)
+                self._last_gen, self._last_keys = generation, keys
+                self._evict()
+
+    def _record_delta(self, engine, generation, delta, keys=None):
+        """Записывает дельту поколения generation и, если пора, контрольную точку."""
+        self._truncate(generation - 1)
+        self._store(self._deltas, generation, delta, False)
+        self._toggled += delta.size
+        since = generation - self._checkpoint_gens[-1]
+        due = since >= self.max_gap or (since >= self.interval and self._toggled >= engine.population)
+        # Поле крупнее max_full_population записывается одними дельтами, без точек.
+        if due and (keys is not None or engine.population <= self.max_full_population):
+            if keys is None:
+                keys = _pack(*engine.cell_arrays())
+            self._checkpoint(generation, keys)
+        self._last_gen, self._last_keys = generation, keys
+        self._evict()
+
+    def _checkpoint(self, generation, keys):
+        self._store(self._checkpoints, generation, keys, True)
+        self._checkpoint_gens.append(generation)
+        self._toggled = 0
+
+    def _store(self, records, generation, keys, is_checkpoint):
+        data = encode_cells(_unpack(keys))
+        records[generation] = data
+        self._memory.append((generation, is_checkpoint))
+        self._memory_bytes += len(data)
+
+    def _truncate(self, generation):
+        """Удаляет все записи позже generation."""
+        while self._memory and self._memory[-1][0] > generation:
+            self._forget(*self._memory.pop())
+        while self._checkpoint_gens and self._checkpoint_gens[-1] > generation:
+            del self._checkpoints[self._checkpoint_gens.pop()]
+        while self._deltas and next(reversed(self._deltas)) > generation:
+            self._deltas.popitem()
+
+    def _forget(self, generation, is_checkpoint):
+        """Вычитает запись, покидающую память, из ее объема."""
+        records = self._checkpoints if is_checkpoint else self._deltas
+        self._memory_bytes -= len(records[generation])
+        return records
+
+    def _evict(self):
+        """Выгружает на диск или отбрасывает старые записи сверх лимита памяти."""
+        while self._memory_bytes > self.max_memory and len(self._memory) > 1:
+            if self.spill:
+                generation, is_checkpoint = self._memory.popleft()
+                data = self._record(generation, is_checkpoint)
+                self._forget(generation, is_checkpoint)[generation] = self._write_spill(data)
+            elif len(self._checkpoint_gens) > 1:
+                self._drop_oldest_segment()
+            else:
+                break
+
+    def _record(self, generation, is_checkpoint):
+        return (self._checkpoints if is_checkpoint else self._deltas)[generation]
+
+    def _drop_oldest_segment(self):
+        """Отбрасывает записи до второй контрольной точки: она становится первой."""
+        start = self._checkpoint_gens[1]
+        # Дельта самой второй точки тоже не нужна: раньше нее ничего не останется.
+        while self._memory and (self._memory[0][0] < start or
+                                (self._memory[0][0] == start and not self._memory[0][1])):
+            self._forget(*self._memory.popleft())
+        del self._checkpoints[self._checkpoint_gens.pop(0)]
+        for generation in [g for g in self._deltas if g <= start]:
+            del self._deltas[generation]
+
+    def _write_spill(self, data):
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(prefix='life-history-')
+        f = self._spill_file
+        offset = f.seek(0, 2)
+        f.write(data)
+        return offset, len(data)
+
+    def _load(self, record):
+        if isinstance(record, tuple):
+            offset, length = record
+            self._spill_file.seek(offset)
+            record = self._spill_file.read(length)
+        return _pack(*decode_cells(record))
+
+    # --- Переход ---
+
+    def restore(self, generation):
+        """
+        Состояние ближайшего к generation записанного поколения не позже
+        него: (поколение, колонки, ряды) или None, если такого нет. Дальше
+        история продолжается от восстановленного поколения.
+        """
+        with self._lock:
+            i = bisect.bisect_right(self._checkpoint_gens, generation) - 1
+            if i < 0:
+                return None
+            current = self._checkpoint_gens[i]
+            keys = self._load(self._checkpoints[current])
+            toggles = []
+            while current < generation and current + 1 in self._deltas:
+                current += 1
+                toggles.append(self._load(self._deltas[current]))
+            if toggles:
+                # Клетка, переключенная четное число раз, не изменилась.
+                values, counts = np.unique(np.concatenate(toggles), return_counts=True)
+                keys = np.setxor1d(keys, values[counts % 2 == 1], assume_unique=True)
+            self._last_gen, self._last_keys = current, keys
+            self._toggled = sum(delta.size for delta in toggles)
+            cols, rows = _unpack(keys)
+            return current, cols, rows
+
+    def clear(self):
+        """Забывает всю историю."""
+        with self._lock:
+            self._reset()
+            self.close_spill()
+
+    def close_spill(self):
+        """Закрывает (и тем самым удаляет) файл выгрузки."""
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
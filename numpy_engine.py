@@ -0,0 +1,348 @@
+"""
+Векторизованный движок на NumPy для плотных полей.
+
+Живая область хранится как массив uint8 (1 - живая клетка, 0 - мертвая,
+у правил Generations 2..C-1 - умирающая), а соседи считаются сложением
+восьми сдвинутых срезов массива. Так на каждое поколение не создается ни
+одного кортежа Python.
+
+Правило (rules.Rule) компилируется в несколько сравнений массива чисел
+соседей с отрезками подряд идущих чисел из таблицы правила. Для B3/S23
+это два сравнения, записанные прямо в результат, без временных массивов.
+"""
+import numpy as np
+
+from engine import CHANGE_BLOCK, BaseEngine, Snapshot
+from rules import LIFE
+from spatial import ArrayIndex
+
+
+def _count_runs(numbers):
+    """Отрезки [a, b] подряд идущих чисел из множества numbers."""
+    runs = []
+    for n in sorted(numbers):
+        if runs and runs[-1][1] == n - 1:
+            runs[-1][1] = n
+        else:
+            runs.append([n, n])
+    return runs
+
+
+def counts_in(counts, numbers, out=None, buffers=None):
+    """
+    Маска bool: число соседей counts входит в множество numbers. buffers
+    (StepBuffers) - рабочие массивы для сравнений из нескольких отрезков.
+    """
+    if out is None:
+        out = np.empty(counts.shape, dtype=bool)
+    runs = _count_runs(numbers)
+    if not runs:
+        out[...] = False
+        return out
+    for i, (a, b) in enumerate(runs):
+        if i == 0:
+            target = out
+        else:
+            target = np.empty_like(out) if buffers is None else buffers.run
+        if a == b:
+            np.equal(counts, a, out=target)
+        elif b == 8:
+            np.greater_equal(counts, a, out=target)
+        elif a == 0:
+            np.less_equal(counts, b, out=target)
+        else:
+            # a <= counts <= b одним сравнением: разность uint8 переполняется для counts < a.
+            shifted = np.subtract(counts, np.uint8(a), out=None if buffers is None else buffers.shifted)
+            np.less_equal(shifted, b - a, out=target)
+        if i:
+            out |= target
+    return out
+
+
+class StepBuffers:
+    """
+    Рабочие массивы step_rows для полосы формы shape. Если выделить их
+    заранее и передавать в каждый шаг, шаг не выделяет память вовсе.
+    """
+
+    def __init__(self, shape):
+        self.counts = np.empty(shape, dtype=np.uint8)
+        self.shifted = np.empty(shape, dtype=np.uint8)
+        self.born = np.empty(shape, dtype=bool)
+        self.mask = np.empty(shape, dtype=bool)
+        self.run = np.empty(shape, dtype=bool)
+
+
+def step_rows(grid, out, r0, r1, rule=LIFE, alive=None, buffers=None):
+    """
+    Записывает в out[r0:r1, 1:-1] следующее поколение рядов r0..r1-1 массива grid.
+    Читаются только ряды r0-1..r1 (полоса плюс по ряду сверху и снизу), поэтому
+    непересекающиеся полосы можно считать независимо и параллельно. alive -
+    маска живых клеток (0/1) для правил Generations; у двух состояний это сам grid.
+    buffers - StepBuffers формы полосы; без них рабочие массивы создаются заново.
+    """
+    g = (grid if alive is None else alive)[r0 - 1:r1 + 1]
+    inner = out[r0:r1, 1:-1]
+    if buffers is None:
+        buffers = StepBuffers(inner.shape)
+    # Сумма восьми сдвинутых срезов = число соседей для внутренних клеток.
+    counts = np.add(g[:-2, :-2], g[:-2, 1:-1], out=buffers.counts)
+    counts += g[:-2, 2:]
+    counts += g[1:-1, :-2]
+    counts += g[1:-1, 2:]
+    counts += g[2:, :-2]
+    counts += g[2:, 1:-1]
+    counts += g[2:, 2:]
+
+    centre = g[1:-1, 1:-1].view(bool)
+    always, if_alive, if_dead = rule.count_groups()
+    # Будущие живые клетки: у двух состояний пишутся прямо в результат.
+    born = inner.view(bool) if rule.states == 2 else buffers.born
+    counts_in(counts, always, out=born, buffers=buffers)
+    mask = buffers.mask
+    if if_alive:
+        counts_in(counts, if_alive, out=mask, buffers=buffers)
+        mask &= centre
+        born |= mask
+    if if_dead:
+        counts_in(counts, if_dead, out=mask, buffers=buffers)
+        np.greater(mask, centre, out=mask)
+        born |= mask
+    if rule.states == 2:
+        return
+
+    # Generations: умирающие клетки не рождаются и не выживают, а стареют;
+    # живая клетка, которая не выжила, становится умирающей (состояние 2).
+    state = grid[r0:r1, 1:-1]
+    born &= np.less_equal(state, 1, out=mask)
+    np.add(state, 1, out=inner)
+    if rule.states < 256:
+        np.copyto(inner, 0, where=np.equal(inner, rule.states, out=mask))
+    np.copyto(inner, 0, where=np.equal(state, 0, out=mask))
+    np.copyto(inner, 1, where=born)
+
+
+def changed_blocks(changed, origin_col, origin_row, block=CHANGE_BLOCK):
+    """
+    Ключи (bx, by) блоков block x block мировой сетки, в которых маска changed
+    (ее элемент [0, 0] - клетка (origin_col, origin_row)) содержит истину.
+    """
+    top, left = origin_row % block, origin_col % block
+    height, width = changed.shape
+    padded = np.zeros((-(-(height + top) // block) * block, -(-(width + left) // block) * block), dtype=bool)
+    padded[top:top + height, left:left + width] = changed
+    by, bx = np.nonzero(padded.reshape(padded.shape[0] // block, block, -1, block).any(axis=(1, 3)))
+    return zip((bx + (origin_col - left) // block).tolist(), (by + (origin_row - top) // block).tolist())
+
+
+class NumpyEngine(BaseEngine):
+    """Движок на плотном массиве, который автоматически растет вслед за клетками."""
+
+    reports_changes = True
+    reports_deltas = True
+    supports_generations = True
+
+    # Сколько пустых клеток держать вокруг живой области при расширении массива.
+    GROW_PADDING = 16
+
+    def __init__(self, cells=None, rule=None):
+        super().__init__(rule)
+        # grid[r, c] соответствует мировой клетке (origin_col + c, origin_row + r).
+        self.grid = np.zeros((0, 0), dtype=np.uint8)
+        self.origin_col = 0
+        self.origin_row = 0
+        # Рабочие массивы step_rows (StepBuffers); пересоздаются, только когда массив меняет форму.
+        self._buffers = None
+        if cells:
+            self.set_live_cells(cells)
+
+    # --- Состояние поля ---
+
+    def _alive(self):
+        """Маска живых клеток: сам массив или, у правил Generations, состояние 1."""
+        return self.grid if self.rule.states == 2 else (self.grid == 1).view(np.uint8)
+
+    @property
+    def population(self):
+        """Количество живых клеток."""
+        return int(np.count_nonzero(self._alive()))
+
+    @property
+    def bounding_box(self):
+        """
+        Возвращает ограничивающий прямоугольник живых клеток
+        в виде (min_col, min_row, max_col, max_row) или None для пустого поля.
+        """
+        return self._box(self._alive())
+
+    def _box(self, grid):
+        """Прямоугольник ненулевых клеток массива grid (формы self.grid) или None."""
+        rows = np.flatnonzero(grid.any(axis=1))
+        if rows.size == 0:
+            return None
+        cols = np.flatnonzero(grid.any(axis=0))
+        return (self.origin_col + int(cols[0]), self.origin_row + int(rows[0]),
+                self.origin_col + int(cols[-1]), self.origin_row + int(rows[-1]))
+
+    def snapshot(self):
+        """Снимок поверх копии массива: без перебора клеток в Python."""
+        cells = ArrayIndex(self.grid.copy(), self.origin_col, self.origin_row, self.rule.states > 2)
+        return Snapshot(self.generation, len(cells), self.bounding_box, cells)
+
+    def iter_cells(self):
+        """Перебирает координаты всех живых клеток."""
+        rows, cols = np.nonzero(self._alive())
+        return zip((cols + self.origin_col).tolist(), (rows + self.origin_row).tolist())
+
+    def cell_arrays(self):
+        """Живые клетки в виде массивов (колонки, ряды)."""
+        rows, cols = np.nonzero(self._alive())
+        return cols + self.origin_col, rows + self.origin_row
+
+    def set_live_cells(self, cells):
+        """Заменяет состояние поля новым набором клеток."""
+        cells = np.array(list(cells), dtype=np.int64).reshape(-1, 2)
+        self.set_cell_arrays(cells[:, 0], cells[:, 1])
+
+    def set_cell_arrays(self, cols, rows):
+        """Заменяет состояние поля клетками из массивов (колонки, ряды)."""
+        if cols.size == 0:
+            self.grid = np.zeros((0, 0), dtype=np.uint8)
+            return
+        pad = self.GROW_PADDING
+        self.origin_col = int(cols.min()) - pad
+        self.origin_row = int(rows.min()) - pad
+        self.grid = np.zeros((int(rows.max()) - self.origin_row + 1 + pad,
+                              int(cols.max()) - self.origin_col + 1 + pad), dtype=np.uint8)
+        self.grid[rows - self.origin_row, cols - self.origin_col] = 1
+
+    def is_alive(self, cell):
+        """Проверяет, жива ли клетка (колонка, ряд)."""
+        r = cell[1] - self.origin_row
+        c = cell[0] - self.origin_col
+        height, width = self.grid.shape
+        return 0 <= r < height and 0 <= c < width and self.grid[r, c] == 1
+
+    def set_cell(self, cell, alive):
+        """Делает клетку живой или мертвой."""
+        if not alive and not self.is_alive(cell):
+            return
+        self._include(cell[0], cell[1])
+        self.grid[cell[1] - self.origin_row, cell[0] - self.origin_col] = 1 if alive else 0
+
+    def clear(self):
+        """Полностью очищает поле и сбрасывает счетчик поколений."""
+        self.grid = np.zeros((0, 0), dtype=np.uint8)
+        self.generation = 0
+
+    # --- Управление размером массива ---
+
+    def _include(self, col, row):
+        """Расширяет массив так, чтобы клетка (col, row) оказалась внутри с запасом."""
+        height, width = self.grid.shape
+        if height == 0:
+            pad = self.GROW_PADDING
+            self.origin_col = col - pad
+            self.origin_row = row - pad
+            self.grid = np.zeros((2 * pad + 1, 2 * pad + 1), dtype=np.uint8)
+            return
+        r = row - self.origin_row
+        c = col - self.origin_col
+        pad = self.GROW_PADDING
+        self._grow(top=pad - r if r < 2 else 0,
+                   bottom=r - height + 1 + pad if r >= height - 2 else 0,
+                   left=pad - c if c < 2 else 0,
+                   right=c - width + 1 + pad if c >= width - 2 else 0)
+
+    def _grow(self, top, bottom, left, right):
+        """Дополняет массив пустыми клетками с указанных сторон."""
+        if not (top or bottom or left or right):
+            return
+        self.grid = np.pad(self.grid, ((top, bottom), (left, right)))
+        self.origin_col -= left
+        self.origin_row -= top
+
+    def _ensure_margin(self):
+        """
+        Гарантирует две пустые строки и колонки у каждого края массива.
+        Тогда новые клетки могут родиться только внутри массива и краевые
+        клетки при подсчете соседей можно не рассматривать.
+        """
+        grid = self.grid
+        height, width = grid.shape
+        if height < 5 or width < 5:
+            self._grow(2, 2, 2, 2)
+            return
+        # Растим массив пропорционально размеру, чтобы при движении
+        # паттерна перевыделение происходило редко.
+        pad_rows = max(self.GROW_PADDING, height // 4)
+        pad_cols = max(self.GROW_PADDING, width // 4)
+        self._grow(top=pad_rows if grid[:2].any() else 0,
+                   bottom=pad_rows if grid[-2:].any() else 0,
+                   left=pad_cols if grid[:, :2].any() else 0,
+                   right=pad_cols if grid[:, -2:].any() else 0)
+
+    def _shrink(self):
+        """Обрезает массив до живой области с запасом, если он стал слишком разреженным."""
+        # Умирающие клетки Generations тоже сохраняются: они не дают родиться соседям.
+        box = self._box(self.grid)
+        if box is None:
+            self.grid = np.zeros((0, 0), dtype=np.uint8)
+            return
+        min_col, min_row, max_col, max_row = box
+        pad = self.GROW_PADDING
+        height, width = self.grid.shape
+        if (max_row - min_row + 1 + 2 * pad) * 4 > height and (max_col - min_col + 1 + 2 * pad) * 4 > width:
+            return
+        r0 = max(min_row - self.origin_row - pad, 0)
+        c0 = max(min_col - self.origin_col - pad, 0)
+        r1 = min(max_row - self.origin_row + pad + 1, height)
+        c1 = min(max_col - self.origin_col + pad + 1, width)
+        self.grid = self.grid[r0:r1, c0:c1].copy()
+        self.origin_row += r0
+        self.origin_col += c0
+
+    # --- Симуляция ---
+
+    def _step_once(self):
+        if self.grid.size == 0:
+            return
+        self._ensure_margin()
+        new_grid = np.zeros_like(self.grid)
+        height, width = self.grid.shape
+        step_rows(self.grid, new_grid, 1, height - 1, self.rule, self._generations_alive(),
+                  self._step_buffers((height - 2, width - 2)))
+        self._finish_step(new_grid)
+
+    def _step_buffers(self, shape):
+        """StepBuffers формы shape: прежние, если форма массива не менялась."""
+        if self._buffers is None or self._buffers.counts.shape != shape:
+            self._buffers = StepBuffers(shape)
+        return self._buffers
+
+    def _generations_alive(self):
+        """Маска живых клеток для step_rows у правил Generations, иначе None."""
+        return None if self.rule.states == 2 else self._alive()
+
+    def _rule_changed(self):
+        # Состояния, которых нет в новом правиле, становятся мертвыми клетками.
+        self.grid[self.grid >= self.rule.states] = 0
+
+    def _finish_step(self, new_grid):
+        """Делает new_grid (той же формы и с тем же началом) текущим поколением."""
+        if self.track_changes:
+            self._changes.update(changed_blocks(new_grid != self.grid, self.origin_col, self.origin_row))
+        if self.track_deltas:
+            if self.rule.states == 2:
+                born, died = new_grid > self.grid, new_grid < self.grid
+            else:
+                alive, new_alive = self.grid == 1, new_grid == 1
+                born, died = new_alive > alive, new_alive < alive
+            born_rows, born_cols = np.nonzero(born)
+            died_rows, died_cols = np.nonzero(died)
+            self._record_delta(born_cols + self.origin_col, born_rows + self.origin_row,
+                               died_cols + self.origin_col, died_rows + self.origin_row)
+        self.grid = new_grid
+        # Изредка подрезаем массив, чтобы он не рос бесконечно за улетевшими клетками.
+        if self.generation % 64 == 63:
+            self._shrink()
@@ -0,0 +1,71 @@
+"""
+Многопоточный вариант NumPy-движка.
+
+Массив поля делится на горизонтальные полосы. Каждая полоса считается
+в своем потоке по тем же формулам, что и в NumpyEngine (step_rows), и
+читает по одному ряду соседних полос (гало). Операции NumPy над большими
+массивами отпускают GIL, поэтому полосы действительно считаются на разных
+ядрах, а результат побитово совпадает с последовательным движком.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from numpy_engine import NumpyEngine, StepBuffers, step_rows
+
+
+class ParallelEngine(NumpyEngine):
+    """NumPy-движок, считающий поколение полосами в пуле потоков."""
+
+    # Полосы тоньше этого числа рядов не выгодно отдавать в отдельный поток.
+    MIN_STRIPE_ROWS = 64
+
+    def __init__(self, cells=None, rule=None, workers=None):
+        # Число рабочих потоков; по умолчанию - по числу ядер.
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self._pool = None
+        # Рабочие массивы полос (StepBuffers) и границы полос с шириной массива, для которых они созданы.
+        self._stripe_buffers = []
+        self._stripe_layout = None
+        super().__init__(cells, rule)
+
+    def _stripes(self, height):
+        """Границы полос [r0, r1) для внутренних рядов 1..height-2."""
+        count = min(self.workers, max(1, (height - 2) // self.MIN_STRIPE_ROWS))
+        bounds = np.linspace(1, height - 1, count + 1).astype(int).tolist()
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _step_once(self):
+        if self.grid.size == 0:
+            return
+        self._ensure_margin()
+        grid = self.grid
+        new_grid = np.zeros_like(grid)
+        alive = self._generations_alive()
+        stripes = self._stripes(grid.shape[0])
+        buffers = self._buffers_for(stripes, grid.shape[1])
+        if len(stripes) == 1:
+            step_rows(grid, new_grid, 1, grid.shape[0] - 1, self.rule, alive, buffers[0])
+        else:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            futures = [self._pool.submit(step_rows, grid, new_grid, r0, r1, self.rule, alive, stripe_buffers)
+                       for (r0, r1), stripe_buffers in zip(stripes, buffers)]
+            for future in futures:
+                future.result()
+        self._finish_step(new_grid)
+
+    def _buffers_for(self, stripes, width):
+        """StepBuffers каждой полосы: прежние, если полосы и ширина массива не менялись."""
+        layout = (tuple(stripes), width)
+        if layout != self._stripe_layout:
+            self._stripe_layout = layout
+            self._stripe_buffers = [StepBuffers((r1 - r0, width - 2)) for r0, r1 in stripes]
+        return self._stripe_buffers
+
+    def shutdown(self):
+        """Останавливает пул потоков (он будет создан заново при следующем шаге)."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
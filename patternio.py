@@ -0,0 +1,541 @@
+"""
+Чтение и запись файлов паттернов.
+
+Поддерживаются четыре формата:
+  - RLE (Golly, LifeWiki): заголовок "x = .., y = .., rule = .." и тело из
+    токенов <число><тег>, где b - мертвые клетки, o - живые, $ - конец
+    ряда, ! - конец паттерна. Читается потоково, кусками байтов: токены
+    разбираются регулярным выражением, а координаты клеток вычисляются
+    векторно (NumPy), без промежуточных строк и кортежей на клетку.
+  - Macrocell (.mc, Golly): квадродерево в виде списка узлов. Загружается
+    сразу в дерево Hashlife, поэтому паттерны на миллиарды клеток, которые
+    невозможно перечислить поклеточно, открываются за секунды.
+  - Снимок тайлов (.tiles): двоичный файл фиксированной раскладки для
+    огромных полей движка TileEngine. Открывается через mmap мгновенно,
+    а тайлы подгружаются с диска, только когда их касается отрисовка или шаг.
+  - Старый текстовый формат: по строке "колонка,ряд" на клетку.
+
+Клетки передаются парами массивов NumPy (колонки, ряды) int64, как в
+cellutils и BaseEngine.set_cell_arrays.
+"""
+import mmap
+import os
+import re
+import struct
+from contextlib import contextmanager
+
+import numpy as np
+
+from cellutils import cells_to_arrays
+from hashlife import HashlifeEngine, ON, OFF
+from tile_engine import TILE, TileEngine, TileStore, pack_keys, unpack_keys
+
+# Размер куска при потоковом чтении файла.
+CHUNK_SIZE = 1 << 20
+# Golly рекомендует строки RLE не длиннее 70 символов.
+RLE_LINE_WIDTH = 70
+# Сколько серий клеток форматируется за один раз при записи RLE.
+RLE_WRITE_BATCH = 1 << 16
+
+DEFAULT_RULE = 'B3/S23'
+
+
+class PatternFormatError(ValueError):
+    """Файл не удалось разобрать как паттерн."""
+
+
+@contextmanager
+def _open(source, mode):
+    """Открывает путь или возвращает уже открытый файл (не закрывая его)."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, mode) as f:
+            yield f
+    else:
+        yield source
+
+
+def _empty_arrays():
+    return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+
+def _concat(chunks):
+    """Склеивает куски (колонки, ряды) в одну пару массивов."""
+    if not chunks:
+        return _empty_arrays()
+    return np.concatenate([c for c, _ in chunks]), np.concatenate([r for _, r in chunks])
+
+
+# --- RLE: чтение ---
+
+# Токен тела RLE: необязательное число повторов и тег.
+_RLE_TOKEN = re.compile(rb'(\d*)([^\d])')
+_WHITESPACE = b' \t\r\n'
+
+
+def _parse_rle_header(line):
+    """
+    Разбирает строку "x = 3, y = 3, rule = B3/S23" в словарь. В правиле
+    может быть запятая: у ограниченных полей Golly это "B3/S23:T100,80".
+    """
+    header = {}
+    key = None
+    for part in line.split(','):
+        name, sep, value = part.partition('=')
+        if sep:
+            key = name.strip().lower()
+            header[key] = value.strip()
+        elif key == 'rule':
+            header[key] += ',' + part.strip()
+        else:
+            raise PatternFormatError(f"Некорректный заголовок RLE: {line!r}")
+    return header
+
+
+def _read_rle_header(f):
+    """
+    Читает комментарии и заголовок RLE. Возвращает (метаданные, начало тела).
+    Метаданные: x, y (размеры), rule, pos (смещение из #CXRLE) и comments.
+    """
+    meta = {'rule': DEFAULT_RULE, 'pos': (0, 0), 'comments': []}
+    while True:
+        raw = f.readline()
+        if not raw:
+            return meta, b''
+        line = raw.decode('utf-8', errors='replace').strip()
+        if not line:
+            continue
+        if line.startswith('#'):
+            if line.startswith('#CXRLE'):
+                match = re.search(r'Pos\s*=\s*(-?\d+)\s*,\s*(-?\d+)', line)
+                if match:
+                    meta['pos'] = (int(match.group(1)), int(match.group(2)))
+            meta['comments'].append(line)
+            continue
+        if line.startswith('x'):
+            header = _parse_rle_header(line)
+            try:
+                meta['x'] = int(header.get('x', 0))
+                meta['y'] = int(header.get('y', 0))
+            except ValueError:
+                raise PatternFormatError(f"Некорректный заголовок RLE: {line!r}") from None
+            meta['rule'] = header.get('rule', DEFAULT_RULE)
+            return meta, b''
+        # Файл без заголовка: строка уже относится к телу.
+        return meta, raw
+
+
+def _decode_rle_tokens(counts, tags, x, y):
+    """
+    Векторно переводит токены RLE в клетки. x, y - позиция перед первым
+    токеном. Возвращает (колонки, ряды, x, y после последнего токена).
+    """
+    newline = tags == ord('$')
+    alive = ~newline & (tags != ord('b')) & (tags != ord('.'))
+    # Ряд каждого токена: y плюс все переводы строк перед ним.
+    dy = np.where(newline, counts, 0)
+    row_end = y + np.cumsum(dy)
+    token_rows = row_end - dy
+    # Колонка каждого токена: сдвиг с начала его ряда, сбрасывается на '$'.
+    dx = np.where(newline, 0, counts)
+    col_end = np.cumsum(dx)
+    segment = np.cumsum(newline)
+    bases = np.concatenate([[-x], col_end[newline]])
+    token_cols = col_end - dx - bases[segment]
+
+    run_starts, run_rows, run_lengths = token_cols[alive], token_rows[alive], counts[alive]
+    total = int(run_lengths.sum())
+    offsets = np.cumsum(run_lengths) - run_lengths
+    inside = np.arange(total, dtype=np.int64) - np.repeat(offsets, run_lengths)
+    cols = np.repeat(run_starts, run_lengths) + inside
+    rows = np.repeat(run_rows, run_lengths)
+
+    if segment.size and segment[-1]:
+        x = int(col_end[-1] - bases[segment[-1]])
+    else:
+        x += int(col_end[-1]) if col_end.size else 0
+    y = int(row_end[-1]) if row_end.size else y
+    return cols, rows, x, y
+
+
+def iter_rle(source, chunk_size=CHUNK_SIZE, meta=None):
+    """
+    Потоково читает тело RLE и выдает клетки кусками (колонки, ряды).
+    Если передан словарь meta, в него записываются метаданные заголовка.
+    """
+    with _open(source, 'rb') as f:
+        header, pending = _read_rle_header(f)
+        # Остаток заголовка - первая строка тела вместе с ее переводом строки.
+        pending = pending.translate(None, _WHITESPACE)
+        if meta is not None:
+            meta.update(header)
+        pos_col, pos_row = header['pos']
+        x = y = 0
+        done = False
+        while not done:
+            data = f.read(chunk_size)
+            if not data:
+                done = True
+            chunk = pending + data.translate(None, _WHITESPACE)
+            end = chunk.find(b'!')
+            if end >= 0:
+                chunk = chunk[:end]
+                done = True
+            if not done:
+                # Число на конце куска может продолжиться в следующем.
+                cut = len(chunk.rstrip(b'0123456789'))
+                chunk, pending = chunk[:cut], chunk[cut:]
+            tokens = _RLE_TOKEN.findall(chunk)
+            if not tokens:
+                continue
+            counts = np.array([int(n) if n else 1 for n, _ in tokens], dtype=np.int64)
+            tags = np.frombuffer(b''.join(tag for _, tag in tokens), dtype=np.uint8)
+            cols, rows, x, y = _decode_rle_tokens(counts, tags, x, y)
+            if cols.size:
+                yield cols + pos_col, rows + pos_row
+
+
+def read_rle(source, chunk_size=CHUNK_SIZE):
+    """Читает RLE целиком: (колонки, ряды, метаданные)."""
+    meta = {}
+    cols, rows = _concat(list(iter_rle(source, chunk_size, meta)))
+    return cols, rows, meta
+
+
+# --- RLE: запись ---
+
+def _rle_runs(cols, rows):
+    """Серии подряд идущих живых клеток: (ряды, начальные колонки, длины)."""
+    order = np.lexsort((cols, rows))
+    cols, rows = cols[order], rows[order]
+    keep = np.ones(cols.size, dtype=bool)
+    keep[1:] = (cols[1:] != cols[:-1]) | (rows[1:] != rows[:-1])
+    cols, rows = cols[keep], rows[keep]
+    starts = np.ones(cols.size, dtype=bool)
+    starts[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1] + 1)
+    first = np.flatnonzero(starts)
+    lengths = np.diff(np.append(first, cols.size))
+    return rows[first], cols[first], lengths
+
+
+def _rle_token(count, tag):
+    return f"{count}{tag}" if count > 1 else tag
+
+
+def write_rle(target, cells, rule=DEFAULT_RULE, comments=()):
+    """
+    Записывает клетки (пара массивов или итерируемые кортежи) в RLE.
+    Положение паттерна сохраняется строкой "#CXRLE Pos=x,y", как в Golly.
+    """
+    cols, rows = cells_to_arrays(cells)
+    with _open(target, 'w') as f:
+        for comment in comments:
+            f.write(f"{comment}\n")
+        if cols.size == 0:
+            f.write(f"x = 0, y = 0, rule = {rule}\n!\n")
+            return
+        min_col, min_row = int(cols.min()), int(rows.min())
+        width = int(cols.max()) - min_col + 1
+        height = int(rows.max()) - min_row + 1
+        f.write(f"#CXRLE Pos={min_col},{min_row}\n")
+        f.write(f"x = {width}, y = {height}, rule = {rule}\n")
+
+        run_rows, run_cols, lengths = _rle_runs(cols, rows)
+        # Перед каждой серией: переводы строк и пропуск мертвых клеток.
+        new_row = np.ones(run_rows.size, dtype=bool)
+        new_row[1:] = run_rows[1:] != run_rows[:-1]
+        dollars = np.diff(run_rows, prepend=min_row)
+        prev_end = np.concatenate([[min_col], run_cols[:-1] + lengths[:-1]])
+        blanks = np.where(new_row, run_cols - min_col, run_cols - prev_end)
+
+        line = []
+        line_width = 0
+        for start in range(0, run_rows.size, RLE_WRITE_BATCH):
+            end = start + RLE_WRITE_BATCH
+            out = []
+            for d, b, n in zip(dollars[start:end].tolist(), blanks[start:end].tolist(),
+                               lengths[start:end].tolist()):
+                for count, tag in ((d, '$'), (b, 'b'), (n, 'o')):
+                    if not count:
+                        continue
+                    token = _rle_token(count, tag)
+                    if line_width + len(token) > RLE_LINE_WIDTH:
+                        out.append(''.join(line))
+                        line, line_width = [], 0
+                    line.append(token)
+                    line_width += len(token)
+            if out:
+                f.write('\n'.join(out) + '\n')
+        if line_width == RLE_LINE_WIDTH:
+            line.append('\n')
+        f.write(''.join(line) + '!\n')
+
+
+# --- Macrocell ---
+
+# Узлы уровня 1 (2x2) по битам: nw - 1, ne - 2, sw - 4, se - 8.
+def _level1_key(bits, x, y):
+    return (bits[y][x] | bits[y][x + 1] << 1 | bits[y + 1][x] << 2 | bits[y + 1][x + 1] << 3)
+
+
+def _parse_leaf(line):
+    """Лист Macrocell (квадрат 8x8): ряды из '.' и '*', разделенные '$'."""
+    bits = [[0] * 8 for _ in range(8)]
+    for y, row in enumerate(line.split('$')[:8]):
+        for x, char in enumerate(row[:8]):
+            if char == '*':
+                bits[y][x] = 1
+            elif char != '.':
+                raise PatternFormatError(f"Некорректный лист Macrocell: {line!r}")
+    return bits
+
+
+def _build_leaf(engine, bits, level1):
+    """Канонический узел 8x8 движка из битовой матрицы."""
+    join = engine.join
+    quads4 = []
+    for y4 in (0, 4):
+        for x4 in (0, 4):
+            quads4.append(join(*(level1[_level1_key(bits, x4 + dx, y4 + dy)]
+                                 for dy in (0, 2) for dx in (0, 2))))
+    return join(*quads4)
+
+
+def read_macrocell(source, engine=None):
+    """
+    Загружает Macrocell в движок Hashlife (новый, если engine не передан)
+    и возвращает его вместе с метаданными {'rule', 'comments'}. Узлы файла
+    канонизируются тем же движком, поэтому повторяющиеся части паттерна
+    сразу разделяют память и кэш результатов.
+    """
+    if engine is None:
+        engine = HashlifeEngine()
+    engine.clear()
+    join = engine.join
+    level1 = [join(*(ON if key >> i & 1 else OFF for i in range(4))) for key in range(16)]
+    meta = {'rule': DEFAULT_RULE, 'comments': []}
+    nodes = [None]  # Индексы узлов в файле начинаются с 1; 0 - пустой узел.
+    # На время загрузки сборка мусора выключена: узлы из списка еще не
+    # достижимы из корня, и канонизация не должна их потерять.
+    max_nodes, engine.max_nodes = engine.max_nodes, float('inf')
+    try:
+        with _open(source, 'r') as f:
+            first = f.readline()
+            if not first.startswith('[M2]'):
+                raise PatternFormatError("Нет заголовка [M2] - это не файл Macrocell")
+            for number, line in enumerate(f, start=2):
+                line = line.strip()
+                if not line:
+                    continue
+                char = line[0]
+                if char == '#':
+                    if line.startswith('#R'):
+                        meta['rule'] = line[2:].strip()
+                    elif line.startswith('#G'):
+                        engine.generation = int(line[2:].strip())
+                    else:
+                        meta['comments'].append(line)
+                elif char in '.*$':
+                    nodes.append(_build_leaf(engine, _parse_leaf(line), level1))
+                else:
+                    try:
+                        level, *children = map(int, line.split())
+                        if len(children) != 4 or level < 4:
+                            raise ValueError
+                        quads = [nodes[i] if i else engine.empty_node(level - 1) for i in children]
+                    except (ValueError, IndexError):
+                        raise PatternFormatError(f"Строка {number}: некорректный узел {line!r}") from None
+                    if any(q.level != level - 1 for q in quads):
+                        raise PatternFormatError(f"Строка {number}: уровни потомков не совпадают")
+                    nodes.append(join(*quads))
+    finally:
+        engine.max_nodes = max_nodes
+    if len(nodes) > 1:
+        engine.set_root(nodes[-1])
+    return engine, meta
+
+
+def _leaf_line(engine, node):
+    """Строка листа Macrocell для узла 8x8."""
+    half = 4
+    rows = [['.'] * 8 for _ in range(8)]
+    for col, row in engine.iter_node(node):
+        rows[row + half][col + half] = '*'
+    lines = [''.join(row).rstrip('.') for row in rows]
+    while lines and not lines[-1]:
+        lines.pop()
+    return '$'.join(lines) + '$'
+
+
+def write_macrocell(target, engine, rule=DEFAULT_RULE, comments=()):
+    """
+    Записывает поле в Macrocell. Движок Hashlife пишется прямо из своего
+    дерева (каждый уникальный узел - одна строка), остальные движки сначала
+    переносятся в дерево.
+    """
+    if not isinstance(engine, HashlifeEngine):
+        hashlife = HashlifeEngine()
+        hashlife.set_live_cells(engine.iter_cells())
+        hashlife.generation = engine.generation
+        engine = hashlife
+    root = engine.root
+    with _open(target, 'w') as f:
+        f.write("[M2] (Game of Life)\n")
+        f.write(f"#R {rule}\n")
+        if engine.generation:
+            f.write(f"#G {engine.generation}\n")
+        for comment in comments:
+            f.write(f"{comment}\n")
+        if root.population == 0:
+            return
+        # Обход в обратном порядке: потомки записываются раньше родителя.
+        index = {}
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if node.population == 0 or node in index:
+                continue
+            if node.level == HashlifeEngine.MIN_LEVEL:
+                f.write(_leaf_line(engine, node) + '\n')
+            elif expanded:
+                children = [index.get(q, 0) for q in (node.nw, node.ne, node.sw, node.se)]
+                f.write(f"{node.level} {children[0]} {children[1]} {children[2]} {children[3]}\n")
+            else:
+                stack.append((node, True))
+                stack.extend((q, False) for q in (node.se, node.sw, node.ne, node.nw))
+                continue
+            index[node] = len(index) + 1
+
+
+# --- Снимок тайлов ---
+#
+# Раскладка файла (все числа little-endian):
+#   заголовок, 128 байт: сигнатура, версия, сторона тайла, поколение,
+#     население, число тайлов, число активных тайлов, смещение тайлов и
+#     ограничивающий прямоугольник (чтобы не читать крайние тайлы);
+#   каталог: (tx, ty) int32 каждого тайла по возрастанию (ty, tx);
+#   активные тайлы: (tx, ty) int32 тайлов, пересчитываемых на следующем шаге;
+#   тайлы: по TILE слов uint64 в порядке каталога, с границы страницы.
+
+TILES_MAGIC = b'LIFETILE'
+TILES_VERSION = 1
+_TILES_HEADER = struct.Struct('<8sIIqQQQQqqqq')
+_TILES_HEADER_SIZE = 128
+_TILES_ALIGN = 4096
+_TILE_KEY = np.dtype([('tx', '<i4'), ('ty', '<i4')])
+
+
+def _tile_keys(tx, ty):
+    keys = np.empty(len(tx), dtype=_TILE_KEY)
+    keys['tx'] = tx
+    keys['ty'] = ty
+    return keys
+
+
+def write_tiles(path, engine):
+    """
+    Записывает поле в снимок тайлов. Тайлы пишутся прямо из массивов
+    движка (в том числе из отображенного в память прошлого снимка), без
+    промежуточных копий. Файл сначала пишется рядом и затем подменяется,
+    поэтому перезапись открытого снимка безопасна.
+    """
+    if not isinstance(engine, TileEngine):
+        tiles_engine = TileEngine()
+        tiles_engine.set_cell_arrays(*engine.cell_arrays())
+        tiles_engine.generation = engine.generation
+        engine = tiles_engine
+    store = engine.tiles
+    active = sorted(engine.changed, key=lambda key: (key[1], key[0]))
+    active = np.array(active, dtype=np.int64).reshape(-1, 2)
+    active_offset = _TILES_HEADER_SIZE + _TILE_KEY.itemsize * len(store)
+    active_end = active_offset + _TILE_KEY.itemsize * len(active)
+    tiles_offset = -(-active_end // _TILES_ALIGN) * _TILES_ALIGN
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        header = _TILES_HEADER.pack(TILES_MAGIC, TILES_VERSION, TILE, engine.generation,
+                                    engine.population, len(store), len(active), tiles_offset,
+                                    *(engine.bounding_box or (0, 0, 0, 0)))
+        f.write(header.ljust(_TILES_HEADER_SIZE, b'\0'))
+        for packed, _ in store.sorted_chunks():
+            f.write(_tile_keys(*unpack_keys(packed)).tobytes())
+        f.write(_tile_keys(active[:, 0], active[:, 1]).tobytes())
+        f.write(bytes(tiles_offset - active_end))
+        for _, tiles in store.sorted_chunks():
+            f.write(np.ascontiguousarray(tiles, dtype='<u8'))
+    os.replace(temp_path, path)
+
+
+def read_tiles(path):
+    """
+    Открывает снимок тайлов через mmap и возвращает движок TileEngine.
+    В память читается только каталог; тайлы остаются в файле, и ОС
+    подгружает их страницы по мере обращения.
+    """
+    with open(path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise PatternFormatError("Пустой файл") from None
+    if len(mapped) < _TILES_HEADER_SIZE:
+        raise PatternFormatError("Короткий заголовок снимка тайлов")
+    magic, version, tile, generation, population, count, active_count, tiles_offset, *box = \
+        _TILES_HEADER.unpack_from(mapped)
+    if magic != TILES_MAGIC:
+        raise PatternFormatError("Это не снимок тайлов")
+    if version != TILES_VERSION or tile != TILE:
+        raise PatternFormatError(f"Неподдерживаемый снимок тайлов: версия {version}, тайл {tile}")
+    active_offset = _TILES_HEADER_SIZE + _TILE_KEY.itemsize * count
+    if (active_offset + _TILE_KEY.itemsize * active_count > tiles_offset or
+            len(mapped) < tiles_offset + count * TILE * 8):
+        raise PatternFormatError("Снимок тайлов обрезан")
+
+    directory = np.frombuffer(mapped, dtype=_TILE_KEY, count=count, offset=_TILES_HEADER_SIZE)
+    keys = pack_keys(directory['tx'].astype(np.int64), directory['ty'].astype(np.int64))
+    if np.any(keys[1:] <= keys[:-1]):
+        raise PatternFormatError("Каталог снимка тайлов не упорядочен")
+    active = np.frombuffer(mapped, dtype=_TILE_KEY, count=active_count, offset=active_offset)
+    tiles = np.frombuffer(mapped, dtype='<u8', count=count * TILE, offset=tiles_offset).reshape(count, TILE)
+
+    engine = TileEngine()
+    engine.set_tile_store(TileStore(keys, tiles), population,
+                          zip(active['tx'].tolist(), active['ty'].tolist()),
+                          tuple(box) if population else None)
+    engine.generation = generation
+    return engine
+
+
+# --- Старый текстовый формат ---
+
+_INTEGER = re.compile(rb'-?\d+')
+
+
+def read_cell_list(source, chunk_size=CHUNK_SIZE):
+    """Читает строки "колонка,ряд" кусками в массивы (колонки, ряды)."""
+    chunks = []
+    pending = b''
+    with _open(source, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            chunk = pending + data
+            if data:
+                # Последняя строка куска может быть неполной.
+                cut = chunk.rfind(b'\n') + 1
+                chunk, pending = chunk[:cut], chunk[cut:]
+            values = np.array(_INTEGER.findall(chunk), dtype=np.int64)
+            if values.size % 2:
+                raise PatternFormatError("Нечетное число координат")
+            if values.size:
+                chunks.append((values[0::2], values[1::2]))
+            if not data:
+                break
+    return _concat(chunks)
+
+
+def write_cell_list(target, cells):
+    """Записывает клетки строками "колонка,ряд"."""
+    cols, rows = cells_to_arrays(cells)
+    with _open(target, 'w') as f:
+        for start in range(0, cols.size, RLE_WRITE_BATCH):
+            end = start + RLE_WRITE_BATCH
+            f.write(''.join(f"{col},{row}\n" for col, row in
+                            zip(cols[start:end].tolist(), rows[start:end].tolist())))
@@ -0,0 +1,232 @@
+"""
+Замеры времени шага, отрисовки и ввода-вывода.
+
+Profiler хранит по каждому именованному замеру ("step", "render", "io",
+...) скользящее окно последних длительностей (RollingTimer): из него
+считаются медиана (p50) и 99-й процентиль (p99), так что видно и обычную
+стоимость операции, и редкие провалы. Замер оборачивается в
+    with profiler.time('step'):
+        engine.step()
+и стоит пару вызовов perf_counter, поэтому замеры включены всегда.
+
+ProfileSession - сеанс cProfile сразу по нескольким потокам (cProfile
+видит только поток, в котором включен): поток интерфейса профилируется
+целиком от start до stop, поток симуляции - только внутри блоков
+session.profile(). Модуль не зависит от Qt.
+"""
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Сколько последних замеров хранит окно каждого таймера.
+WINDOW = 1024
+
+# Блок with вне сеанса cProfile.
+_NO_PROFILE = nullcontext()
+
+
+class RollingTimer:
+    """Скользящее окно последних WINDOW длительностей (в секундах)."""
+
+    def __init__(self, window=WINDOW):
+        self._samples = np.zeros(window, dtype=np.float64)
+        # Сколько замеров записано за все время (позиция в кольцевом буфере).
+        self.count = 0
+        # Суммарное время всех замеров.
+        self.total = 0.0
+
+    def add(self, seconds):
+        self._samples[self.count % self._samples.size] = seconds
+        self.count += 1
+        self.total += seconds
+
+    def samples(self):
+        """Замеры текущего окна (копия, порядок не важен)."""
+        return self._samples[:min(self.count, self._samples.size)].copy()
+
+    def summary(self):
+        """Сводка окна в миллисекундах: count, mean, p50, p99, max."""
+        samples = self.samples() * 1000
+        if not samples.size:
+            return {'count': self.count}
+        p50, p99 = np.percentile(samples, [50, 99]).tolist()
+        return {
+            'count': self.count,
+            'mean_ms': round(float(samples.mean()), 3),
+            'p50_ms': round(p50, 3),
+            'p99_ms': round(p99, 3),
+            'max_ms': round(float(samples.max()), 3),
+        }
+
+
+class _Timing:
+    """Контекстный менеджер одного замера (класс, а не генератор: так вдвое дешевле)."""
+
+    __slots__ = ('_timer', '_lock', '_start')
+
+    def __init__(self, timer, lock):
+        self._timer = timer
+        self._lock = lock
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self._start
+        with self._lock:
+            self._timer.add(seconds)
+
+
+class Profiler:
+    """Набор именованных таймеров; пишут в него несколько потоков."""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def timer(self, name):
+        """Таймер по имени (создается при первом обращении)."""
+        timer = self._timers.get(name)
+        if timer is None:
+            with self._lock:
+                timer = self._timers.setdefault(name, RollingTimer(self.window))
+        return timer
+
+    def record(self, name, seconds):
+        """Добавляет замер длительности seconds в таймер name."""
+        timer = self.timer(name)
+        with self._lock:
+            timer.add(seconds)
+
+    def time(self, name):
+        """Замеряет время выполнения блока with в таймер name."""
+        return _Timing(self.timer(name), self._lock)
+
+    def percentiles(self, name):
+        """(p50, p99) таймера name в миллисекундах или (None, None)."""
+        timer = self._timers.get(name)
+        if timer is None:
+            return None, None
+        with self._lock:
+            samples = timer.samples()
+        if not samples.size:
+            return None, None
+        p50, p99 = (np.percentile(samples, [50, 99]) * 1000).tolist()
+        return p50, p99
+
+    def count(self, name):
+        """Сколько всего замеров записано в таймер name."""
+        timer = self._timers.get(name)
+        return timer.count if timer is not None else 0
+
+    def summary(self):
+        """Сводка всех таймеров: имя -> RollingTimer.summary()."""
+        with self._lock:
+            return {name: timer.summary() for name, timer in sorted(self._timers.items())}
+
+    def reset(self):
+        """Забывает все замеры."""
+        with self._lock:
+            self._timers = {}
+
+    def dump(self, path, **context):
+        """
+        Записывает сводку таймеров в JSON вместе с описанием окружения;
+        context - дополнительные поля (движок, поколение, население...).
+        """
+        report = {
+            'meta': {
+                'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'window': self.window,
+                **context,
+            },
+            'timers': self.summary(),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+class ProfileSession:
+    """
+    Сеанс cProfile по нескольким потокам. У каждого потока свой
+    cProfile.Profile; при сохранении они сливаются в одну статистику.
+    """
+
+    def __init__(self):
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self.active = False
+
+    def _thread_profile(self):
+        ident = threading.get_ident()
+        with self._lock:
+            profile = self._profiles.get(ident)
+            if profile is None:
+                profile = self._profiles[ident] = cProfile.Profile()
+        return profile
+
+    def start(self):
+        """Начинает сеанс и профилирует вызвавший поток до stop."""
+        self.active = True
+        self._thread_profile().enable()
+
+    def stop(self):
+        """
+        Завершает сеанс (вызывается из того же потока, что и start). Блоки
+        profile() в других потоках к этому моменту должны быть завершены.
+        """
+        self.active = False
+        self._thread_profile().disable()
+
+    def profile(self):
+        """Профилирует блок with текущего потока, пока сеанс активен."""
+        if not self.active:
+            return _NO_PROFILE
+        # cProfile.Profile сам включается на входе в with и выключается на выходе.
+        return self._thread_profile()
+
+    def stats(self):
+        """Общая статистика всех потоков (pstats.Stats) или None, если вызовов не было."""
+        stats = None
+        with self._lock:
+            profiles = list(self._profiles.values())
+        for profile in profiles:
+            profile.create_stats()
+            if not profile.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        return stats
+
+    def dump(self, path, sort='cumulative'):
+        """
+        Сохраняет статистику: .txt - текстовый отчет pstats (по sort),
+        иначе - двоичный .prof для pstats, snakeviz и т.п.
+        """
+        stats = self.stats()
+        if stats is None:
+            raise ValueError("profile session is empty")
+        if path.lower().endswith('.txt'):
+            text = io.StringIO()
+            stats.stream = text
+            stats.sort_stats(sort).print_stats()
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text.getvalue())
+        else:
+            stats.dump_stats(path)
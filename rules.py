@@ -0,0 +1,169 @@
+"""
+Правила клеточных автоматов семейства «Жизни», заданные строкой правила.
+
+Поддерживаются внешне-тоталистические правила на окрестности Мура:
+  - B/S: "B3/S23" (Life), "B36/S23" (HighLife), "B3678/S34678"
+    (Day & Night), "B2/S" (Seeds), а также старая запись S/B: "23/3";
+  - многосостоятельные Generations: "B2/S/C3" или запись Golly S/B/C
+    "/2/3" (Brian's Brain). Состояние 1 - живая клетка, 2..C-1 -
+    умирающие: они не считаются соседями, не могут родиться и с каждым
+    поколением стареют, пока не умрут.
+Правила с B0 не поддерживаются: на бесконечном поле они зажигают все
+пустое пространство сразу.
+
+Rule компилирует правило в таблицы, которые индексируют движки вместо
+ветвления по каждой клетке:
+  - transitions - (состояние, число соседей) -> новое состояние;
+  - table - 512 записей: окрестность 3x3 (9 бит) -> новое состояние центра;
+  - table4x4 - 65536 записей: блок 4x4 (16 бит) -> его центр 2x2 через
+    поколение (4 бита), базовый случай Hashlife.
+Таблицы строятся лениво, один раз на правило (NumPy импортируется только
+тогда). Модуль не зависит от Qt.
+"""
+import re
+from functools import cached_property
+
+# Наибольшее число состояний правила Generations.
+MAX_STATES = 256
+
+# Известные правила: название -> строка правила.
+RULES = {
+    'Life': 'B3/S23',
+    'HighLife': 'B36/S23',
+    'Day & Night': 'B3678/S34678',
+    'Seeds': 'B2/S',
+    "Brian's Brain": 'B2/S/C3',
+    'Star Wars': 'B2/S345/C4',
+}
+
+_BS = re.compile(r'B([0-8]*)/S([0-8]*)(?:/C?(\d+))?')
+_SB = re.compile(r'([0-8]*)/([0-8]*)(?:/(\d+))?')
+
+
+class Rule:
+    """Внешне-тоталистическое правило: рождение, выживание и число состояний."""
+
+    def __init__(self, birth, survival, states=2):
+        self.birth = frozenset(birth)
+        self.survival = frozenset(survival)
+        self.states = states
+        if not self.birth <= set(range(9)) or not self.survival <= set(range(9)):
+            raise ValueError("Число соседей в правиле должно быть от 0 до 8")
+        if 0 in self.birth:
+            raise ValueError("Правила с B0 не поддерживаются")
+        if not 2 <= states <= MAX_STATES:
+            raise ValueError(f"Число состояний должно быть от 2 до {MAX_STATES}")
+
+    @property
+    def rulestring(self):
+        """Каноническая строка правила: "B3/S23" или "B2/S/C3"."""
+        text = f"B{''.join(map(str, sorted(self.birth)))}/S{''.join(map(str, sorted(self.survival)))}"
+        return text if self.states == 2 else f"{text}/C{self.states}"
+
+    @property
+    def name(self):
+        """Название известного правила или строка правила."""
+        for name, rulestring in RULES.items():
+            if parse_rule(rulestring) == self:
+                return name
+        return self.rulestring
+
+    def __eq__(self, other):
+        return isinstance(other, Rule) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def _key(self):
+        return self.birth, self.survival, self.states
+
+    def __repr__(self):
+        return f"Rule({self.rulestring!r})"
+
+    # --- Таблицы ---
+
+    @cached_property
+    def transitions(self):
+        """Массив uint8 (states, 9): новое состояние по состоянию и числу живых соседей."""
+        import numpy as np
+        table = np.zeros((self.states, 9), dtype=np.uint8)
+        for n in range(9):
+            table[0, n] = 1 if n in self.birth else 0
+            if self.states == 2:
+                table[1, n] = 1 if n in self.survival else 0
+            else:
+                table[1, n] = 1 if n in self.survival else 2
+        # Умирающие клетки стареют независимо от соседей.
+        for state in range(2, self.states):
+            table[state] = (state + 1) % self.states
+        return table
+
+    @cached_property
+    def table(self):
+        """
+        Массив uint8 из 512 записей: индекс - окрестность 3x3, бит 3*dy + dx
+        (dx, dy от 0 до 2) - клетка (dx - 1, dy - 1), бит 4 - центр; значение
+        - жив ли центр в следующем поколении. Для Generations - по живым
+        клеткам, без учета умирающих.
+        """
+        import numpy as np
+        index = np.arange(512)
+        bits = (index[:, None] >> np.arange(9)) & 1
+        alive = bits[:, 4]
+        counts = bits.sum(axis=1) - alive
+        return (self.transitions[alive, counts] == 1).astype(np.uint8)
+
+    @cached_property
+    def table4x4(self):
+        """
+        Массив uint8 из 65536 записей: индекс - блок 4x4, бит 4*y + x -
+        клетка (x, y); значение - центр 2x2 через поколение: бит 0 - (1, 1),
+        бит 1 - (2, 1), бит 2 - (1, 2), бит 3 - (2, 2).
+        """
+        import numpy as np
+        index = np.arange(1 << 16)
+        result = np.zeros(1 << 16, dtype=np.uint8)
+        for bit, (x, y) in enumerate(((1, 1), (2, 1), (1, 2), (2, 2))):
+            # Окрестность 3x3 клетки (x, y) - девять бит блока.
+            neighbourhood = np.zeros(1 << 16, dtype=np.intp)
+            for dy in range(3):
+                for dx in range(3):
+                    cell = 4 * (y + dy - 1) + (x + dx - 1)
+                    neighbourhood |= ((index >> cell) & 1) << (3 * dy + dx)
+            result |= self.table[neighbourhood] << bit
+        return result
+
+    def count_groups(self):
+        """
+        Числа соседей, при которых живая клетка в следующем поколении:
+        (always, if_alive, if_dead) - независимо от состояния, только если
+        клетка жива, только если мертва. Движки на подсчете соседей строят
+        по ним свои выражения.
+        """
+        return (self.birth & self.survival, self.survival - self.birth, self.birth - self.survival)
+
+
+def parse_rule(text):
+    """
+    Rule по строке правила ("B3/S23", "23/3", "B2/S/C3", "/2/3") или по
+    названию из RULES. Бросает ValueError, если строка не распознана.
+    """
+    text = text.strip()
+    for name, rulestring in RULES.items():
+        if text.lower() == name.lower():
+            text = rulestring
+            break
+    compact = text.replace(' ', '')
+    match = _BS.fullmatch(compact.upper())
+    if match:
+        birth, survival, states = match.groups()
+    else:
+        match = _SB.fullmatch(compact)
+        if not match:
+            raise ValueError(f"Не удалось разобрать правило: {text}")
+        survival, birth, states = match.groups()
+    return Rule(map(int, birth), map(int, survival), int(states) if states else 2)
+
+
+# Правило по умолчанию - классическая «Жизнь» Конвея.
+LIFE = parse_rule('B3/S23')
@@ -0,0 +1,230 @@
+"""
+Фоновый поток симуляции.
+
+Движок шагает в отдельном QThread, а интерфейс получает готовые
+неизменяемые снимки (engine.Snapshot) через сигнал. Поэтому даже если одно
+поколение считается дольше интервала таймера, панорамирование, зум и
+мигание курсора не подвисают.
+"""
+import threading
+import time
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from profiling import Profiler, ProfileSession
+
+
+def _shutdown_engine(engine):
+    """Останавливает рабочие потоки движка, если они у него есть (ParallelEngine)."""
+    shutdown = getattr(engine, 'shutdown', None)
+    if shutdown:
+        shutdown()
+
+
+class SimulationThread(QThread):
+    """Поток, который продвигает движок и публикует снимки для отрисовки."""
+
+    # (снимок, изменившиеся блоки, эпоха). Блоки - множество ключей
+    # engine.CHANGE_BLOCK с прошлого опубликованного снимка или None, если
+    # неизвестно, что поменялось. Снимки устаревших эпох интерфейс отбрасывает.
+    snapshot_ready = pyqtSignal(object, object, int)
+    # Поле стало периодичным или вымерло (аргумент - statehash.Cycle).
+    cycle_found = pyqtSignal(object)
+    # Прогон run_for досчитал заданное число поколений.
+    run_finished = pyqtSignal()
+
+    def __init__(self, engine, parent=None, max_pending=1, history=None, detector=None, profiler=None,
+                 profile_session=None):
+        super().__init__(parent)
+        self.engine = engine
+        engine.track_changes = True
+        # История поколений (history.History): каждый шаг записывается в нее.
+        self.history = history
+        # Поиск циклов (statehash.CycleDetector): видит каждый шаг.
+        self.detector = detector
+        # Родившиеся и умершие клетки шага нужны и истории, и поиску циклов.
+        engine.track_deltas = history is not None or detector is not None
+        # Останавливаться ли, когда поле стало периодичным.
+        self.stop_on_cycle = False
+        # Замеры шага, записи истории, поиска циклов и снимка (profiling.Profiler).
+        self.profiler = profiler if profiler is not None else Profiler()
+        # Сеанс cProfile (profiling.ProfileSession): пока он активен, работа
+        # потока под блокировкой профилируется.
+        self.profile_session = profile_session if profile_session is not None else ProfileSession()
+        # Момент (perf_counter) отправки последнего снимка: по нему интерфейс
+        # замеряет, сколько снимок ждал в очереди событий Qt.
+        self.published_at = None
+        # Любой доступ к движку (шаг, правка, чтение) - только под этой блокировкой.
+        self.lock = threading.RLock()
+        # Сколько опубликованных снимков может ждать отрисовки. Пока лимит
+        # исчерпан, поток продолжает считать, но не создает новые снимки.
+        self.max_pending = max_pending
+        # Номер "эпохи": увеличивается при паузе и правках, чтобы снимки,
+        # застрявшие в очереди сигналов, не перезаписали более свежее состояние.
+        self.epoch = 0
+        # Строить ли пирамиду плотности снимка (LOD-отрисовка) в этом потоке,
+        # а не в потоке интерфейса при первой отрисовке.
+        self.prepare_density = False
+
+        self._cond = threading.Condition()
+        self._running = False
+        self._quit = False
+        self._pending = 0
+        # Блоки, изменившиеся после последнего опубликованного снимка. Пока
+        # снимки не публикуются (интерфейс не успевает), изменения копятся.
+        self._changes = set()
+        # Интервал между поколениями в секундах; None - "максимально быстро".
+        self._interval = 0.1
+        # Сколько поколений осталось досчитать в прогоне run_for; None - обычный запуск.
+        self._remaining = None
+
+    # --- Управление из потока интерфейса ---
+
+    @property
+    def running(self):
+        return self._running
+
+    def set_speed(self, generations_per_second):
+        """Задает темп в поколениях в секунду; None или 0 - максимально быстро."""
+        with self._cond:
+            self._interval = 1.0 / generations_per_second if generations_per_second else None
+            self._cond.notify_all()
+
+    def resume(self):
+        """Запускает (или продолжает) симуляцию."""
+        if not self.isRunning():
+            self.start()
+        with self._cond:
+            self._running = True
+            self._remaining = None
+            self._cond.notify_all()
+
+    def run_for(self, generations):
+        """
+        Считает generations поколений максимально быстро и останавливается
+        (сигнал run_finished). Пауза прерывает прогон.
+        """
+        if not self.isRunning():
+            self.start()
+        with self._cond:
+            self._running = generations > 0
+            self._remaining = generations if generations > 0 else None
+            self._cond.notify_all()
+
+    def pause(self):
+        """Приостанавливает симуляцию. Текущий шаг будет досчитан."""
+        with self._cond:
+            self._running = False
+            self._remaining = None
+            self.epoch += 1
+            self._cond.notify_all()
+
+    def invalidate(self):
+        """Помечает опубликованные снимки устаревшими (например, после правки поля)."""
+        with self._cond:
+            self.epoch += 1
+
+    def consumed(self):
+        """Сообщает, что интерфейс отрисовал (или отбросил) один снимок."""
+        with self._cond:
+            self._pending = max(0, self._pending - 1)
+
+    def set_engine(self, engine):
+        """Подменяет движок (под блокировкой, между шагами); старый движок останавливается."""
+        with self.lock:
+            engine.track_changes = True
+            engine.track_deltas = self.history is not None or self.detector is not None
+            old_engine, self.engine = self.engine, engine
+            if old_engine is not engine:
+                _shutdown_engine(old_engine)
+            # Старый и новый движки могут отмечать изменения по-разному.
+            self._changes = None
+            if self.detector is not None:
+                self.detector.reset()
+        self.invalidate()
+
+    def snapshot(self):
+        """Снимок текущего состояния, снятый синхронно под блокировкой."""
+        with self.lock:
+            return self.engine.snapshot()
+
+    def shutdown(self):
+        """Завершает поток и дожидается его остановки."""
+        with self._cond:
+            self._quit = True
+            self._running = False
+            self._cond.notify_all()
+        self.wait()
+        _shutdown_engine(self.engine)
+
+    # --- Рабочий цикл ---
+
+    def run(self):
+        next_time = time.perf_counter()
+        while True:
+            with self._cond:
+                while not self._running and not self._quit:
+                    self._cond.wait()
+                    next_time = time.perf_counter()
+                if self._quit:
+                    return
+                interval = self._interval if self._remaining is None else None
+                if interval:
+                    delay = next_time - time.perf_counter()
+                    if delay > 0:
+                        # Ждем с возможностью прерывания паузой или сменой темпа.
+                        self._cond.wait(delay)
+                        continue
+                    # Если не успеваем, не копим долг больше одного интервала.
+                    next_time = max(next_time + interval, time.perf_counter() - interval)
+                epoch = self.epoch
+
+            cycle = None
+            finished = False
+            profiler = self.profiler
+            with self.lock, self.profile_session.profile():
+                with profiler.time('step'):
+                    self.engine.step()
+                # Дельта шага забирается один раз и отдается обоим потребителям.
+                delta = self.engine.take_delta()
+                if self.history is not None:
+                    with profiler.time('history'):
+                        self.history.record(self.engine, delta)
+                if self.detector is not None:
+                    with profiler.time('cycle'):
+                        cycle = self.detector.observe(self.engine, delta)
+                    if cycle is not None and self.stop_on_cycle:
+                        # Эпоха не меняется: снимок этого шага остается актуальным.
+                        with self._cond:
+                            self._running = False
+                with self._cond:
+                    if self._remaining is not None:
+                        self._remaining -= 1
+                        if self._remaining == 0:
+                            # Эпоха не меняется: снимок последнего шага актуален.
+                            self._remaining = None
+                            self._running = False
+                            finished = True
+                changes = self.engine.take_changes()
+                if changes is None or self._changes is None:
+                    self._changes = None
+                else:
+                    self._changes |= changes
+                with self._cond:
+                    publish = self._pending < self.max_pending
+                    if publish:
+                        self._pending += 1
+                if publish:
+                    with profiler.time('snapshot'):
+                        snapshot = self.engine.snapshot()
+                    changes, self._changes = self._changes, set()
+            if publish:
+                if self.prepare_density:
+                    with profiler.time('density'):
+                        snapshot.cells.prepare_density()
+                self.published_at = time.perf_counter()
+                self.snapshot_ready.emit(snapshot, changes, epoch)
+            if cycle is not None:
+                self.cycle_found.emit(cycle)
+            if finished:
+                self.run_finished.emit()
@@ -0,0 +1,317 @@
+"""
+Пакетный поиск по случайным супам без интерфейса.
+
+Каждый суп - случайное поле size x size с плотностью density, которое
+однозначно задается парой (seed, номер супа): любой результат можно
+воспроизвести, запустив тот же seed с --start номер --soups 1. Суп
+прогоняется фиксированное число поколений (--generations) или до
+стабилизации (по умолчанию): поле стало периодичным (statehash.CycleDetector)
+или, если из него улетают корабли, периодичным стало население.
+
+Правило задается строкой (--rule, по умолчанию B3/S23): HighLife,
+Day & Night, Seeds, Generations и т.д. (см. rules.py). У правил Generations
+поле не хэшируется, и прогон останавливается по периодичности населения;
+перепись объектов для них не делается (census - null): она видит только
+живые клетки, и каждый корабль с хвостом умирающих клеток распался бы
+на случайные обрывки.
+
+Супы считаются пулом процессов (--workers, по умолчанию по числу ядер) -
+они независимы, поэтому пропускная способность растет линейно с числом
+ядер. Результаты (итоговое население, период, перепись объектов) пишутся
+по мере готовности в порядке номеров супов: в JSONL или, если файл
+оканчивается на .db/.sqlite, в таблицу soups базы SQLite.
+
+Примеры:
+    python soupsearch.py --soups 10000 --seed 42 --out soups.jsonl
+    python soupsearch.py --soups 1000 --size 32 --density 0.4 --out soups.db
+    python soupsearch.py --seed 42 --start 517 --soups 1 --out -
+    python soupsearch.py --rule B36/S23 --soups 1000 --out highlife.jsonl
+    python gameofthelife.py soupsearch --soups 1000 --out soups.jsonl
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter, namedtuple
+from functools import partial
+
+import numpy as np
+
+import database
+from census import Census, load_library
+from engine import ENGINES, create_engine, engine_supports
+from rules import LIFE, parse_rule
+from statehash import CycleDetector
+
+# Предел поколений для прогона до стабилизации.
+MAX_GENERATIONS = 20_000
+# Население считается стабилизировавшимся, если последние POPULATION_WINDOW
+# поколений оно периодично с периодом не больше POPULATION_PERIOD.
+POPULATION_PERIOD = 60
+POPULATION_WINDOW = 4 * POPULATION_PERIOD
+# Как часто (в поколениях) проверять периодичность населения.
+CHECK_INTERVAL = 16
+
+# Почему остановлен прогон супа.
+STOP_CYCLE = 'cycle'            # все поле периодично или вымерло
+STOP_POPULATION = 'population'  # периодично население (улетают корабли)
+STOP_LIMIT = 'limit'            # пройдено заданное или предельное число поколений
+
+# Параметры прогона, общие для всех супов (передаются в процессы пула).
+SoupOptions = namedtuple('SoupOptions', ['seed', 'size', 'density', 'engine', 'generations',
+                                         'max_generations', 'rule'], defaults=[LIFE])
+
+
+def soup_cells(seed, index, size, density):
+    """Клетки супа номер index: массивы (колонки, ряды). Зависят только от аргументов."""
+    rng = np.random.default_rng([seed, index])
+    rows, cols = np.nonzero(rng.random((size, size)) < density)
+    return cols.astype(np.int64), rows.astype(np.int64)
+
+
+def population_period(populations, max_period=POPULATION_PERIOD, window=POPULATION_WINDOW):
+    """Наименьший период последних window значений населения или None."""
+    if len(populations) < window:
+        return None
+    values = np.asarray(populations[-window:])
+    for period in range(1, max_period + 1):
+        if np.array_equal(values[period:], values[:-period]):
+            return period
+    return None
+
+
+# --- Перепись объектов ---
+
+# Перепись процесса (census.Census): ее кэш имен переживает супы, потому
+# что одни и те же объекты встречаются в тысячах супов.
+_census = None
+
+
+def _init_census(library, rule=LIFE):
+    """Создает перепись процесса с индексом библиотеки (см. census.library_index)."""
+    global _census
+    _census = Census(library, classify=True, rule=rule)
+
+
+# --- Прогон одного супа ---
+
+def run_soup(options, index):
+    """Прогоняет суп номер index и возвращает словарь результата."""
+    start = time.perf_counter()
+    if _census is None:
+        _init_census({}, options.rule)
+    engine = create_engine(options.engine, rule=options.rule)
+    engine.set_cell_arrays(*soup_cells(options.seed, index, options.size, options.density))
+    kind = period = None
+    dx = dy = 0
+    if options.generations is not None:
+        engine.step(options.generations)
+        stop = STOP_LIMIT
+    else:
+        stop = STOP_LIMIT
+        detector = CycleDetector()
+        engine.track_deltas = True
+        populations = []
+        while engine.generation < options.max_generations:
+            engine.step()
+            cycle = detector.observe(engine)
+            if cycle is not None:
+                stop, kind, period, dx, dy = STOP_CYCLE, cycle.kind, cycle.period, cycle.dx, cycle.dy
+                break
+            populations.append(engine.population)
+            if engine.generation % CHECK_INTERVAL == 0:
+                period = population_period(populations)
+                if period is not None:
+                    stop = STOP_POPULATION
+                    break
+                del populations[:-POPULATION_WINDOW]
+    result = {
+        'seed': options.seed,
+        'soup': index,
+        'size': options.size,
+        'density': options.density,
+        'engine': options.engine,
+        'rule': options.rule.rulestring,
+        'generations': engine.generation,
+        'population': engine.population,
+        'stop': stop,
+        'kind': kind,
+        'period': period,
+        'dx': dx,
+        'dy': dy,
+        'census': None if options.rule.states > 2 else dict(sorted(_census.count_engine(engine).items())),
+        'seconds': round(time.perf_counter() - start, 4),
+    }
+    shutdown = getattr(engine, 'shutdown', None)
+    if shutdown:
+        shutdown()
+    return result
+
+
+# --- Вывод ---
+
+class JsonlWriter:
+    """Результаты построчно в JSON ('-' - стандартный вывод)."""
+
+    def __init__(self, path):
+        self._file = sys.stdout if path == '-' else open(path, 'a', encoding='utf-8')
+
+    def write(self, result):
+        self._file.write(json.dumps(result, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+class SqliteWriter:
+    """Результаты в таблицу soups базы SQLite; фиксируются пачками."""
+
+    BATCH = 100
+
+    COLUMNS = ['seed', 'soup', 'size', 'density', 'engine', 'rule', 'generations', 'population', 'stop',
+               'kind', 'period', 'dx', 'dy', 'census', 'seconds']
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS soups (
+                    seed INTEGER NOT NULL,
+                    soup INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    density REAL NOT NULL,
+                    engine TEXT,
+                    rule TEXT NOT NULL DEFAULT 'B3/S23',
+                    generations INTEGER,
+                    population INTEGER,
+                    stop TEXT,
+                    kind TEXT,
+                    period INTEGER,
+                    dx INTEGER,
+                    dy INTEGER,
+                    census TEXT,
+                    seconds REAL,
+                    PRIMARY KEY (seed, soup, size, density, rule)
+                )
+            """)
+            # Таблица из версии без правил: все ее супы - B3/S23.
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(soups)")}
+            if 'rule' not in columns:
+                self._conn.execute("ALTER TABLE soups ADD COLUMN rule TEXT NOT NULL DEFAULT 'B3/S23'")
+        self._pending = []
+
+    def write(self, result):
+        row = dict(result, census=None if result['census'] is None else json.dumps(result['census']))
+        self._pending.append([row[column] for column in self.COLUMNS])
+        if len(self._pending) >= self.BATCH:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO soups ({', '.join(self.COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(self.COLUMNS))})", self._pending)
+            self._pending = []
+
+    def close(self):
+        self._flush()
+        self._conn.close()
+
+
+def open_writer(path):
+    """Писатель результатов по расширению файла."""
+    if path.lower().endswith(('.db', '.sqlite', '.sqlite3')):
+        return SqliteWriter(path)
+    return JsonlWriter(path)
+
+
+# --- Запуск ---
+
+def search(options, start, count, workers, writer, library=None):
+    """
+    Прогоняет супы start..start+count-1 и передает результаты writer по
+    порядку номеров. library - индекс библиотеки для имен объектов.
+    Возвращает суммарную перепись объектов.
+    """
+    library = library or {}
+    total = Counter()
+    indices = range(start, start + count)
+    run = partial(run_soup, options)
+    if workers == 1:
+        _init_census(library, options.rule)
+        results = map(run, indices)
+        pool = None
+    else:
+        pool = multiprocessing.get_context().Pool(workers, initializer=_init_census,
+                                                  initargs=(library, options.rule))
+        # Пачки по нескольку супов: меньше накладных расходов на передачу,
+        # но задачи все еще делятся между процессами поровну.
+        results = pool.imap(run, indices, chunksize=max(1, min(64, count // (workers * 16))))
+    try:
+        for result in results:
+            writer.write(result)
+            total.update(result['census'] or {})
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='soupsearch', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--soups', type=int, default=1000, help="сколько супов прогнать")
+    parser.add_argument('--seed', type=int, default=0, help="seed серии супов")
+    parser.add_argument('--start', type=int, default=0, help="номер первого супа")
+    parser.add_argument('--size', type=int, default=16, help="сторона супа")
+    parser.add_argument('--density', type=float, default=0.5, help="плотность супа")
+    parser.add_argument('--engine', choices=list(ENGINES), default='set',
+                        help="движок (для правил Generations - numpy или parallel)")
+    parser.add_argument('--rule', default=LIFE.rulestring, help="строка правила, например B36/S23 или B2/S/C3")
+    parser.add_argument('--generations', type=int,
+                        help="прогонять ровно столько поколений (по умолчанию - до стабилизации)")
+    parser.add_argument('--max-generations', type=int, default=MAX_GENERATIONS,
+                        help="предел поколений при прогоне до стабилизации")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="число процессов")
+    parser.add_argument('--out', default='-', help="файл .jsonl или .db/.sqlite; '-' - стандартный вывод")
+    parser.add_argument('--library', default=database.DATABASE_NAME,
+                        help="база библиотеки паттернов для имен объектов (если файл есть)")
+    args = parser.parse_args(argv)
+    try:
+        rule = parse_rule(args.rule)
+    except ValueError as e:
+        parser.error(str(e))
+    if not engine_supports(args.engine, rule):
+        parser.error(f"движок {args.engine} не поддерживает правило {rule.rulestring}")
+
+    library = {}
+    if os.path.exists(args.library):
+        database.DATABASE_NAME = args.library
+        library = load_library()
+        database.close()
+
+    options = SoupOptions(args.seed, args.size, args.density, args.engine, args.generations,
+                          args.max_generations, rule)
+    writer = open_writer(args.out)
+    started = time.perf_counter()
+    try:
+        total = search(options, args.start, args.soups, max(1, args.workers), writer, library)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - started
+    print(f"{args.soups} супов за {elapsed:.1f} с ({args.soups / elapsed:.1f} супов/с)", file=sys.stderr)
+    for name, count in total.most_common(10):
+        print(f"{count:>10} {name}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Движок разреженного поля на упакованных ключах.
+
+Живые клетки хранятся отсортированным массивом int64: каждая клетка - один
+ключ spatial.pack_cells (ряд в старших 32 битах, колонка в младших), 8 байт
+на клетку вместо сотни с лишним у кортежа во множестве Python. Снимок
+для отрисовки (spatial.KeyIndex) ссылается на тот же массив без копии.
+
+Поколение считается целиком над массивами: ключи восьми соседей каждой
+клетки получаются прибавлением констант, общий массив сортируется, и
+длины серий одинаковых ключей дают число живых соседей каждой клетки-
+кандидата. Новое состояние кандидата берется из таблицы правила
+(rules.Rule.transitions); кандидаты уже отсортированы, поэтому результат -
+сразу готовый массив ключей следующего поколения.
+"""
+import numpy as np
+
+from engine import _NEIGHBOURS, CHANGE_BLOCK, BaseEngine, Snapshot
+from spatial import KeyIndex, pack_cells, unpack_cells
+
+# Прибавки к ключу клетки, дающие ключи ее восьми соседей.
+_NEIGHBOUR_OFFSETS = [(dr << 32) + dc for dc, dr in _NEIGHBOURS]
+
+_EMPTY = np.zeros(0, dtype=np.int64)
+
+
+def _sorted_unique(keys):
+    """Отсортированные различные ключи (np.unique в NumPy 2 медленнее сортировки)."""
+    keys = np.sort(keys)
+    if keys.size:
+        keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+    return keys
+
+
+def _members(keys, values):
+    """Маска: какие из values есть в отсортированном массиве keys."""
+    if keys.size == 0:
+        return np.zeros(values.shape, dtype=bool)
+    pos = np.minimum(np.searchsorted(keys, values), keys.size - 1)
+    return keys[pos] == values
+
+
+class SparseEngine(BaseEngine):
+    """Движок на отсортированном массиве ключей живых клеток (бесконечное поле)."""
+
+    reports_changes = True
+    reports_deltas = True
+
+    def __init__(self, cells=None, rule=None):
+        super().__init__(rule)
+        # Отсортированные различные ключи живых клеток; заменяется, а не меняется на месте.
+        self._keys = _EMPTY
+        if cells:
+            self.set_live_cells(cells)
+
+    # --- Состояние поля ---
+
+    @property
+    def population(self):
+        """Количество живых клеток."""
+        return self._keys.size
+
+    @property
+    def bounding_box(self):
+        """
+        Возвращает ограничивающий прямоугольник живых клеток
+        в виде (min_col, min_row, max_col, max_row) или None для пустого поля.
+        """
+        if self._keys.size == 0:
+            return None
+        cols, _ = unpack_cells(self._keys)
+        return (int(cols.min()), int(self._keys[0] >> 32), int(cols.max()), int(self._keys[-1] >> 32))
+
+    def snapshot(self):
+        """Снимок поверх того же массива ключей: без копии и без кортежей."""
+        cells = KeyIndex(self._keys)
+        return Snapshot(self.generation, len(cells), self.bounding_box, cells)
+
+    def iter_cells(self):
+        """Перебирает координаты всех живых клеток."""
+        cols, rows = unpack_cells(self._keys)
+        return zip(cols.tolist(), rows.tolist())
+
+    def cell_arrays(self):
+        """Живые клетки в виде массивов (колонки, ряды)."""
+        return unpack_cells(self._keys)
+
+    def set_live_cells(self, cells):
+        """Заменяет состояние поля новым набором клеток."""
+        cells = np.array(list(cells), dtype=np.int64).reshape(-1, 2)
+        self.set_cell_arrays(cells[:, 0], cells[:, 1])
+
+    def set_cell_arrays(self, cols, rows):
+        """Заменяет состояние поля клетками из массивов (колонки, ряды)."""
+        self._keys = _sorted_unique(pack_cells(cols, rows))
+
+    def add_cells(self, cells):
+        """Оживляет все переданные клетки одним слиянием массивов."""
+        cells = np.array(list(cells), dtype=np.int64).reshape(-1, 2)
+        self._keys = _sorted_unique(np.concatenate([self._keys, pack_cells(cells[:, 0], cells[:, 1])]))
+
+    def is_alive(self, cell):
+        """Проверяет, жива ли клетка (колонка, ряд)."""
+        return bool(_members(self._keys, pack_cells([cell[0]], [cell[1]]))[0])
+
+    def set_cell(self, cell, alive):
+        """Делает клетку живой или мертвой."""
+        key = int(pack_cells(cell[0], cell[1]))
+        i = int(np.searchsorted(self._keys, key))
+        present = i < self._keys.size and int(self._keys[i]) == key
+        if alive and not present:
+            self._keys = np.insert(self._keys, i, key)
+        elif not alive and present:
+            self._keys = np.delete(self._keys, i)
+
+    def clear(self):
+        """Полностью очищает поле и сбрасывает счетчик поколений."""
+        self._keys = _EMPTY
+        self.generation = 0
+
+    # --- Симуляция ---
+
+    def _step_once(self):
+        keys = self._keys
+        if keys.size == 0:
+            return
+        n = keys.size
+        # При S0 живой клетке без соседей тоже нужна запись: ее собственный ключ.
+        with_self = 0 in self.rule.survival
+        spread = np.empty((len(_NEIGHBOUR_OFFSETS) + with_self) * n, dtype=np.int64)
+        for i, offset in enumerate(_NEIGHBOUR_OFFSETS):
+            np.add(keys, offset, out=spread[i * n:(i + 1) * n])
+        if with_self:
+            spread[-n:] = keys
+        spread.sort()
+
+        # Серии одинаковых ключей: кандидат и число записей о нем.
+        starts = np.flatnonzero(np.concatenate([[True], spread[1:] != spread[:-1]]))
+        candidates = spread[starts]
+        counts = np.diff(np.append(starts, spread.size))
+        alive = _members(keys, candidates)
+        if with_self:
+            counts -= alive
+        new_keys = candidates[self.rule.transitions[alive.view(np.uint8), counts] == 1]
+        if self.track_changes or self.track_deltas:
+            born = new_keys[~_members(keys, new_keys)]
+            died = keys[~_members(new_keys, keys)]
+            self._record_changes(born, died)
+        self._keys = new_keys
+
+    def _record_changes(self, born, died):
+        """Отмечает изменившиеся блоки и запоминает дельту шага (ключи родившихся и умерших)."""
+        born_cols, born_rows = unpack_cells(born)
+        died_cols, died_rows = unpack_cells(died)
+        if self.track_changes:
+            blocks = _sorted_unique(pack_cells(np.concatenate([born_cols, died_cols]) // CHANGE_BLOCK,
+                                               np.concatenate([born_rows, died_rows]) // CHANGE_BLOCK))
+            bx, by = unpack_cells(blocks)
+            self._changes.update(zip(bx.tolist(), by.tolist()))
+        if self.track_deltas:
+            self._record_delta(born_cols, born_rows, died_cols, died_rows)
@@ -0,0 +1,259 @@
+"""
+Пространственные индексы для снимков поля.
+
+Снимок (engine.Snapshot) хранит клетки в виде неизменяемого множества,
+которое умеет быстро отвечать на вопрос "какие клетки видны в прямоугольнике".
+Отрисовка запрашивает только видимую область (region_mask) и не перебирает
+все живые клетки поля на каждом кадре.
+
+При сильном отдалении вместо маски используется region_density: число
+живых клеток в каждом блоке block x block (уровень детализации, LOD).
+
+Все индексы реализуют интерфейс collections.abc.Set (клетки - кортежи
+(колонка, ряд)) и методы region_mask и region_density.
+"""
+from collections.abc import Set
+
+import numpy as np
+
+# Сторона квадратного блока (чанка) индекса в клетках.
+CHUNK = 32
+
+
+def pack_cells(cols, rows):
+    """
+    Клетки (колонки, ряды) одним ключом int64 на клетку: ряд в старших 32
+    битах, колонка со сдвигом 2^31 - в младших. Порядок ключей - по (ряд,
+    колонка), а соседняя клетка получается прибавлением константы.
+    """
+    return (np.asarray(rows, dtype=np.int64) << 32) + (np.asarray(cols, dtype=np.int64) + (1 << 31))
+
+
+def unpack_cells(keys):
+    """Обратное к pack_cells: (колонки, ряды)."""
+    return (keys & 0xFFFFFFFF) - (1 << 31), keys >> 32
+
+
+def density_shape(min_col, min_row, max_col, max_row, block):
+    """Форма массива плотности для области, выровненной по block."""
+    return max(0, (max_row - min_row) // block), max(0, (max_col - min_col) // block)
+
+
+class DensityPyramid:
+    """
+    Пирамида плотности (mipmap): для каждого уровня L - населенность непустых
+    блоков 2^L x 2^L. Уровни строятся лениво, каждый из предыдущего, и хранятся
+    разреженно, отсортированными по (ряд блока, колонка блока). Запрос области
+    просматривает только полосу видимых рядов нужного уровня, поэтому время
+    кадра почти не зависит от размера поля.
+    """
+
+    def __init__(self, cols, rows):
+        cols = np.asarray(cols, dtype=np.int64)
+        rows = np.asarray(rows, dtype=np.int64)
+        self._levels = [self._aggregate(cols, rows, np.ones(len(cols), dtype=np.int64))]
+
+    @staticmethod
+    def _aggregate(bx, by, counts):
+        """Сливает повторяющиеся блоки: (ряды, колонки, населенности), по порядку (by, bx)."""
+        if len(bx) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        keys = (by << 32) + (bx + (1 << 31))
+        unique, inverse = np.unique(keys, return_inverse=True)
+        total = np.bincount(inverse, weights=counts, minlength=len(unique)).astype(np.int64)
+        return unique >> 32, (unique & 0xFFFFFFFF) - (1 << 31), total
+
+    def level(self, level):
+        """(ряды, колонки, населенности) непустых блоков уровня level."""
+        while len(self._levels) <= level:
+            by, bx, counts = self._levels[-1]
+            self._levels.append(self._aggregate(bx >> 1, by >> 1, counts))
+        return self._levels[level]
+
+    def region(self, min_col, min_row, max_col, max_row, block):
+        """Плотность области (см. CellIndex.region_density)."""
+        shape = density_shape(min_col, min_row, max_col, max_row, block)
+        density = np.zeros(shape, dtype=np.int64)
+        if density.size == 0:
+            return density
+        by, bx, counts = self.level(block.bit_length() - 1)
+        by0, bx0 = min_row // block, min_col // block
+        lo, hi = np.searchsorted(by, [by0, by0 + shape[0]])
+        by, bx, counts = by[lo:hi] - by0, bx[lo:hi] - bx0, counts[lo:hi]
+        inside = (bx >= 0) & (bx < shape[1])
+        density[by[inside], bx[inside]] = counts[inside]
+        return density
+
+
+class DensityMixin:
+    """
+    region_density для индексов, у которых нет своей иерархии: пирамида
+    строится по координатам клеток один раз на снимок. prepare_density
+    позволяет построить ее заранее, в потоке симуляции.
+    """
+
+    _pyramid = None
+
+    def _cell_arrays(self):
+        """Массивы (колонки, ряды) всех живых клеток снимка."""
+        raise NotImplementedError
+
+    def prepare_density(self):
+        if self._pyramid is None:
+            self._pyramid = DensityPyramid(*self._cell_arrays())
+        return self._pyramid
+
+    def region_density(self, min_col, min_row, max_col, max_row, block):
+        """
+        Число живых клеток в блоках block x block (block - степень двойки,
+        границы области кратны block).
+        """
+        return self.prepare_density().region(min_col, min_row, max_col, max_row, block)
+
+
+class CellIndex(DensityMixin, Set):
+    """Индекс произвольного набора клеток: клетки сгруппированы по чанкам 32x32."""
+
+    def __init__(self, cells):
+        self._cells = cells if isinstance(cells, frozenset) else frozenset(cells)
+        coords = np.array(list(self._cells), dtype=np.int64).reshape(-1, 2)
+        chunk_x = coords[:, 0] // CHUNK
+        chunk_y = coords[:, 1] // CHUNK
+        order = np.lexsort((chunk_x, chunk_y))
+        self._coords = coords[order]
+        # (cx, cy) -> (начало, конец) среза в self._coords.
+        self._chunks = {}
+        if len(order):
+            keys = np.stack([chunk_x[order], chunk_y[order]], axis=1)
+            starts = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+            bounds = [0, *starts.tolist(), len(order)]
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                cx, cy = keys[start].tolist()
+                self._chunks[(cx, cy)] = (start, end)
+
+    def __contains__(self, cell):
+        return cell in self._cells
+
+    def __iter__(self):
+        return iter(self._cells)
+
+    def __len__(self):
+        return len(self._cells)
+
+    def region_mask(self, min_col, min_row, max_col, max_row):
+        """
+        Маска uint8 формы (max_row - min_row, max_col - min_col), где 1 - живая
+        клетка. Границы max_* не включаются.
+        """
+        mask = np.zeros((max(0, max_row - min_row), max(0, max_col - min_col)), dtype=np.uint8)
+        if mask.size == 0:
+            return mask
+        cx0, cx1 = min_col // CHUNK, (max_col - 1) // CHUNK
+        cy0, cy1 = min_row // CHUNK, (max_row - 1) // CHUNK
+        coords = self._visible_coords(cx0, cy0, cx1, cy1)
+        cols = coords[:, 0] - min_col
+        rows = coords[:, 1] - min_row
+        inside = (cols >= 0) & (cols < mask.shape[1]) & (rows >= 0) & (rows < mask.shape[0])
+        mask[rows[inside], cols[inside]] = 1
+        return mask
+
+    def _visible_coords(self, cx0, cy0, cx1, cy1):
+        """Координаты клеток из чанков в диапазоне [cx0..cx1] x [cy0..cy1]."""
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self._chunks):
+            # Видимая область больше всего поля - быстрее пройти по всем чанкам.
+            slices = list(self._chunks.values())
+        else:
+            slices = [self._chunks[key] for key in
+                      ((cx, cy) for cy in range(cy0, cy1 + 1) for cx in range(cx0, cx1 + 1))
+                      if key in self._chunks]
+        if not slices:
+            return np.zeros((0, 2), dtype=np.int64)
+        return np.concatenate([self._coords[start:end] for start, end in slices])
+
+    def _cell_arrays(self):
+        return self._coords[:, 0], self._coords[:, 1]
+
+
+class ArrayIndex(DensityMixin, Set):
+    """
+    Индекс поверх копии плотного массива NumPy-движка. У правил Generations
+    (multistate) в массиве есть и умирающие клетки (2 и больше): множество
+    состоит только из живых (1), а region_mask отдает состояния как есть,
+    чтобы отрисовка показала умирающие клетки своим цветом.
+    """
+
+    def __init__(self, grid, origin_col, origin_row, multistate=False):
+        self._grid = grid
+        self._origin_col = origin_col
+        self._origin_row = origin_row
+        self._alive = (grid == 1).view(np.uint8) if multistate else grid
+        self._population = int(np.count_nonzero(self._alive))
+
+    def __contains__(self, cell):
+        r = cell[1] - self._origin_row
+        c = cell[0] - self._origin_col
+        height, width = self._grid.shape
+        return 0 <= r < height and 0 <= c < width and self._grid[r, c] == 1
+
+    def __iter__(self):
+        rows, cols = np.nonzero(self._alive)
+        return zip((cols + self._origin_col).tolist(), (rows + self._origin_row).tolist())
+
+    def __len__(self):
+        return self._population
+
+    def region_mask(self, min_col, min_row, max_col, max_row):
+        """Маска видимой области (см. CellIndex.region_mask) - просто срез массива."""
+        mask = np.zeros((max(0, max_row - min_row), max(0, max_col - min_col)), dtype=np.uint8)
+        height, width = self._grid.shape
+        r0 = max(min_row - self._origin_row, 0)
+        r1 = min(max_row - self._origin_row, height)
+        c0 = max(min_col - self._origin_col, 0)
+        c1 = min(max_col - self._origin_col, width)
+        if r0 < r1 and c0 < c1:
+            mask[r0 + self._origin_row - min_row:r1 + self._origin_row - min_row,
+                 c0 + self._origin_col - min_col:c1 + self._origin_col - min_col] = self._grid[r0:r1, c0:c1]
+        return mask
+
+    def _cell_arrays(self):
+        rows, cols = np.nonzero(self._alive)
+        return cols + self._origin_col, rows + self._origin_row
+
+
+class KeyIndex(DensityMixin, Set):
+    """
+    Индекс поверх отсортированного массива ключей pack_cells (движок
+    SparseEngine). Массив не копируется: движок никогда не меняет его на
+    месте, а заменяет новым.
+    """
+
+    def __init__(self, keys):
+        self._keys = keys
+
+    def __contains__(self, cell):
+        key = (cell[1] << 32) + (cell[0] + (1 << 31))
+        i = int(np.searchsorted(self._keys, key))
+        return i < self._keys.size and int(self._keys[i]) == key
+
+    def __iter__(self):
+        cols, rows = unpack_cells(self._keys)
+        return zip(cols.tolist(), rows.tolist())
+
+    def __len__(self):
+        return self._keys.size
+
+    def region_mask(self, min_col, min_row, max_col, max_row):
+        """Маска видимой области (см. CellIndex.region_mask): ключи видимых рядов идут подряд."""
+        mask = np.zeros((max(0, max_row - min_row), max(0, max_col - min_col)), dtype=np.uint8)
+        if mask.size == 0:
+            return mask
+        lo, hi = np.searchsorted(self._keys, pack_cells([min_col, max_col], [min_row, max_row - 1]))
+        cols, rows = unpack_cells(self._keys[lo:hi])
+        cols -= min_col
+        inside = (cols >= 0) & (cols < mask.shape[1])
+        mask[rows[inside] - min_row, cols[inside]] = 1
+        return mask
+
+    def _cell_arrays(self):
+        return unpack_cells(self._keys)
@@ -0,0 +1,205 @@
+"""
+Хэш состояния поля и обнаружение циклов: натюрмортов, осцилляторов и
+кораблей.
+
+Хэш набора клеток - полиномиальный:
+    H(S) = sum(A^col * B^row по клеткам S) mod P
+по двум простым модулям P (вместе около 62 бит). Он аддитивен, поэтому
+обновляется по родившимся и умершим клеткам шага (BaseEngine.take_delta)
+без пересчета всего поля, и ковариантен относительно сдвига: сдвиг поля
+на (dx, dy) умножает хэш на A^dx * B^dy. Умножив хэш на A^-min_col *
+B^-min_row, получаем хэш формы, не зависящий от положения поля.
+
+CycleDetector хранит таблицу "хэш формы -> поколение" за последние
+поколения. Первое совпадение означает, что поле повторилось: на месте -
+натюрморт или осциллятор, со сдвигом - корабль (перемещается все поле
+целиком). Поскольку проверяется каждое поколение, первый найденный период
+наименьший. Модуль не зависит от Qt.
+"""
+from collections import deque, namedtuple
+
+import numpy as np
+
+from cellutils import KIND_DIES, KIND_OSCILLATOR, KIND_SPACESHIP, KIND_STILL
+
+# Модули и основания хэша. Модули меньше 2^31, поэтому произведение двух
+# остатков помещается в int64 и считается векторно.
+_MODULI = (2147483647, 2147483629)
+_BASES = ((1103515245, 134775813), (1664525, 22695477))
+
+# Степени оснований кэшируются таблицами на отрезке координат; отрезок
+# шире этого не кэшируется (координаты далеко разлетевшихся клеток).
+MAX_TABLE = 1 << 22
+
+# Сколько последних поколений хранит таблица: циклы длиннее не находятся.
+MAX_PERIOD = 4096
+# Поле крупнее этого без дельт от движка (полный пересчет хэша) не хэшируется.
+MAX_POPULATION = 1_000_000
+
+# Найденный цикл. kind - одна из констант cellutils.KIND_*, period - число
+# поколений цикла (None для вымершего поля), start - поколение, с которого
+# поле периодично, (dx, dy) - сдвиг поля за период (ненулевой у кораблей).
+Cycle = namedtuple('Cycle', ['kind', 'period', 'start', 'dx', 'dy'])
+
+
+# (основание, модуль) -> (первый показатель, массив степеней подряд).
+_tables = {}
+
+
+def _powers(base, exponents, modulus):
+    """base^e mod modulus для массива показателей (в том числе отрицательных)."""
+    lo, hi = int(exponents.min()), int(exponents.max())
+    start, table = _tables.get((base, modulus), (0, None))
+    if table is None or lo < start or hi >= start + table.size:
+        if table is not None:
+            lo, hi = min(lo, start), max(hi, start + table.size - 1)
+        # Запас в обе стороны, чтобы растущее поле не пересчитывало таблицу каждый шаг.
+        margin = hi - lo + 64
+        if hi - lo + 2 * margin > MAX_TABLE:
+            return _compute_powers(base, exponents, modulus)
+        start = lo - margin
+        table = _compute_powers(base, np.arange(start, hi + margin + 1), modulus)
+        _tables[base, modulus] = start, table
+    return table[exponents - start]
+
+
+def _compute_powers(base, exponents, modulus):
+    values, inverse = np.unique(exponents, return_inverse=True)
+    # Отрицательные степени - степени обратного по модулю элемента.
+    inverse_base = pow(base, modulus - 2, modulus)
+    factor = np.where(values < 0, inverse_base, base).astype(np.int64)
+    e = np.abs(values)
+    result = np.ones(values.size, dtype=np.int64)
+    while e.any():
+        odd = (e & 1).astype(bool)
+        result[odd] = result[odd] * factor[odd] % modulus
+        factor = factor * factor % modulus
+        e >>= 1
+    return result[inverse.reshape(-1)]
+
+
+def cells_hash(cols, rows):
+    """Хэш набора клеток: кортеж остатков по каждому модулю."""
+    cols = np.asarray(cols, dtype=np.int64)
+    rows = np.asarray(rows, dtype=np.int64)
+    if cols.size == 0:
+        return (0,) * len(_MODULI)
+    parts = []
+    for modulus, (a, b) in zip(_MODULI, _BASES):
+        terms = _powers(a, cols, modulus) * _powers(b, rows, modulus) % modulus
+        parts.append(int(terms.sum()) % modulus)
+    return tuple(parts)
+
+
+def group_hashes(cols, rows, starts):
+    """
+    Хэши нескольких наборов клеток сразу: клетки наборов идут подряд,
+    starts - индексы начала каждого набора. Оба остатка упакованы в одно
+    число int64 на набор (для сравнения и использования как ключа).
+    """
+    packed = np.zeros(len(starts), dtype=np.int64)
+    for modulus, (a, b) in zip(_MODULI, _BASES):
+        terms = _powers(a, cols, modulus) * _powers(b, rows, modulus) % modulus
+        packed = (packed << 31) | (np.add.reduceat(terms, starts) % modulus)
+    return packed
+
+
+def shift_hash(value, dx, dy):
+    """Хэш набора, сдвинутого на (dx, dy), по хэшу исходного набора."""
+    return tuple(h * pow(a, dx, modulus) * pow(b, dy, modulus) % modulus
+                 for h, modulus, (a, b) in zip(value, _MODULI, _BASES))
+
+
+class StateHash:
+    """Хэш живых клеток, который обновляется по рождениям и смертям."""
+
+    def __init__(self, cols=(), rows=()):
+        self.value = cells_hash(cols, rows)
+
+    def update(self, born_cols, born_rows, died_cols, died_rows):
+        """Добавляет родившиеся клетки и вычитает умершие."""
+        born = cells_hash(born_cols, born_rows)
+        died = cells_hash(died_cols, died_rows)
+        self.value = tuple((h + b - d) % modulus
+                           for h, b, d, modulus in zip(self.value, born, died, _MODULI))
+
+    def normalized(self, min_col, min_row):
+        """Хэш формы: поле, сдвинутое так, что (min_col, min_row) - начало координат."""
+        return shift_hash(self.value, -min_col, -min_row)
+
+
+class CycleDetector:
+    """
+    Следит за полем движка и сообщает, когда оно стало периодичным.
+    observe вызывается после каждого шага; после правок поля (или замены
+    движка) нужно вызвать reset.
+    """
+
+    def __init__(self, max_period=MAX_PERIOD, max_population=MAX_POPULATION):
+        self.max_period = max_period
+        self.max_population = max_population
+        self.reset()
+
+    def reset(self):
+        """Забывает прошлые состояния: следующий observe пересчитает хэш заново."""
+        self._hash = None
+        self._last_gen = None
+        # Ключ состояния -> (поколение, min_col, min_row); ключи в порядке записи.
+        self._seen = {}
+        self._order = deque()
+        # Найденный цикл (сообщается один раз).
+        self.cycle = None
+
+    def observe(self, engine, delta=None):
+        """
+        Учитывает текущее состояние движка. Возвращает Cycle, если поле
+        только что оказалось периодичным (или вымерло), иначе None. delta -
+        результат engine.take_delta(), если вызывающий уже забрал его.
+        """
+        if delta is None:
+            delta = engine.take_delta()
+        if engine.rule.states > 2:
+            # У правил Generations состояние - это и умирающие клетки, а
+            # хэшируются только живые: повтор живых клеток еще не цикл.
+            self.reset()
+            return None
+        generation = engine.generation
+        if self._last_gen is not None and generation != self._last_gen + 1:
+            # Пропуск поколений (прыжок): первый повтор уже не обязательно
+            # дает наименьший период, начинаем заново.
+            self.reset()
+        if self._hash is not None and delta is not None:
+            self._hash.update(*delta)
+        elif delta is None and engine.population > self.max_population:
+            self.reset()
+            return None
+        else:
+            self._hash = StateHash(*engine.cell_arrays())
+        self._last_gen = generation
+        if self.cycle is not None:
+            return None
+
+        box = engine.bounding_box
+        if box is None:
+            self.cycle = Cycle(KIND_DIES, None, generation, 0, 0)
+            return self.cycle
+        min_col, min_row, max_col, max_row = box
+        # Население и размеры рамки отсекают почти все случайные совпадения хэша.
+        key = (self._hash.normalized(min_col, min_row), engine.population,
+               max_col - min_col, max_row - min_row)
+        seen = self._seen.get(key)
+        if seen is not None:
+            start, start_col, start_row = seen
+            period = generation - start
+            dx, dy = min_col - start_col, min_row - start_row
+            if dx or dy:
+                kind = KIND_SPACESHIP
+            else:
+                kind = KIND_STILL if period == 1 else KIND_OSCILLATOR
+            self.cycle = Cycle(kind, period, start, dx, dy)
+            return self.cycle
+        self._seen[key] = (generation, min_col, min_row)
+        self._order.append((generation, key))
+        while self._order and self._order[0][0] <= generation - self.max_period:
+            self._seen.pop(self._order.popleft()[1], None)
+        return None
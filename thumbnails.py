@@ -0,0 +1,119 @@
+"""
+Миниатюры паттернов библиотеки.
+
+Миниатюра - квадрат THUMBNAIL_SIZE x THUMBNAIL_SIZE в градациях серого:
+паттерн вписывается в него целиком, а если клеток больше, чем пикселей,
+пиксель показывает плотность живых клеток своего блока (как карта
+плотности поля при сильном отдалении). Миниатюры хранятся в базе в виде
+PNG, ключ - хэш содержимого паттерна (database.content_hash), поэтому
+паттерн с измененными клетками получает новую миниатюру, а старая
+удаляется триггерами базы. В памяти интерфейс держит последние
+миниатюры в LRUCache. Модуль не зависит от Qt: PNG кодируется здесь же.
+"""
+import struct
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+import database
+
+# Сторона миниатюры в пикселях и наибольший размер клетки на ней.
+THUMBNAIL_SIZE = 48
+MAX_CELL_PIXELS = 8
+# Сколько миниатюр интерфейс держит в памяти.
+CACHE_SIZE = 1024
+
+# Цвета: фон, живая клетка и самый светлый тон блока с живыми клетками
+# (чтобы одиночные клетки в большом паттерне оставались заметны).
+BACKGROUND = 255
+CELL = 0
+FAINTEST = 160
+
+
+def render_thumbnail(cols, rows, size=THUMBNAIL_SIZE):
+    """Миниатюра клеток (колонки, ряды): массив uint8 (size, size), паттерн по центру."""
+    image = np.full((size, size), BACKGROUND, dtype=np.uint8)
+    cols = np.asarray(cols, dtype=np.int64)
+    rows = np.asarray(rows, dtype=np.int64)
+    if cols.size == 0:
+        return image
+    cols = cols - cols.min()
+    rows = rows - rows.min()
+    width, height = int(cols.max()) + 1, int(rows.max()) + 1
+    side = max(width, height)
+    if side <= size:
+        # Каждая клетка - квадрат scale x scale пикселей.
+        scale = min(MAX_CELL_PIXELS, size // side)
+        cells = np.zeros((height, width), dtype=bool)
+        cells[rows, cols] = True
+        pixels = np.where(cells.repeat(scale, axis=0).repeat(scale, axis=1), CELL, BACKGROUND)
+    else:
+        # Каждый пиксель - блок block x block клеток (у краев - его часть
+        # внутри рамки паттерна); тон - по доле живых клеток блока.
+        block = -(-side // size)
+        block_cols = np.minimum(block, width - np.arange(0, width, block))
+        block_rows = np.minimum(block, height - np.arange(0, height, block))
+        counts = np.bincount((rows // block) * block_cols.size + cols // block,
+                             minlength=block_rows.size * block_cols.size).reshape(block_rows.size, block_cols.size)
+        density = np.sqrt(counts / np.outer(block_rows, block_cols))
+        pixels = np.where(counts > 0, FAINTEST * (1 - density), BACKGROUND)
+    top, left = (size - pixels.shape[0]) // 2, (size - pixels.shape[1]) // 2
+    image[top:top + pixels.shape[0], left:left + pixels.shape[1]] = pixels
+    return image
+
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+
+def encode_png(pixels):
+    """PNG (bytes) из массива uint8 (высота, ширина) в градациях серого."""
+    height, width = pixels.shape
+    # Каждая строка изображения начинается с байта фильтра (0 - без фильтра).
+    raw = np.zeros((height, width + 1), dtype=np.uint8)
+    raw[:, 1:] = pixels
+    header = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', header)
+            + _png_chunk(b'IDAT', zlib.compress(raw.tobytes(), 9)) + _png_chunk(b'IEND', b''))
+
+
+def pattern_thumbnail(pattern_id, content_hash, size=THUMBNAIL_SIZE):
+    """
+    PNG миниатюры паттерна: из базы или, если ее там еще нет, отрисованная
+    по клеткам и сохраненная. None - паттерн уже удален.
+    """
+    png = database.get_thumbnail(content_hash, size)
+    if png is None:
+        cells = database.get_pattern_cells(pattern_id)
+        if cells is None:
+            return None
+        png = encode_png(render_thumbnail(*cells, size=size))
+        database.save_thumbnail(content_hash, size, png)
+    return png
+
+
+class LRUCache:
+    """Словарь на maxsize записей, вытесняющий давно не запрошенные."""
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def get(self, key, default=None):
+        if key not in self._items:
+            return default
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
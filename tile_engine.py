@@ -0,0 +1,613 @@
+"""
+Движок на битово упакованных тайлах с отслеживанием активности.
+
+Поле разбито на тайлы 64x64 клетки. Тайл хранится как 64 слова uint64:
+слово - ряд тайла, бит c - колонка c. Следующее поколение считается
+побитовыми сумматорами сразу для 64 клеток ряда, а тайлы, в окрестности
+которых в прошлом поколении ничего не изменилось, вообще не пересчитываются.
+Поэтому на больших стабилизировавшихся полях цена шага зависит от
+активности, а не от числа живых клеток.
+
+Правило (rules.Rule) компилируется в побитовое выражение от четырех бит
+числа соседей и бита самой клетки (_compile_rule): таблица правила
+разлагается по битам, а невозможные числа соседей (9-15) используются как
+безразличные. Для B3/S23 получается ~bit2 & bit1 & (bit0 | alive).
+
+Тайлы хранятся в TileStore: неизменяемая основа (отсортированные массивы,
+в том числе отображенный в память файл снимка, см. patternio) и словарь
+правок поверх нее. Тайлы основы читаются по одному, поэтому в памяти
+оказываются только те, которые видны на экране или участвуют в шаге.
+"""
+from collections.abc import MutableMapping, Set
+
+import numpy as np
+
+from engine import BaseEngine, Snapshot
+from spatial import DensityMixin
+
+TILE = 64
+
+# Смещения восьми соседних тайлов и самого тайла (индекс 4 - центр).
+_NEIGHBOUR_TILES = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+
+
+def _half_add(a, b):
+    return a ^ b, a & b
+
+
+def _full_add(a, b, c):
+    t = a ^ b
+    return t ^ c, (a & b) | (c & t)
+
+
+# Переменные выражения правила: биты числа соседей от старшего к младшему и
+# бит самой клетки.
+_RULE_VARIABLES = ('bit3', 'bit2', 'bit1', 'bit0', 'alive')
+
+# Скомпилированные правила: Rule -> выражение (см. _compile_rule).
+_compiled_rules = {}
+
+
+def _build_expression(cases, var):
+    """
+    Выражение от переменных var.. по таблице cases: {значения переменных
+    (кортеж, None - безразлично) -> результат}. Узлы: 0, 1, ('var', i),
+    ('not', e), ('and', a, b), ('or', a, b).
+    """
+    values = set(cases.values())
+    if len(values) <= 1:
+        return values.pop() if values else 0
+    low = {key[:var] + (None,) + key[var + 1:]: value for key, value in cases.items() if key[var] == 0}
+    high = {key[:var] + (None,) + key[var + 1:]: value for key, value in cases.items() if key[var] == 1}
+    if all(low[key] == high[key] for key in low.keys() & high.keys()):
+        # Значение не зависит от переменной там, где определены обе ветви.
+        return _build_expression({**low, **high}, var + 1)
+    e0 = _build_expression(low, var + 1)
+    e1 = _build_expression(high, var + 1)
+    x = ('var', var)
+    if (e0, e1) == (0, 1):
+        return x
+    if (e0, e1) == (1, 0):
+        return ('not', x)
+    if e0 == 0:
+        return ('and', x, e1)
+    if e1 == 0:
+        return ('and', ('not', x), e0)
+    if e1 == 1:
+        return ('or', x, e0)
+    if e0 == 1:
+        return ('or', ('not', x), e1)
+    return ('or', ('and', x, e1), ('and', ('not', x), e0))
+
+
+def _compile_rule(rule):
+    """Выражение правила от _RULE_VARIABLES (кэшируется по правилу)."""
+    expression = _compiled_rules.get(rule)
+    if expression is None:
+        cases = {}
+        for count in range(9):
+            bits = tuple((count >> shift) & 1 for shift in (3, 2, 1, 0))
+            for alive in (0, 1):
+                cases[bits + (alive,)] = int(rule.transitions[alive, count])
+        expression = _compiled_rules[rule] = _build_expression(cases, 0)
+    return expression
+
+
+def _evaluate(expression, planes):
+    """Значение выражения правила над битовыми плоскостями planes (имя -> массив)."""
+    if expression == 0:
+        return np.zeros_like(planes['alive'])
+    if expression == 1:
+        return np.full_like(planes['alive'], np.uint64(0xFFFFFFFFFFFFFFFF))
+    op = expression[0]
+    if op == 'var':
+        return planes[_RULE_VARIABLES[expression[1]]]
+    if op == 'not':
+        return ~_evaluate(expression[1], planes)
+    a = _evaluate(expression[1], planes)
+    b = _evaluate(expression[2], planes)
+    return a & b if op == 'and' else a | b
+
+
+def pack_keys(tx, ty):
+    """Ключи тайлов (tx, ty) одним int64; порядок ключей - по (ty, tx)."""
+    return (ty << 32) + (tx + (1 << 31))
+
+
+def unpack_keys(packed):
+    """Обратное к pack_keys: (tx, ty)."""
+    return (packed & 0xFFFFFFFF) - (1 << 31), packed >> 32
+
+
+def _popcount(words):
+    """Число живых клеток в массиве слов uint64."""
+    if hasattr(np, 'bitwise_count'):  # NumPy 2.0+
+        return int(np.bitwise_count(words).sum(dtype=np.int64))
+    return int(np.unpackbits(np.ascontiguousarray(words).view(np.uint8)).sum())
+
+
+def _unpack(tile):
+    """Маска 64x64 из bool по упакованному тайлу."""
+    bits = np.unpackbits(tile.astype('<u8').view(np.uint8), bitorder='little')
+    return bits.reshape(TILE, TILE)
+
+
+def _store_cells(store):
+    """Массивы (колонки, ряды) всех живых клеток хранилища тайлов."""
+    if not store:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    tx, ty, tiles = store.arrays()
+    bits = np.unpackbits(tiles.astype('<u8').view(np.uint8), bitorder='little').reshape(-1, TILE, TILE)
+    index, rows, cols = np.nonzero(bits)
+    return cols + tx[index] * TILE, rows + ty[index] * TILE
+
+
+class TileStore(MutableMapping):
+    """
+    Словарь (tx, ty) -> массив uint64[64] из двух слоев. Основа - массив
+    упакованных ключей по возрастанию и массив тайлов (n, 64); он может
+    быть отображен в память из файла, тогда ОС подгружает только страницы
+    тех тайлов, которые действительно читаются. Поверх основы - словарь
+    правок и множество скрытых ключей основы (удаленных или перекрытых
+    правками). Основа никогда не меняется, поэтому копия хранилища для
+    снимка копирует только правки.
+    """
+
+    def __init__(self, keys=None, tiles=None):
+        if keys is None:
+            keys = np.zeros(0, dtype=np.int64)
+            tiles = np.zeros((0, TILE), dtype=np.uint64)
+        self._keys = keys
+        self._tiles = tiles
+        self._overlay = {}
+        self._hidden = set()
+        self._len = len(keys)
+        # Уже найденные в основе ключи -> индекс (-1 - ключа нет). Основа не
+        # меняется, поэтому кэш общий у всех копий и растет только по тем
+        # тайлам, к которым обращались.
+        self._found = {}
+
+    def _base_index(self, key):
+        """Индекс ключа в основе или -1."""
+        i = self._found.get(key)
+        if i is None:
+            packed = pack_keys(key[0], key[1])
+            i = int(self._keys.searchsorted(packed))
+            if i == len(self._keys) or self._keys[i] != packed:
+                i = -1
+            self._found[key] = i
+        return i
+
+    def get(self, key, default=None):
+        tile = self._overlay.get(key)
+        if tile is not None:
+            return tile
+        if key in self._hidden:
+            return default
+        i = self._base_index(key)
+        return self._tiles[i] if i >= 0 else default
+
+    def __getitem__(self, key):
+        tile = self.get(key)
+        if tile is None:
+            raise KeyError(key)
+        return tile
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __setitem__(self, key, tile):
+        if key not in self._overlay:
+            if key in self._hidden:
+                self._len += 1
+            elif self._base_index(key) >= 0:
+                self._hidden.add(key)
+            else:
+                self._len += 1
+        self._overlay[key] = tile
+
+    def __delitem__(self, key):
+        if key in self._overlay:
+            del self._overlay[key]
+        elif key not in self._hidden and self._base_index(key) >= 0:
+            self._hidden.add(key)
+        else:
+            raise KeyError(key)
+        self._len -= 1
+
+    def __iter__(self):
+        tx, ty = unpack_keys(self._keys)
+        hidden = self._hidden
+        for key in zip(tx.tolist(), ty.tolist()):
+            if key not in hidden:
+                yield key
+        yield from list(self._overlay)
+
+    def __len__(self):
+        return self._len
+
+    def copy(self):
+        """Копия, разделяющая с оригиналом основу."""
+        store = TileStore(self._keys, self._tiles)
+        store._found = self._found
+        store._overlay = dict(self._overlay)
+        store._hidden = set(self._hidden)
+        store._len = self._len
+        return store
+
+    def _visible_base(self):
+        """Маска нескрытых ключей основы."""
+        if not self._hidden:
+            return np.ones(len(self._keys), dtype=bool)
+        hidden = np.array([pack_keys(tx, ty) for tx, ty in self._hidden], dtype=np.int64)
+        return ~np.isin(self._keys, hidden)
+
+    def key_arrays(self):
+        """Массивы (tx, ty) ключей всех тайлов."""
+        packed = self._keys[self._visible_base()] if self._hidden else self._keys
+        if self._overlay:
+            extra = np.array(list(self._overlay), dtype=np.int64).reshape(-1, 2)
+            packed = np.concatenate([packed, pack_keys(extra[:, 0], extra[:, 1])])
+        return unpack_keys(packed)
+
+    def arrays(self):
+        """Массивы (tx, ty, тайлы (n, 64)) всех тайлов сразу."""
+        visible = self._visible_base()
+        packed, tiles = self._keys[visible], self._tiles[visible]
+        if self._overlay:
+            extra = np.array(list(self._overlay), dtype=np.int64).reshape(-1, 2)
+            packed = np.concatenate([packed, pack_keys(extra[:, 0], extra[:, 1])])
+            tiles = np.concatenate([tiles, np.stack(list(self._overlay.values()))])
+        tx, ty = unpack_keys(packed)
+        return tx, ty, tiles
+
+    def keys_in(self, tx0, ty0, tx1, ty1):
+        """Ключи тайлов в прямоугольнике [tx0..tx1] x [ty0..ty1]."""
+        lo, hi = np.searchsorted(self._keys, [ty0 << 32, (ty1 + 1) << 32])
+        tx, ty = unpack_keys(self._keys[lo:hi])
+        inside = (tx >= tx0) & (tx <= tx1)
+        hidden = self._hidden
+        keys = [key for key in zip(tx[inside].tolist(), ty[inside].tolist()) if key not in hidden]
+        keys.extend(key for key in self._overlay if tx0 <= key[0] <= tx1 and ty0 <= key[1] <= ty1)
+        return keys
+
+    def sorted_chunks(self):
+        """
+        Все тайлы по возрастанию ключа кусками (упакованные ключи, тайлы).
+        Непрерывные участки основы отдаются срезами без копирования, правки -
+        по одному тайлу. Нужно для записи снимка в файл.
+        """
+        hidden = np.sort(np.flatnonzero(~self._visible_base()))
+        extra = sorted((pack_keys(tx, ty), (tx, ty)) for tx, ty in self._overlay)
+
+        def base_runs(start, end):
+            cuts = hidden[np.searchsorted(hidden, start):np.searchsorted(hidden, end)].tolist()
+            for cut in [*cuts, end]:
+                if start < cut:
+                    yield self._keys[start:cut], self._tiles[start:cut]
+                start = cut + 1
+
+        cursor = 0
+        for packed, key in extra:
+            position = int(np.searchsorted(self._keys, packed))
+            yield from base_runs(cursor, position)
+            yield np.array([packed], dtype=np.int64), self._overlay[key][None]
+            cursor = position
+        yield from base_runs(cursor, len(self._keys))
+
+    def settle(self):
+        """
+        Переносит правки в новую основу, если их стало больше, чем тайлов в
+        основе (например, суп переписал все поле). Так копии для снимков
+        остаются дешевыми, а перекрытые тайлы старой основы - освобождаются.
+        """
+        if len(self._overlay) + len(self._hidden) <= max(len(self._keys), 1024):
+            return
+        tx, ty, tiles = self.arrays()
+        packed = pack_keys(tx, ty)
+        order = np.argsort(packed)
+        self._keys, self._tiles = packed[order], tiles[order]
+        self._found = {}
+        self._overlay = {}
+        self._hidden = set()
+        self._len = len(self._keys)
+
+
+class TileIndex(DensityMixin, Set):
+    """
+    Неизменяемое множество клеток поверх хранилища тайлов. Движок никогда не
+    меняет массив тайла на месте, поэтому достаточно копии самого хранилища.
+    """
+
+    def __init__(self, tiles, population):
+        self._tiles = tiles
+        self._population = population
+
+    def __contains__(self, cell):
+        tx, c = divmod(cell[0], TILE)
+        ty, r = divmod(cell[1], TILE)
+        tile = self._tiles.get((tx, ty))
+        return tile is not None and bool((int(tile[r]) >> c) & 1)
+
+    def __iter__(self):
+        for (tx, ty), tile in self._tiles.items():
+            rows, cols = np.nonzero(_unpack(tile))
+            yield from zip((cols + tx * TILE).tolist(), (rows + ty * TILE).tolist())
+
+    def __len__(self):
+        return self._population
+
+    def region_mask(self, min_col, min_row, max_col, max_row):
+        """Маска видимой области: распаковываются только видимые тайлы."""
+        mask = np.zeros((max(0, max_row - min_row), max(0, max_col - min_col)), dtype=np.uint8)
+        if mask.size == 0:
+            return mask
+        for tx, ty in self._visible_tiles(min_col, min_row, max_col, max_row):
+            bits = _unpack(self._tiles[(tx, ty)])
+            # Пересечение тайла с областью в координатах тайла.
+            c0 = max(min_col - tx * TILE, 0)
+            c1 = min(max_col - tx * TILE, TILE)
+            r0 = max(min_row - ty * TILE, 0)
+            r1 = min(max_row - ty * TILE, TILE)
+            mask[ty * TILE + r0 - min_row:ty * TILE + r1 - min_row,
+                 tx * TILE + c0 - min_col:tx * TILE + c1 - min_col] = bits[r0:r1, c0:c1]
+        return mask
+
+    def _visible_tiles(self, min_col, min_row, max_col, max_row):
+        """Ключи непустых тайлов, пересекающих область."""
+        return self._tiles.keys_in(min_col // TILE, min_row // TILE,
+                                   (max_col - 1) // TILE, (max_row - 1) // TILE)
+
+    def _cell_arrays(self):
+        return _store_cells(self._tiles)
+
+
+class TileEngine(BaseEngine):
+    """Движок на упакованных тайлах 64x64, пересчитывающий только активные тайлы."""
+
+    # Тайл совпадает с блоком CHANGE_BLOCK, поэтому измененные блоки -
+    # это просто измененные тайлы.
+    reports_changes = True
+    reports_deltas = True
+
+    def __init__(self, cells=None, rule=None):
+        super().__init__(rule)
+        # (tx, ty) -> np.ndarray(64, uint64). Пустые тайлы не хранятся.
+        self.tiles = TileStore()
+        # Тайлы, изменившиеся в прошлом поколении (или отредактированные вручную).
+        self.changed = set()
+        # Число живых клеток; обновляется только по изменившимся тайлам.
+        self._population = 0
+        # Кэш ограничивающего прямоугольника (False - не вычислен). Его поиск
+        # читает все крайние тайлы, а у поля из снимка они лежат на диске.
+        self._box = False
+        if cells:
+            self.set_live_cells(cells)
+
+    # --- Состояние поля ---
+
+    @property
+    def population(self):
+        """Количество живых клеток."""
+        return self._population
+
+    @property
+    def active_tiles(self):
+        """Число тайлов, которые будут пересчитаны на следующем шаге."""
+        return len(self._candidates())
+
+    @property
+    def bounding_box(self):
+        """
+        Возвращает ограничивающий прямоугольник живых клеток
+        в виде (min_col, min_row, max_col, max_row) или None для пустого поля.
+        """
+        if self._box is False:
+            self._box = self._find_bounding_box()
+        return self._box
+
+    def _find_bounding_box(self):
+        keys_x, keys_y = self.tiles.key_arrays()
+        if keys_x.size == 0:
+            return None
+        # Крайние клетки лежат в крайних тайлах - распаковываем только их.
+        edge = ((keys_x == keys_x.min()) | (keys_x == keys_x.max()) |
+                (keys_y == keys_y.min()) | (keys_y == keys_y.max()))
+        box = None
+        for tx, ty in zip(keys_x[edge].tolist(), keys_y[edge].tolist()):
+            mask = _unpack(self.tiles[(tx, ty)])
+            rows = np.flatnonzero(mask.any(axis=1))
+            cols = np.flatnonzero(mask.any(axis=0))
+            tile_box = (tx * TILE + int(cols[0]), ty * TILE + int(rows[0]),
+                        tx * TILE + int(cols[-1]), ty * TILE + int(rows[-1]))
+            if box is None:
+                box = tile_box
+            else:
+                box = (min(box[0], tile_box[0]), min(box[1], tile_box[1]),
+                       max(box[2], tile_box[2]), max(box[3], tile_box[3]))
+        return box
+
+    def snapshot(self):
+        """Снимок, разделяющий с движком неизменяемые массивы тайлов."""
+        cells = TileIndex(self.tiles.copy(), self._population)
+        return Snapshot(self.generation, len(cells), self.bounding_box, cells)
+
+    def iter_cells(self):
+        """Перебирает координаты всех живых клеток."""
+        for (tx, ty), tile in list(self.tiles.items()):
+            rows, cols = np.nonzero(_unpack(tile))
+            yield from zip((cols + tx * TILE).tolist(), (rows + ty * TILE).tolist())
+
+    def cell_arrays(self):
+        """Живые клетки в виде массивов (колонки, ряды)."""
+        return _store_cells(self.tiles)
+
+    def set_live_cells(self, cells):
+        """Заменяет состояние поля новым набором клеток."""
+        cells = np.array(list(cells), dtype=np.int64).reshape(-1, 2)
+        self.set_cell_arrays(cells[:, 0], cells[:, 1])
+
+    def set_cell_arrays(self, cols, rows):
+        """Заменяет состояние поля клетками из массивов (колонки, ряды)."""
+        tx, col = np.divmod(cols, TILE)
+        ty, row = np.divmod(rows, TILE)
+        keys, inverse = np.unique(pack_keys(tx, ty), return_inverse=True)
+        tiles = np.zeros((len(keys), TILE), dtype=np.uint64)
+        np.bitwise_or.at(tiles, (inverse.ravel(), row), np.left_shift(np.uint64(1), col.astype(np.uint64)))
+        self.set_tile_store(TileStore(keys, tiles), _popcount(tiles))
+
+    def set_tile_store(self, store, population, active=None, bounding_box=False):
+        """
+        Подключает готовое хранилище тайлов (например, снимок, отображенный
+        в память). active - тайлы, которые нужно пересчитать на следующем
+        шаге (по умолчанию - все), bounding_box - известный заранее
+        прямоугольник живых клеток.
+        """
+        self.tiles = store
+        self._population = population
+        self._box = bounding_box
+        self.changed = set(store) if active is None else set(active)
+
+    def is_alive(self, cell):
+        """Проверяет, жива ли клетка (колонка, ряд)."""
+        tx, c = divmod(cell[0], TILE)
+        ty, r = divmod(cell[1], TILE)
+        tile = self.tiles.get((tx, ty))
+        return tile is not None and bool((int(tile[r]) >> c) & 1)
+
+    def set_cell(self, cell, alive):
+        """Делает клетку живой или мертвой."""
+        tx, c = divmod(cell[0], TILE)
+        ty, r = divmod(cell[1], TILE)
+        tile = self.tiles.get((tx, ty))
+        if tile is None:
+            if not alive:
+                return
+            tile = np.zeros(TILE, dtype=np.uint64)
+        else:
+            # Копируем тайл перед правкой: старый массив может быть в снимке.
+            tile = tile.copy()
+        word = int(tile[r])
+        if bool((word >> c) & 1) == alive:
+            return
+        self.tiles[(tx, ty)] = tile
+        tile[r] = (word | (1 << c)) if alive else (word & ~(1 << c))
+        self._population += 1 if alive else -1
+        self._box = False
+        if not tile.any():
+            del self.tiles[(tx, ty)]
+        self.changed.add((tx, ty))
+
+    def clear(self):
+        """Полностью очищает поле и сбрасывает счетчик поколений."""
+        self.tiles = TileStore()
+        self.changed = set()
+        self._population = 0
+        self._box = None
+        self.generation = 0
+
+    def _inside_box(self, keys):
+        """
+        Все тайлы keys лежат строго внутри тайлов рамки: их изменения не
+        могут сдвинуть ограничивающий прямоугольник.
+        """
+        min_col, min_row, max_col, max_row = self._box
+        tx0, ty0, tx1, ty1 = min_col // TILE, min_row // TILE, max_col // TILE, max_row // TILE
+        return all(tx0 < tx < tx1 and ty0 < ty < ty1 for tx, ty in keys)
+
+    # --- Симуляция ---
+
+    def _rule_changed(self):
+        # Тайлы, стабильные по старому правилу, по новому могут ожить.
+        self.changed = set(self.tiles)
+
+    def _record_tile_delta(self, keys, new, alive):
+        """Родившиеся и умершие клетки тайлов keys (массив (n, 2)) по их старым и новым рядам."""
+        def cells(words):
+            bits = np.unpackbits(words.astype('<u8').view(np.uint8), bitorder='little')
+            index, rows, cols = np.nonzero(bits.reshape(-1, TILE, TILE))
+            return cols + keys[index, 0] * TILE, rows + keys[index, 1] * TILE
+        self._record_delta(*cells(new & ~alive), *cells(alive & ~new))
+
+    def _candidates(self):
+        """Тайлы, в окрестности 3x3 которых что-то изменилось."""
+        candidates = set()
+        for tx, ty in self.changed:
+            for dx, dy in _NEIGHBOUR_TILES:
+                candidates.add((tx + dx, ty + dy))
+        return candidates
+
+    def _step_once(self):
+        candidates = list(self._candidates())
+        if not candidates:
+            return
+
+        # Собираем все нужные тайлы в один массив: индекс 0 - пустой тайл.
+        index = {}
+        arrays = [np.zeros(TILE, dtype=np.uint64)]
+        neighbours = np.zeros((len(candidates), 9), dtype=np.intp)
+        for i, (tx, ty) in enumerate(candidates):
+            for k, (dx, dy) in enumerate(_NEIGHBOUR_TILES):
+                key = (tx + dx, ty + dy)
+                j = index.get(key)
+                if j is None:
+                    tile = self.tiles.get(key)
+                    j = 0
+                    if tile is not None:
+                        j = index[key] = len(arrays)
+                        arrays.append(tile)
+                neighbours[i, k] = j
+        tiles = np.stack(arrays)
+
+        def column(k):
+            """Ряды тайла-соседа k (3, 4 или 5), дополненные рядом сверху и снизу."""
+            top = tiles[neighbours[:, k - 3], -1]
+            bottom = tiles[neighbours[:, k + 3], 0]
+            return np.concatenate([top[:, None], tiles[neighbours[:, k]], bottom[:, None]], axis=1)
+
+        one = np.uint64(1)
+        shift = np.uint64(TILE - 1)
+        centre = column(4)
+        west = column(3)
+        east = column(5)
+        # Соседи слева и справа: сдвигаем ряды на бит, подставляя краевой
+        # бит из соседнего тайла.
+        from_west = (centre << one) | (west >> shift)
+        from_east = (centre >> one) | ((east & one) << shift)
+
+        # Восемь битовых плоскостей соседей для рядов 1..64.
+        a, b = centre[:, :-2], centre[:, 2:]
+        c, d, e = from_west[:, :-2], from_west[:, 1:-1], from_west[:, 2:]
+        f, g, h = from_east[:, :-2], from_east[:, 1:-1], from_east[:, 2:]
+
+        # Побитовое сложение восьми плоскостей в 4-битное число соседей.
+        s1, c1 = _full_add(a, b, c)
+        s2, c2 = _full_add(d, e, f)
+        s3, c3 = _half_add(g, h)
+        bit0, c4 = _full_add(s1, s2, s3)
+        t1, d1 = _full_add(c1, c2, c3)
+        bit1, d2 = _half_add(t1, c4)
+
+        alive = centre[:, 1:-1]
+        # Новое поколение - выражение правила от бит числа соседей.
+        new = _evaluate(_compile_rule(self.rule),
+                        {'bit3': d1 & d2, 'bit2': d1 ^ d2, 'bit1': bit1, 'bit0': bit0, 'alive': alive})
+
+        differs = (new != alive).any(axis=1)
+        self._population += _popcount(new[differs]) - _popcount(alive[differs])
+        if self.track_deltas:
+            self._record_tile_delta(np.asarray(candidates, dtype=np.int64).reshape(-1, 2)[differs],
+                                    new[differs], alive[differs])
+        self.changed = set()
+        for i in np.flatnonzero(differs).tolist():
+            key = candidates[i]
+            self.changed.add(key)
+            if new[i].any():
+                self.tiles[key] = new[i].copy()
+            else:
+                self.tiles.pop(key, None)
+        self.tiles.settle()
+        if self._box and not self._inside_box(self.changed):
+            self._box = False
+        if self.track_changes:
+            self._changes |= self.changed